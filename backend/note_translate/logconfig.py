@@ -0,0 +1,126 @@
+"""Asynchronous structured logging.
+
+Request and worker threads only put records on a bounded queue; a single
+listener thread formats them as JSON lines and writes them to stdout. When the
+queue is full, records are dropped and counted rather than blocking the
+caller. Per-page and per-chunk events are logged with extra=SAMPLED and only
+one in LOG_SAMPLE_EVERY of them is kept.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+
+# Pass as extra= for high-frequency events (one per page, chunk or batch)
+SAMPLED = {'sampled': True}
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sampled'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, extra fields and any traceback"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in `every` records marked as sampled, counted per call site"""
+
+    def __init__(self, every=20):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts = {}
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        site = (record.pathname, record.lineno)
+        # Racy increments only make sampling slightly uneven, which is harmless
+        count = self._counts.get(site, 0)
+        self._counts[site] = count + 1
+        return count % self.every == 0
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler with its own listener thread writing to stdout.
+
+    prepare() only merges the message arguments; formatting, JSON encoding and
+    the write itself happen on the listener thread.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JSONFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.dropped = 0
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if not self._started:
+            self._start()
+        super().emit(record)
+
+    def _start(self):
+        # Started on first use rather than at configuration, so each forked worker gets its own thread
+        with self._start_lock:
+            if not self._started:
+                self.listener.start()
+                self._started = True
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Drain the queue and stop the listener"""
+        if self._started:
+            self._started = False
+            self.listener.stop()
+
+    def reset_after_fork(self):
+        # The parent's listener thread and any records it had queued stay behind in the parent
+        self.queue = queue.Queue(self.maxsize)
+        self.listener.queue = self.queue
+        self.listener._thread = None
+        self._started = False
+
+
+def _reset_handlers_after_fork():
+    for handler in logging.root.handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            handler.reset_after_fork()
+
+
+# gunicorn --preload may fork after the master has logged; the listener thread doesn't survive a fork
+os.register_at_fork(after_in_child=_reset_handlers_after_fork)
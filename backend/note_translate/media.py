@@ -0,0 +1,160 @@
+"""Media file serving with byte ranges, validators and web-server offload.
+
+Uploaded PDFs are read by the viewer a range at a time, so the view answers
+Range requests with 206 partial content, revalidates with ETag and
+Last-Modified, and, when MEDIA_ACCEL is set, hands the transfer itself to the
+front web server (nginx X-Accel-Redirect or X-Sendfile) so no gunicorn worker
+is tied up streaming a large file.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import generics
+from rest_framework.permissions import AllowAny
+
+from notes.models import Note
+from notes.serializers import MediaFileSerializer
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    """Strong validator from modification time and size; cheap and changes whenever the file does"""
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to send the whole file, or 'unsatisfiable'"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Malformed and multi-range requests get the full representation
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """Whether a Range request may be honoured given its If-Range precondition"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404('Invalid path')
+    # Unfinished chunked uploads used to be kept here; they are never served
+    partial_dir = safe_join(settings.MEDIA_ROOT, 'uploads')
+    if os.path.commonpath([full_path, partial_dir]) == partial_dir:
+        raise Http404('File not found')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    def with_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        return response
+
+    cached = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if cached is not None:
+        return with_headers(cached)
+
+    if settings.MEDIA_ACCEL:
+        # The front server handles ranges and sendfile(); we only locate the file. Nothing here
+        # checks access: the viewer fetches media without the API's bearer token
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        return with_headers(response)
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method == 'GET' and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return with_headers(response)
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    length = max(0, end - start + 1)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=status)
+    else:
+        response = StreamingHttpResponse(read_range(full_path, start, length), content_type=content_type, status=status)
+    response['Content-Length'] = str(length)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return with_headers(response)
+
+
+class MediaFileList(generics.ListAPIView):
+    """Uploaded note files visible to the requester, keyset-paginated by last update"""
+    permission_classes = [AllowAny]
+    serializer_class = MediaFileSerializer
+    cursor_ordering = '-updated_at'
+
+    def get_queryset(self):
+        user = getattr(self.request, 'user', None)
+        return (
+            Note.objects.visible_to(user)
+            .exclude(file='').exclude(file__isnull=True)
+            .only('id', 'file', 'file_type', 'updated_at')
+        )
@@ -0,0 +1,260 @@
+"""In-process metrics registry exported in the Prometheus text format.
+
+Recording a sample is a dict update under one lock, so it costs a few
+microseconds. With METRICS_MULTIPROCESS_DIR set, every worker writes a snapshot
+of its registry there every METRICS_WRITE_INTERVAL seconds and /metrics sums
+the snapshots of all workers; counters and histograms of exited workers are
+folded into one archive file so that totals survive worker recycling.
+Without it, /metrics reports the serving process only.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import psutil
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds in seconds; request and model latencies range from milliseconds to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HELP = {
+    'http_requests_total': ('counter', 'HTTP requests by method, route and status class'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by method and route'),
+    'http_requests_in_flight': ('gauge', 'HTTP requests being handled'),
+    'process_resident_memory_bytes': ('gauge', 'Resident memory of each worker, sampled on a timer'),
+    'model_calls_total': ('counter', 'Model calls by operation, model and outcome'),
+    'model_call_retries_total': ('counter', 'Retried model call attempts by operation'),
+    'model_call_hedges_total': ('counter', 'Model calls that sent a hedged duplicate, by operation'),
+    'model_call_duration_seconds': ('histogram', 'Model call latency including retries, by operation'),
+    'definition_cache_lookups_total': ('counter', 'Definition cache lookups by level and result'),
+}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Registry:
+    """Counters, gauges and fixed-bucket histograms of one process"""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def add_gauge(self, name, amount, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        index = bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket plus +Inf, then the sum of observed values
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+def merge(snapshots):
+    """Sum counters, gauges and histograms across snapshots"""
+    total = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for kind in ('counters', 'gauges'):
+            for name, labels, value in snapshot.get(kind, []):
+                key = _key(name, dict(labels))
+                total[kind][key] = total[kind].get(key, 0) + value
+        for name, labels, values in snapshot.get('histograms', []):
+            key = _key(name, dict(labels))
+            merged = total['histograms'].get(key)
+            total['histograms'][key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+    return total
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(total):
+    """Prometheus text exposition of merged metrics"""
+    by_name = {}
+    for kind in ('counters', 'gauges', 'histograms'):
+        for (name, labels), value in total[kind].items():
+            by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _worker_path(directory, pid):
+    return os.path.join(directory, f'worker-{pid}.json')
+
+
+def write_snapshot():
+    """Publish this worker's registry to the multiprocess directory"""
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    path = _worker_path(directory, os.getpid())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """Merged metrics of every worker, folding exited workers into the archive"""
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return merge([registry.snapshot()])
+
+    write_snapshot()
+    archive_path = os.path.join(directory, 'archive.json')
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _read(archive_path) or {}
+        snapshots = []
+        exited = []
+        for filename in os.listdir(directory):
+            if not (filename.startswith('worker-') and filename.endswith('.json')):
+                continue
+            pid = int(filename[len('worker-'):-len('.json')])
+            snapshot = _read(os.path.join(directory, filename))
+            if snapshot is None:
+                continue
+            if _pid_alive(pid):
+                snapshots.append(snapshot)
+            else:
+                # Gauges describe live workers only; counters and histograms are kept
+                exited.append((filename, {**snapshot, 'gauges': []}))
+        if exited:
+            folded = merge([archive] + [snapshot for _, snapshot in exited])
+            archive = {
+                kind: [[name, labels, value] for (name, labels), value in folded[kind].items()]
+                for kind in ('counters', 'gauges', 'histograms')
+            }
+            tmp_path = f'{archive_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(archive, f)
+            os.replace(tmp_path, archive_path)
+            for filename, _ in exited:
+                os.remove(os.path.join(directory, filename))
+    return merge([archive] + snapshots)
+
+
+def _sample_forever():
+    process = psutil.Process()
+    last_write = 0.0
+    while True:
+        try:
+            registry.set_gauge('process_resident_memory_bytes', process.memory_info().rss, pid=str(os.getpid()))
+            if time.monotonic() - last_write >= settings.METRICS_WRITE_INTERVAL:
+                write_snapshot()
+                last_write = time.monotonic()
+        except Exception as e:
+            logger.warning('Metrics sampling failed: %s', e)
+        time.sleep(settings.METRICS_SAMPLE_INTERVAL)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def start_sampler():
+    """Start this process's sampling thread; after a fork the child starts its own"""
+    global _sampler
+    if _sampler is not None and _sampler.is_alive():
+        return
+    with _sampler_lock:
+        if _sampler is not None and _sampler.is_alive():
+            return
+        _sampler = threading.Thread(target=_sample_forever, name='metrics-sampler', daemon=True)
+        _sampler.start()
+
+
+@atexit.register
+def _write_on_exit():
+    try:
+        write_snapshot()
+    except Exception as e:
+        logger.warning('Could not write final metrics snapshot: %s', e)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires METRICS_TOKEN as a bearer token when one is set"""
+    token = settings.METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION', '') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,66 +1,222 @@
-import gc
-import psutil
+import re
 import time
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_etags
 
+from . import metrics
 
-class MemoryMonitoringMiddleware(MiddlewareMixin):
-    """Middleware to monitor memory usage and help with debugging"""
-    
-    def process_request(self, request):
-        """Log memory usage at the start of each request"""
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+
+class SchedulerMiddleware:
+    """Start this worker's background cleanup on its first request, after any fork"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Imported here so the project package doesn't load app models at import time
+        from notes.cleanup import scheduler
+        scheduler.start()
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record per-route request latency, status counts and in-flight requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.start_sampler()
+        metrics.registry.add_gauge('http_requests_in_flight', 1)
+        start = time.perf_counter()
+        status_class = '5xx'
         try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
-            memory_mb = memory_info.rss / 1024 / 1024
-            print(f"🔄 Request started - Memory: {memory_mb:.1f} MB - {request.method} {request.path}")
-        except Exception as e:
-            print(f"Could not log memory usage: {e}")
-        
-        # Store start time for duration tracking
-        request.start_time = time.time()
-        return None
-    
+            response = self.get_response(request)
+            status_class = f'{response.status_code // 100}xx'
+            return response
+        finally:
+            metrics.registry.add_gauge('http_requests_in_flight', -1)
+            # The URL pattern rather than the path, so note ids don't explode the label space
+            match = getattr(request, 'resolver_match', None)
+            route = match.route.replace('^', '').replace('$', '') if match is not None else 'unmatched'
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                            method=request.method, route=route)
+            metrics.inc('http_requests_total', method=request.method, route=route, status=status_class)
+
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|x-ndjson|[\w.+-]+\+(json|xml))|image/svg\+xml)'
+)
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self, level):
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    encoding = 'zstd'
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def available_compressors():
+    """(compressor class, level) pairs this process can use, most preferred first"""
+    compressors = []
+    if zstandard is not None:
+        compressors.append((ZstdCompressor, settings.COMPRESSION_ZSTD_LEVEL))
+    if brotli is not None:
+        compressors.append((BrotliCompressor, settings.COMPRESSION_BROTLI_QUALITY))
+    compressors.append((GzipCompressor, settings.COMPRESSION_GZIP_LEVEL))
+    return compressors
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header):
+    """(compressor class, level) for an Accept-Encoding header, or None to send the body as is"""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    best = None
+    for compressor, level in available_compressors():
+        q = accepted.get(compressor.encoding, wildcard)
+        if q > 0 and (best is None or q > best[2]):
+            best = (compressor, level, q)
+    return best[:2] if best else None
+
+
+def compress_stream(chunks, compressor):
+    """Compress an iterable of byte chunks one at a time, yielding output as the encoder produces it"""
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Negotiated zstd/brotli/gzip compression for text responses, including streaming ones.
+
+    Streaming responses are compressed chunk by chunk as they are sent, so neither
+    the plain nor the compressed body is ever held whole. Bodies below
+    COMPRESSION_MIN_SIZE, non-text types and partial responses pass through as is.
+    """
+
     def process_response(self, request, response):
-        """Log memory usage at the end of each request"""
-        try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
-            memory_mb = memory_info.rss / 1024 / 1024
-            
-            # Calculate request duration
-            duration = time.time() - getattr(request, 'start_time', 0)
-            
-            print(f"✅ Request completed - Memory: {memory_mb:.1f} MB - Duration: {duration:.2f}s - {request.method} {request.path}")
-            
-            # Force garbage collection for long-running requests
-            if duration > 5.0:  # If request took more than 5 seconds
-                print(f"🧹 Long request detected, forcing garbage collection...")
-                gc.collect()
-                
-                # Log memory after cleanup
-                memory_info_after = process.memory_info()
-                memory_mb_after = memory_info_after.rss / 1024 / 1024
-                print(f"🧹 Memory after cleanup: {memory_mb_after:.1f} MB (freed: {memory_mb - memory_mb_after:.1f} MB)")
-                
-        except Exception as e:
-            print(f"Could not log memory usage: {e}")
-        
+        if response.status_code == 304:
+            return self.match_not_modified(request, response)
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                return response
+            length = response.get('Content-Length')
+            if length is not None and int(length) < settings.COMPRESSION_MIN_SIZE:
+                return response
+        elif len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        chosen = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if chosen is None:
+            return response
+        compressor_class, level = chosen
+        compressor = compressor_class(level)
+
+        if response.streaming:
+            # Assigning streaming_content keeps the original iterator's close() for the handler
+            response.streaming_content = compress_stream(response.streaming_content, compressor)
+            del response['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.flush()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation; a strong ETag would claim byte identity
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = compressor.encoding
+        return response
+
+    def match_not_modified(self, request, response):
+        """Weaken a 304's ETag when it revalidates a compressed copy.
+
+        A 304 has no body, so nothing above tells whether the 200 it stands in
+        for was compressed. The client's If-None-Match does: when it holds the
+        weak form of this ETag and the request would still be compressed, the
+        304 carries that weak form, as the 200 did.
+        """
+        etag = response.get('ETag')
+        if not etag or not etag.startswith('"'):
+            return response
+        held = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if 'W/' + etag in held and negotiate(request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None:
+            response['ETag'] = 'W/' + etag
+            patch_vary_headers(response, ('Accept-Encoding',))
         return response
-    
-    def process_exception(self, request, exception):
-        """Log memory usage when exceptions occur"""
-        try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
-            memory_mb = memory_info.rss / 1024 / 1024
-            print(f"❌ Exception occurred - Memory: {memory_mb:.1f} MB - {request.method} {request.path} - Error: {str(exception)}")
-            
-            # Force garbage collection on errors
-            print(f"🧹 Forcing garbage collection due to exception...")
-            gc.collect()
-            
-        except Exception as e:
-            print(f"Could not log memory usage: {e}")
-        
-        return None
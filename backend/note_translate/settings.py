@@ -3,6 +3,7 @@ Django settings for note_translate project.
 """
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 import os
 from dotenv import load_dotenv
 
@@ -36,8 +37,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'note_translate.middleware.MetricsMiddleware',  # Outermost, so latency covers the whole stack
+    'note_translate.middleware.SchedulerMiddleware',  # Starts the cleanup scheduler in each worker
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'note_translate.middleware.CompressionMiddleware',  # zstd/brotli/gzip for API responses
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,7 +49,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'note_translate.middleware.MemoryMonitoringMiddleware',  # Memory monitoring
 ]
 
 ROOT_URLCONF = 'note_translate.urls'
@@ -106,6 +109,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Offload media transfers to the front server: None (Django streams the file),
+# 'nginx' (X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path) or 'sendfile' (X-Sendfile)
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL') or None
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -126,6 +133,8 @@ CORS_ALLOWED_METHODS = [
     'POST',
     'PUT',
 ]
+# Chunked uploads send their position in Upload-Offset
+CORS_ALLOW_HEADERS = (*default_headers, 'upload-offset')
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -135,13 +144,24 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Allow unauthenticated access by default
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'notes.renderers.ORJSONRenderer',  # orjson when installed, stock JSON otherwise
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'notes.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'notes.pagination.KeysetPagination',
     'PAGE_SIZE': 20
 }
 
 # Firebase settings
 FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH')
 FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+# {key id: certificate or public key PEM} trusted alongside Google's keys; only tests sign tokens locally
+FIREBASE_TEST_SIGNING_CERTS = {}
 
 # AI settings
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -149,3 +169,100 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# Chunked uploads (/api/notes/uploads/) stream each chunk to disk, so these bound requests, not memory
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Chunk size suggested to clients
+UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024  # Larger chunks are refused with 413
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 500 * 1024 * 1024))  # Largest file accepted
+# Unfinished uploads, kept outside MEDIA_ROOT so /media/ never serves them; same filesystem, so finishing is a rename
+UPLOAD_PARTIAL_DIR = BASE_DIR / 'upload_parts'
+
+# Model call resilience
+MODEL_CALL_TIMEOUT = int(os.getenv('MODEL_CALL_TIMEOUT', 120))  # Seconds per call
+MODEL_REQUEST_BUDGET = int(os.getenv('MODEL_REQUEST_BUDGET', 1100))  # Seconds per request, under gunicorn's 1200s timeout
+MODEL_CALL_MAX_RETRIES = 3
+MODEL_RETRY_BASE_DELAY = 1.0  # Seconds, doubled per attempt with full jitter
+MODEL_RETRY_MAX_DELAY = 16.0
+MODEL_HEDGE_PERCENTILE = 0.95  # Send a duplicate request once a call passes this latency percentile
+MODEL_CALL_MAX_THREADS = 16
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures before failing fast
+CIRCUIT_BREAKER_RESET_SECONDS = 30
+
+# Model pricing in USD per million tokens, used for usage accounting
+MODEL_PRICING = {
+    'gemini-2.5-flash': {'input': 0.30, 'output': 2.50},
+}
+
+# Word definition cache
+DEFINITION_CACHE_TTL = 30 * 24 * 3600  # Seconds a shared entry stays valid
+DEFINITION_CACHE_MAX_ENTRIES = 100000  # Least recently used entries beyond this are evicted
+DEFINITION_CACHE_PRUNE_INTERVAL = 500  # Writes between eviction passes, per process
+DEFINITION_CACHE_LOCAL_SIZE = 2048  # In-process LRU entries
+DEFINITION_CACHE_LOCAL_TTL = 3600  # Seconds, so evictions in the shared table reach every worker
+
+# Context sent with word lookups, in tokens: the default window and the most a client may ask for
+DEFINE_WORD_CONTEXT_TOKENS = 200
+DEFINE_WORD_CONTEXT_MAX_TOKENS = 1000
+
+# Most words or snippets accepted by one batch definition/translation request
+TRANSLATION_BATCH_MAX_ITEMS = 500
+
+# Per-note glossary built during translation
+GLOSSARY_ENABLED = os.getenv('GLOSSARY_ENABLED', 'false').lower() == 'true'  # Default when a request does not say
+GLOSSARY_MAX_TERMS = 150  # Terms kept per note
+GLOSSARY_TERMS_PER_PAGE = 8
+
+# Vocabulary search: most ranked matches returned for one query
+VOCABULARY_SEARCH_MAX_RESULTS = 500
+
+# Note access tracking (opened notes, page flips) is buffered and written in bulk
+NOTE_ACCESS_FLUSH_INTERVAL = 10  # Seconds between writes, per worker
+NOTE_ACCESS_BUFFER_MAX = 1000  # Notes buffered before an early write
+
+# Cleanup of abandoned notes and unfinished uploads (notes.cleanup), run by the web workers
+CLEANUP_INTERVAL = int(os.getenv('CLEANUP_INTERVAL', 600))  # Seconds between sweeps; 0 disables the scheduler
+CLEANUP_ABANDONED_HOURS = int(os.getenv('CLEANUP_ABANDONED_HOURS', 2))  # Age of abandoned notes to delete
+CLEANUP_UPLOAD_HOURS = 24  # Unfinished uploads untouched this long are deleted
+CLEANUP_BATCH_SIZE = 200  # Rows read and deleted per transaction
+CLEANUP_TIME_BUDGET = 20  # Seconds a sweep may run before leaving the rest for the next one
+CLEANUP_UNLINK_THREADS = 8
+
+# Metrics served at /metrics. With a multiprocess directory, gunicorn workers
+# publish snapshots there and each scrape sums all of them.
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR')
+METRICS_WRITE_INTERVAL = 5  # Seconds between a worker's snapshots
+METRICS_SAMPLE_INTERVAL = 5  # Seconds between RSS samples
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token required by /metrics when set
+
+# Logging: JSON lines written by a background thread (note_translate.logconfig).
+# LOG_LEVELS sets per-module levels, e.g. "notes.services=DEBUG,translation=WARNING".
+# Content bodies are only ever logged at DEBUG.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', 20))  # Per-page events kept: one in this many
+LOG_LEVELS = dict(
+    item.strip().split('=', 1) for item in os.getenv('LOG_LEVELS', '').split(',') if '=' in item
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {'()': 'note_translate.logconfig.SamplingFilter', 'every': LOG_SAMPLE_EVERY},
+    },
+    'handlers': {
+        'async': {'()': 'note_translate.logconfig.AsyncQueueHandler', 'filters': ['sampling']},
+    },
+    'root': {'handlers': ['async'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Django's own console handler would write synchronously; send everything through the queue
+        'django': {'handlers': [], 'level': 'INFO', 'propagate': True},
+        'django.db.backends': {'level': 'WARNING'},
+        **{name: {'level': level.upper()} for name, level in LOG_LEVELS.items()},
+    },
+}
+
+# Response compression: bodies smaller than this are sent as is. Levels favour
+# speed; higher levels save little on note text for several times the CPU.
+COMPRESSION_MIN_SIZE = 1024  # Bytes
+COMPRESSION_GZIP_LEVEL = 5
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSION_ZSTD_LEVEL = 3
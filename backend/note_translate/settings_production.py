@@ -36,6 +36,8 @@ WHITENOISE_AUTOREFRESH = True
 MEDIA_URL = '/media/'
 # Use Railway's persistent volume at /data for media files
 MEDIA_ROOT = '/data/media'
+# Unfinished uploads on the same volume, outside MEDIA_ROOT
+UPLOAD_PARTIAL_DIR = '/data/upload_parts'
 
 # Timeout settings for large file processing
 FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
@@ -60,9 +62,10 @@ import os
 if os.getenv('RAILWAY_ENVIRONMENT'):
     # We're on Railway, use more aggressive memory management
     print("🚂 Railway environment detected - using optimized memory settings")
-    # Increase memory limits for Railway's 8GB RAM
-    FILE_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB per file
-    DATA_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB per request
+    # Form uploads larger than this spool to FILE_UPLOAD_TEMP_DIR instead of
+    # being held in a worker's memory; large files should use chunked uploads
+    FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB per file, the Django default
+    DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB of non-file fields per request
 
 # CORS settings for production
 CORS_ALLOWED_ORIGINS = [
@@ -110,22 +113,14 @@ X_FRAME_OPTIONS = 'DENY'
 # SESSION_COOKIE_SECURE = True
 # CSRF_COOKIE_SECURE = True
 
-# Logging
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'ERROR',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'django.log'),
-        },
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['file'],
-            'level': 'ERROR',
-            'propagate': True,
-        },
-    },
+# Logging: errors from Django are also kept in a file
+LOGGING['handlers']['file'] = {
+    'level': 'ERROR',
+    'class': 'logging.FileHandler',
+    'filename': os.path.join(BASE_DIR, 'django.log'),
+}
+LOGGING['loggers']['django'] = {
+    'handlers': ['file'],
+    'level': 'ERROR',
+    'propagate': True,
 }
@@ -0,0 +1,115 @@
+"""Write-behind buffering for note access tracking.
+
+Opening a note and flipping pages only record the latest values in memory;
+a background thread writes them every NOTE_ACCESS_FLUSH_INTERVAL seconds with
+one bulk_update per set of changed fields, so reading a note costs no
+synchronous writes and never contends with the pipeline for the row. These
+writes leave updated_at alone, so they invalidate neither ETags nor the
+parsed-page caches keyed on it.
+
+Buffers are per process: another worker sees a page flip once it is flushed.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import Note
+
+logger = logging.getLogger(__name__)
+
+
+# Statuses a viewed note moves out of; anything else (e.g. abandoned) is left alone
+ACTIVATABLE_STATUSES = ['draft', 'processing']
+
+
+class AccessBuffer:
+    """Latest access-tracking values per note, coalesced until the next flush"""
+
+    def __init__(self, interval=None, max_notes=None):
+        self.interval = interval
+        self.max_notes = max_notes
+        self._pending = {}
+        self._activate = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def viewed(self, note_id, activate=False):
+        """Record that a note was opened, optionally moving it from draft/processing to active"""
+        self._record(note_id, {'last_accessed_at': timezone.now()}, activate)
+
+    def page_viewed(self, note_id, page):
+        self._record(note_id, {'last_viewed_page': page, 'last_accessed_at': timezone.now()})
+
+    def pending(self, note_id):
+        """Values recorded for a note but not yet written"""
+        with self._lock:
+            return dict(self._pending.get(str(note_id), {}))
+
+    def _record(self, note_id, values, activate=False):
+        max_notes = self.max_notes or settings.NOTE_ACCESS_BUFFER_MAX
+        with self._lock:
+            self._pending.setdefault(str(note_id), {}).update(values)
+            if activate:
+                self._activate.add(str(note_id))
+            full = len(self._pending) >= max_notes
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='note-access-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval or settings.NOTE_ACCESS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Error flushing note access updates')
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connections.close_all()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of notes updated"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                activate, self._activate = self._activate, set()
+            if not pending and not activate:
+                return 0
+
+            # A note may have been cancelled since it was viewed, so activation stays conditional
+            if activate:
+                Note.objects.filter(pk__in=activate, status__in=ACTIVATABLE_STATUSES).update(status='active')
+
+            by_fields = {}
+            for note_id, values in pending.items():
+                by_fields.setdefault(tuple(sorted(values)), []).append(Note(pk=note_id, **values))
+            for fields, notes in by_fields.items():
+                Note.objects.bulk_update(notes, list(fields), batch_size=500)
+            return len(pending)
+
+
+access_buffer = AccessBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    """Don't lose the last few seconds of reading positions when a worker shuts down"""
+    try:
+        access_buffer.flush()
+    except Exception:
+        logger.exception('Error flushing note access updates on exit')
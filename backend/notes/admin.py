@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Note, Translation
+from .models import Note, Translation, ModelUsage, GlossaryEntry
 
 
 @admin.register(Note)
@@ -12,7 +12,23 @@ class NoteAdmin(admin.ModelAdmin):
 
 @admin.register(Translation)
 class TranslationAdmin(admin.ModelAdmin):
-    list_display = ['note', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'updated_at']
+    list_display = ['note', 'target_language', 'created_at', 'updated_at']
+    list_filter = ['target_language', 'created_at', 'updated_at']
     search_fields = ['note__title', 'translated_content']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(GlossaryEntry)
+class GlossaryEntryAdmin(admin.ModelAdmin):
+    list_display = ['display_term', 'note', 'source_language', 'target_language', 'page_number', 'created_at']
+    list_filter = ['source_language', 'target_language']
+    search_fields = ['term', 'note__title']
+    readonly_fields = ['created_at']
+
+
+@admin.register(ModelUsage)
+class ModelUsageAdmin(admin.ModelAdmin):
+    list_display = ['operation', 'model_name', 'note', 'user', 'input_tokens', 'output_tokens', 'latency_ms', 'retries', 'cache_hit', 'success', 'cost_usd', 'created_at']
+    list_filter = ['operation', 'model_name', 'cache_hit', 'success', 'created_at']
+    search_fields = ['note__title', 'user__email']
+    readonly_fields = ['created_at']
@@ -1,50 +1,159 @@
-import firebase_admin
-from firebase_admin import credentials, auth
+"""Firebase ID-token authentication with locally cached signing keys.
+
+Tokens are verified in-process against Google's published signing
+certificates, which are fetched once and kept for as long as Google's
+Cache-Control allows. Verified tokens map to a uid and uids to users through
+per-process LRU caches, so a returning client authenticates with no queries
+and no network calls.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from django.contrib.auth.models import User
-from django.conf import settings
-import os
+
+from translation.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+FIREBASE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+FIREBASE_ISSUER = 'https://securetoken.google.com/'
+# Fallback lifetime for fetched certificates when the response has no max-age
+DEFAULT_CERTS_MAX_AGE = 3600
+# Least seconds between refetches triggered by a token signed with an unknown key
+MIN_CERTS_REFRESH_INTERVAL = 60
+CLOCK_SKEW_SECONDS = 10
+
+
+class SigningKeys:
+    """Google's token signing certificates, refetched only when they expire or a new key appears"""
+
+    def __init__(self, url=FIREBASE_CERTS_URL):
+        self.url = url
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, kid=None):
+        """{kid: certificate PEM}, refreshed if stale or if kid is not among them"""
+        now = time.monotonic()
+        stale = now >= self._expires_at
+        test_certs = settings.FIREBASE_TEST_SIGNING_CERTS
+        unknown = (kid is not None and kid not in self._certs and kid not in test_certs
+                   and now - self._fetched_at >= MIN_CERTS_REFRESH_INTERVAL)
+        if stale or unknown:
+            with self._lock:
+                if now >= self._expires_at or (unknown and now - self._fetched_at >= MIN_CERTS_REFRESH_INTERVAL):
+                    self._refresh()
+        return {**self._certs, **test_certs}
+
+    def _refresh(self):
+        try:
+            with urllib.request.urlopen(self.url, timeout=10) as response:
+                certs = json.loads(response.read())
+                match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        except Exception as e:
+            logger.warning('Could not fetch Firebase signing keys: %s', e)
+            # Keep serving the keys we have; retry after the minimum interval
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + MIN_CERTS_REFRESH_INTERVAL
+            return
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + (int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE)
+
+
+signing_keys = SigningKeys()
+# sha256(token) -> (uid, email, exp); entries also lapse when the token itself expires
+_verified_tokens = LRUCache(maxsize=10000, ttl=3600)
+# uid -> User
+_users = LRUCache(maxsize=10000, ttl=300)
+
+
+def verify_id_token(token):
+    """Claims of a valid Firebase ID token for this project; raises AuthenticationFailed otherwise"""
+    project_id = settings.FIREBASE_PROJECT_ID
+    if not project_id:
+        raise AuthenticationFailed('Firebase authentication is not configured')
+    try:
+        kid = jwt.decode_header(token).get('kid')
+        claims = jwt.decode(token, certs=signing_keys.get(kid), audience=project_id,
+                            clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+    except (ValueError, google_exceptions.GoogleAuthError) as e:
+        raise AuthenticationFailed(f'Invalid ID token: {e}')
+    if claims.get('iss') != FIREBASE_ISSUER + project_id:
+        raise AuthenticationFailed('Invalid ID token: wrong issuer')
+    uid = claims.get('sub')
+    if not uid or not isinstance(uid, str) or len(uid) > 128:
+        raise AuthenticationFailed('Invalid ID token: bad subject')
+    if claims.get('auth_time', 0) > time.time() + CLOCK_SKEW_SECONDS:
+        raise AuthenticationFailed('Invalid ID token: authenticated in the future')
+    return claims
+
+
+def user_for_uid(uid, email=''):
+    user = _users.get(uid)
+    if user is not None:
+        return user
+    user, created = User.objects.get_or_create(
+        username=f'firebase_{uid}',
+        defaults={'email': email or '', 'first_name': 'User'},
+    )
+    if created:
+        logger.info('Created user for Firebase uid %s', uid)
+    _users.set(uid, user)
+    return user
+
+
+def make_test_token(uid, private_key_pem, kid, project_id=None, lifetime=3600, **claims):
+    """A Firebase-shaped ID token signed with a local key, for tests.
+
+    The matching certificate (or public key) must be listed under kid in
+    FIREBASE_TEST_SIGNING_CERTS, which is empty outside tests.
+    """
+    from google.auth import crypt
+
+    project_id = project_id or settings.FIREBASE_PROJECT_ID
+    now = int(time.time())
+    payload = {
+        'iss': FIREBASE_ISSUER + project_id, 'aud': project_id, 'sub': uid, 'user_id': uid,
+        'auth_time': now, 'iat': now, 'exp': now + lifetime, **claims,
+    }
+    signer = crypt.RSASigner.from_string(private_key_pem, key_id=kid)
+    return jwt.encode(signer, payload).decode('ascii')
 
 
 class FirebaseAuthentication(BaseAuthentication):
-    """Custom authentication class for Firebase"""
-    
-    def __init__(self):
-        if not firebase_admin._apps:
-            if settings.FIREBASE_CREDENTIALS_PATH and os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
-                cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-                firebase_admin.initialize_app(cred)
-            else:
-                # For development, you can use default credentials
-                firebase_admin.initialize_app()
-    
+    """Authenticate requests bearing a Firebase ID token; requests without one are guests"""
+
     def authenticate(self, request):
-        # For development, create a simple user mapping
-        # Check if there's an Authorization header
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if auth_header.startswith('Bearer '):
-            # Extract the token to use as a unique identifier
-            token = auth_header.split(' ')[1]
-            
-            # For development, create a unique user based on the token
-            # In production, this would verify the Firebase token and extract user info
-            username = f'user_{hash(token) % 1000000}'  # Create unique username from token hash
-            
-            user, created = User.objects.get_or_create(
-                username=username,
-                defaults={
-                    'email': f'{username}@example.com', 
-                    'first_name': 'User', 
-                    'last_name': f'#{username.split("_")[1]}'
-                }
-            )
-            
-            # Debug logging
-            print(f"Authentication: {'Created' if created else 'Found'} user: {username}")
-            
-            return (user, None)
-        
-        # No auth header means guest user
-        print("Authentication: No auth header - guest user")
-        return None
+        if not auth_header.startswith('Bearer '):
+            # No auth header means guest user
+            return None
+        token = auth_header[len('Bearer '):].strip()
+
+        token_key = hashlib.sha256(token.encode('utf-8')).digest()
+        cached = _verified_tokens.get(token_key)
+        if cached is not None and cached[2] > time.time():
+            uid, email, _ = cached
+        else:
+            claims = verify_id_token(token)
+            uid, email = claims['sub'], claims.get('email', '')
+            _verified_tokens.set(token_key, (uid, email, claims['exp']))
+
+        return (user_for_uid(uid, email), None)
+
+    def authenticate_header(self, request):
+        return 'Bearer'
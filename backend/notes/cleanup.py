@@ -0,0 +1,184 @@
+"""Incremental cleanup of abandoned notes and stale uploads.
+
+Each sweep reads only ids and file names, a bounded batch at a time, walking
+the (status, created_at) index for notes and the (note, updated_at) index for
+uploads. A batch's files are unlinked in parallel and its rows deleted in one
+short transaction, so no sweep holds locks for long or scans the table, and
+a sweep stops between batches once its time budget is spent; the next one
+carries on where it left off.
+
+Sweeps run on a scheduler thread inside the web workers every
+CLEANUP_INTERVAL seconds. A file lock lets only one worker per host sweep at
+a time; the others skip that round.
+"""
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Note, Upload
+from . import uploads
+
+logger = logging.getLogger(__name__)
+
+
+def _unlink(names):
+    """Delete stored files in parallel; returns how many were removed"""
+    names = [name for name in names if name]
+    if not names:
+        return 0
+
+    def remove(name):
+        try:
+            os.remove(default_storage.path(name))
+            return 1
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning('Could not delete %s: %s', name, e)
+            return 0
+
+    with ThreadPoolExecutor(max_workers=min(settings.CLEANUP_UNLINK_THREADS, len(names))) as pool:
+        return sum(pool.map(remove, names))
+
+
+def sweep_abandoned_notes(hours=None, batch_size=None, time_budget=None):
+    """Delete abandoned notes created more than `hours` ago, with their files.
+
+    Returns {'notes': deleted, 'files': unlinked, 'finished': bool}; finished
+    is False when the time budget ran out before every note was handled.
+    """
+    hours = settings.CLEANUP_ABANDONED_HOURS if hours is None else hours
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+    time_budget = settings.CLEANUP_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    cutoff = timezone.now() - timezone.timedelta(hours=hours)
+    candidates = (
+        Note.objects
+        .filter(status='abandoned', created_at__lt=cutoff)
+        .order_by('created_at')
+        .values_list('id', 'file')
+    )
+
+    deleted = files = 0
+    while True:
+        batch = list(candidates[:batch_size])
+        if not batch:
+            return {'notes': deleted, 'files': files, 'finished': True}
+        ids = [note_id for note_id, _ in batch]
+        with transaction.atomic():
+            # Re-checked so a note revived since the batch was read survives
+            ids = list(
+                Note.objects.select_for_update()
+                .filter(pk__in=ids, status='abandoned')
+                .values_list('id', flat=True)
+            )
+            # only('id') keeps the cascade from loading content; translations,
+            # glossary and finished uploads go in one DELETE each, usage in one UPDATE
+            Note.objects.filter(pk__in=ids).only('id').delete()
+        kept = set(ids)
+        files += _unlink([name for note_id, name in batch if note_id in kept])
+        deleted += len(ids)
+        logger.debug('Deleted %d abandoned notes', len(ids))
+        if len(batch) < batch_size:
+            return {'notes': deleted, 'files': files, 'finished': True}
+        if time.monotonic() >= deadline:
+            return {'notes': deleted, 'files': files, 'finished': False}
+
+
+def sweep_stale_uploads(hours=None, batch_size=None, time_budget=None):
+    """Delete unfinished uploads untouched for `hours`, with their partial files"""
+    hours = settings.CLEANUP_UPLOAD_HOURS if hours is None else hours
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+    time_budget = settings.CLEANUP_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    cutoff = timezone.now() - timezone.timedelta(hours=hours)
+    candidates = (
+        Upload.objects
+        .filter(updated_at__lt=cutoff, note__isnull=True)
+        .order_by('updated_at')
+        .values_list('id', flat=True)
+    )
+
+    deleted = 0
+    while True:
+        ids = list(candidates[:batch_size])
+        if not ids:
+            return {'uploads': deleted, 'finished': True}
+        Upload.objects.filter(pk__in=ids, note__isnull=True).delete()
+        stale = [Upload(pk=upload_id) for upload_id in ids]
+        with ThreadPoolExecutor(max_workers=min(settings.CLEANUP_UNLINK_THREADS, len(stale))) as pool:
+            list(pool.map(uploads.discard, stale))
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return {'uploads': deleted, 'finished': True}
+        if time.monotonic() >= deadline:
+            return {'uploads': deleted, 'finished': False}
+
+
+def run_cleanup():
+    """One scheduled round: abandoned notes, then stale uploads, sharing the time budget"""
+    start = time.monotonic()
+    notes = sweep_abandoned_notes()
+    remaining = max(0.0, settings.CLEANUP_TIME_BUDGET - (time.monotonic() - start))
+    stale = sweep_stale_uploads(time_budget=remaining)
+    if notes['notes'] or stale['uploads']:
+        logger.info('Cleanup removed %d abandoned notes, %d files and %d stale uploads',
+                    notes['notes'], notes['files'], stale['uploads'],
+                    extra={'finished': notes['finished'] and stale['finished']})
+    return {**notes, 'uploads': stale['uploads'], 'finished': notes['finished'] and stale['finished']}
+
+
+class CleanupScheduler:
+    """Runs run_cleanup every CLEANUP_INTERVAL seconds on a daemon thread"""
+
+    def __init__(self, lock_path=None):
+        self.lock_path = lock_path or os.path.join(tempfile.gettempdir(), 'note-translate-cleanup.lock')
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start this process's thread; after a fork the child starts its own"""
+        if not settings.CLEANUP_INTERVAL:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='cleanup-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.CLEANUP_INTERVAL)
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Scheduled cleanup failed')
+            finally:
+                # This thread's connection would otherwise stay open between rounds
+                connections.close_all()
+
+    def run_once(self):
+        """Sweep unless another worker on this host is already sweeping; None if skipped"""
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                return run_cleanup()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+scheduler = CleanupScheduler()
@@ -0,0 +1,56 @@
+"""Strong ETags and conditional GET for note, page and translation responses.
+
+ETags are derived from the updated_at of the note and of its translations, read
+with one aggregate query, so answering a revalidation with 304 never loads or
+serializes content or translated_content.
+"""
+import hashlib
+import uuid
+
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response
+
+
+def parse_note_id(value):
+    """The UUID in a URL pk, or None when it isn't one (callers answer 404)"""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def note_version(note_queryset, note_id, target_language=None):
+    """Version stamp of a note and its translations (optionally one language), or None if not visible"""
+    note_id = parse_note_id(note_id)
+    if note_id is None:
+        return None
+    translations = Q(translations__target_language=target_language) if target_language else None
+    return (
+        note_queryset.filter(pk=note_id)
+        .annotate(
+            translations_updated=Max('translations__updated_at', filter=translations),
+            translations_count=Count('translations', filter=translations),
+        )
+        .values('id', 'updated_at', 'status', 'last_viewed_page', 'target_language',
+                'translations_updated', 'translations_count')
+        .first()
+    )
+
+
+def make_etag(scope, version, *extra):
+    parts = [scope, str(version['id']), version['updated_at'].isoformat(), version['target_language'],
+             version['translations_updated'].isoformat() if version['translations_updated'] else '',
+             str(version['translations_count'])] + [str(part) for part in extra]
+    return '"%s"' % hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def not_modified(request, etag):
+    """A 304 response if the client already holds this version, else None"""
+    return get_conditional_response(request, etag=etag)
+
+
+def tag_response(response, etag):
+    """Attach the ETag and ask clients to revalidate rather than reuse blindly"""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,71 @@
+import json
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from notes import pagejson
+from notes.renderers import ORJSONRenderer
+
+
+SAMPLE_SENTENCE = 'Die Übersetzung dieser Seite enthält Umlaute, Zahlen wie 3.14 und "Zitate". '
+
+
+def measure(func, repeat):
+    """(best seconds per call, peak traced bytes) for func"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+class Command(BaseCommand):
+    help = 'Time and peak memory of JSON rendering and page parsing for a large note, stdlib vs orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=500)
+        parser.add_argument('--page-chars', type=int, default=3000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if pagejson.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both columns use the standard library'))
+
+        page_text = (SAMPLE_SENTENCE * (options['page_chars'] // len(SAMPLE_SENTENCE) + 1))[:options['page_chars']]
+        pages = [{'page_number': number, 'content': page_text} for number in range(1, options['pages'] + 1)]
+        content = json.dumps(pages)
+        now = timezone.now()
+        # Shaped like a NoteSerializer response with one translation
+        payload = {
+            'id': uuid.uuid4(), 'title': 'Benchmark note', 'content': content,
+            'status': 'active', 'created_at': now, 'updated_at': now,
+            'translations': [{'id': uuid.uuid4(), 'target_language': 'en', 'translated_content': content,
+                              'created_at': now, 'updated_at': now}],
+        }
+        self.stdout.write(f"{options['pages']} pages, {len(content) / 1024 / 1024:.1f} MB of content per copy")
+
+        cases = [
+            ('render note response', lambda: JSONRenderer().render(payload), lambda: ORJSONRenderer().render(payload)),
+            ('parse page content', lambda: json.loads(content), lambda: pagejson.loads(content)),
+            ('serialize page content',
+             lambda: json.dumps([{'page_number': p['page_number'], 'content': p['content']} for p in pages]),
+             lambda: pagejson.dump_pages((p['page_number'], p['content']) for p in pages)),
+        ]
+        self.stdout.write(f"{'':24} {'stdlib ms':>10} {'peak MB':>8} {'fast ms':>10} {'peak MB':>8} {'speedup':>8}")
+        for label, before, after in cases:
+            before_time, before_peak = measure(before, options['repeat'])
+            after_time, after_peak = measure(after, options['repeat'])
+            self.stdout.write(
+                f"{label:24} {before_time * 1000:10.1f} {before_peak / 1024 / 1024:8.1f} "
+                f"{after_time * 1000:10.1f} {after_peak / 1024 / 1024:8.1f} {before_time / after_time:7.1f}x"
+            )
@@ -0,0 +1,85 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from notes.models import Note, Upload
+from vocabulary.models import VocabularyItem
+
+
+def index_name(model, fields):
+    for index in model._meta.indexes:
+        if list(index.fields) == fields:
+            return index.name
+    raise LookupError(f"No index on {fields} for {model.__name__}")
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot list and cleanup queries and check that they use their indexes'
+
+    def hot_queries(self):
+        user = User(pk=1)
+        now = timezone.now()
+        return [
+            (
+                'note list',
+                Note.objects.visible_to(user).order_by('-updated_at')[:20],
+                Note, ['user', '-updated_at'],
+            ),
+            (
+                'note list by status',
+                Note.objects.filter(user_id=user.pk, status='active').order_by('-updated_at')[:20],
+                Note, ['user', 'status', '-updated_at'],
+            ),
+            (
+                'note list, next page',
+                Note.objects.filter(user_id=user.pk, updated_at__lt=now).order_by('-updated_at')[:20],
+                Note, ['user', '-updated_at'],
+            ),
+            (
+                'abandoned note cleanup batch',
+                Note.objects.filter(status='abandoned', created_at__lt=now).order_by('created_at').values_list('id', 'file')[:200],
+                Note, ['status', 'created_at'],
+            ),
+            (
+                'stale upload cleanup batch',
+                Upload.objects.filter(updated_at__lt=now, note__isnull=True).order_by('updated_at').values_list('id', flat=True)[:200],
+                Upload, ['note', 'updated_at'],
+            ),
+            (
+                'vocabulary list',
+                VocabularyItem.objects.filter(user_id=user.pk).order_by('-created_at')[:20],
+                VocabularyItem, ['user', '-created_at'],
+            ),
+            (
+                'vocabulary list, next page',
+                VocabularyItem.objects.filter(user_id=user.pk, created_at__lt=now).order_by('-created_at')[:20],
+                VocabularyItem, ['user', '-created_at'],
+            ),
+            (
+                'vocabulary for a note',
+                VocabularyItem.objects.filter(user_id=user.pk, source_note_id=uuid.uuid4()).order_by('-created_at')[:20],
+                VocabularyItem, ['user', 'source_note', '-created_at'],
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            # Small tables are cheaper to scan; make the planner show which index it would use
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+        failures = []
+        for label, queryset, model, fields in self.hot_queries():
+            expected = index_name(model, fields)
+            plan = queryset.explain()
+            if expected in plan:
+                self.stdout.write(self.style.SUCCESS(f'OK    {label}: uses {expected}'))
+            else:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'FAIL  {label}: expected {expected}'))
+                self.stdout.write(f'      {plan}')
+
+        if failures:
+            raise CommandError(f"{len(failures)} queries do not use their index: {', '.join(failures)}")
@@ -1,76 +1,71 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from notes.models import Note
-import os
+from notes.cleanup import sweep_abandoned_notes, sweep_stale_uploads
 
 
 class Command(BaseCommand):
-    help = 'Clean up abandoned notes and their associated files'
+    help = 'Clean up abandoned notes and their associated files, in batches'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--hours',
             type=int,
-            default=1,
-            help='Delete abandoned notes older than this many hours (default: 1)',
+            default=settings.CLEANUP_ABANDONED_HOURS,
+            help=f'Delete abandoned notes older than this many hours (default: {settings.CLEANUP_ABANDONED_HOURS})',
         )
         parser.add_argument(
             '--dry-run',
             action='store_true',
             help='Show what would be deleted without actually deleting',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.CLEANUP_BATCH_SIZE,
+            help=f'Notes deleted per transaction (default: {settings.CLEANUP_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--time-budget',
+            type=float,
+            default=0,
+            help='Stop after this many seconds, leaving the rest for the next run (default: no limit)',
+        )
 
     def handle(self, *args, **options):
         hours = options['hours']
-        dry_run = options['dry_run']
-        
-        cutoff_time = timezone.now() - timezone.timedelta(hours=hours)
-        
-        # Find abandoned notes older than the cutoff time
-        abandoned_notes = Note.objects.filter(
-            status='abandoned',
-            created_at__lt=cutoff_time
-        )
-        
-        count = abandoned_notes.count()
-        
-        if dry_run:
+
+        if options['dry_run']:
+            cutoff_time = timezone.now() - timezone.timedelta(hours=hours)
+            abandoned_notes = Note.objects.filter(status='abandoned', created_at__lt=cutoff_time)
+            count = abandoned_notes.count()
             self.stdout.write(
                 self.style.WARNING(
                     f'DRY RUN: Would delete {count} abandoned notes older than {hours} hour(s)'
                 )
             )
-            for note in abandoned_notes[:10]:  # Show first 10 as examples
+            for note in abandoned_notes.order_by('created_at').only('id', 'title', 'created_at')[:10]:
                 self.stdout.write(f'  - {note.title} (ID: {note.id}, Created: {note.created_at})')
             if count > 10:
                 self.stdout.write(f'  ... and {count - 10} more')
             return
-        
-        if count == 0:
+
+        time_budget = options['time_budget'] or float('inf')
+        result = sweep_abandoned_notes(hours=hours, batch_size=options['batch_size'], time_budget=time_budget)
+        stale = sweep_stale_uploads(batch_size=options['batch_size'], time_budget=time_budget)
+
+        if not result['notes'] and not stale['uploads']:
             self.stdout.write(
                 self.style.SUCCESS('No abandoned notes found to clean up')
             )
             return
-        
-        # Delete associated files first
-        files_deleted = 0
-        for note in abandoned_notes:
-            if note.file:
-                try:
-                    if os.path.exists(note.file.path):
-                        os.remove(note.file.path)
-                        files_deleted += 1
-                        self.stdout.write(f'Deleted file: {note.file.path}')
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'Error deleting file {note.file.path}: {e}')
-                    )
-        
-        # Delete the notes
-        abandoned_notes.delete()
-        
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully deleted {count} abandoned notes and {files_deleted} associated files'
+                f"Successfully deleted {result['notes']} abandoned notes, {result['files']} associated files "
+                f"and {stale['uploads']} unfinished uploads"
             )
         )
+        if not (result['finished'] and stale['finished']):
+            self.stdout.write(self.style.WARNING('Time budget reached; run again to continue'))
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_target_language(apps, schema_editor):
+    """Existing translations belong to whatever target the note had when they were made"""
+    Translation = apps.get_model('notes', 'Translation')
+    for translation in Translation.objects.select_related('note').iterator():
+        metadata = translation.translation_metadata or {}
+        translation.target_language = metadata.get('target_language') or translation.note.target_language
+        translation.save(update_fields=['target_language'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_last_accessed_at_note_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translation',
+            name='target_language',
+            field=models.CharField(default='vi', max_length=10),
+        ),
+        migrations.RunPython(backfill_target_language, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='translation',
+            name='note',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='notes.note'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='translation',
+            unique_together={('note', 'target_language')},
+        ),
+    ]
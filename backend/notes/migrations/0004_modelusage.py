@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0003_translation_target_language'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=50)),
+                ('model_name', models.CharField(max_length=50)),
+                ('input_tokens', models.IntegerField(default=0)),
+                ('output_tokens', models.IntegerField(default=0)),
+                ('tokens_estimated', models.BooleanField(default=False)),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('retries', models.IntegerField(default=0)),
+                ('hedged', models.BooleanField(default=False)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('success', models.BooleanField(default=True)),
+                ('cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('note', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='model_usage', to='notes.note')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='model_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='notes_model_user_id_459260_idx'), models.Index(fields=['note', 'created_at'], name='notes_model_note_id_19dce5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0004_modelusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlossaryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=200)),
+                ('display_term', models.CharField(max_length=200)),
+                ('source_language', models.CharField(max_length=10)),
+                ('target_language', models.CharField(max_length=10)),
+                ('page_number', models.IntegerField(blank=True, null=True)),
+                ('definition', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='glossary', to='notes.note')),
+            ],
+            options={
+                'ordering': ['term'],
+                'unique_together': {('note', 'term', 'target_language')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:27
+
+import json
+
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    """Page counts and previews for existing notes, one note in memory at a time"""
+    Note = apps.get_model('notes', 'Note')
+    for note in Note.objects.only('id', 'content').iterator(chunk_size=50):
+        content = note.content or ''
+        try:
+            pages = json.loads(content)
+        except (json.JSONDecodeError, TypeError, ValueError):
+            pages = None
+        if isinstance(pages, list) and pages and isinstance(pages[0], dict) and 'page_number' in pages[0]:
+            page_count = len(pages)
+            text = ' '.join((page.get('content') or '') for page in pages[:5])
+        else:
+            page_count = 1 if content else 0
+            text = content[:600]
+        Note.objects.filter(id=note.id).update(page_count=page_count, preview=' '.join(text.split())[:300])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_glossaryentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='page_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='preview',
+            field=models.CharField(blank=True, max_length=300),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
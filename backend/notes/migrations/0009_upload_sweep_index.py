@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_upload'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='upload',
+            name='notes_uploa_updated_6d48f1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='upload',
+            index=models.Index(fields=['note', 'updated_at'], name='notes_uploa_note_id_c425ab_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0009_upload_sweep_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='upload',
+            name='note',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload', to='notes.note'),
+        ),
+    ]
@@ -2,6 +2,35 @@ from django.db import models
 from django.contrib.auth.models import User
 import uuid
 
+from . import pagejson
+
+
+def summarize_content(content, preview_length=300):
+    """(page_count, preview) for note content: page-based JSON or plain text"""
+    if not content:
+        return 0, ''
+    pages = pagejson.parse_pages(content)
+    if pages is not None:
+        preview = ''
+        for page in pages:
+            preview = f"{preview} {page.get('content') or ''}".strip()
+            if len(preview) >= preview_length:
+                break
+        return len(pages), ' '.join(preview.split())[:preview_length].rstrip()
+    return 1, ' '.join(content[:preview_length * 2].split())[:preview_length].rstrip()
+
+
+class NoteQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Notes a request may read: the user's own plus guest notes, minus abandoned guest notes"""
+        if user is not None and user.is_authenticated:
+            return self.filter(
+                models.Q(user=user) | models.Q(user__isnull=True)
+            ).exclude(
+                models.Q(status='abandoned') & models.Q(user__isnull=True)
+            )
+        return self.filter(user__isnull=True).exclude(status='abandoned')
+
 
 class Note(models.Model):
     """Model for storing user notes"""
@@ -32,21 +61,138 @@ class Note(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_viewed_page = models.IntegerField(default=1)
     last_accessed_at = models.DateTimeField(auto_now_add=True)  # Track when user last accessed
+    # Derived from content on save, so list views never need to load content
+    page_count = models.IntegerField(default=0)
+    preview = models.CharField(max_length=300, blank=True)
+    
+    objects = NoteQuerySet.as_manager()
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Note lists: a user's notes, optionally by status, newest first
+            models.Index(fields=['user', 'status', '-updated_at']),
+            models.Index(fields=['user', '-updated_at']),
+            # Abandoned-note cleanup
+            models.Index(fields=['status', 'created_at']),
+        ]
     
     def __str__(self):
         return self.title
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        note = super().from_db(db, field_names, values)
+        # Remembered so a save that leaves content alone doesn't re-summarize it
+        note._loaded_content = note.__dict__.get('content')
+        return note
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        content_saved = 'content' in update_fields if update_fields is not None else 'content' not in self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_content', None)
+        content_changed = self._state.adding or loaded is None or (loaded is not self.content and loaded != self.content)
+        if content_saved and content_changed:
+            self.page_count, self.preview = summarize_content(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'page_count', 'preview'}
+        super().save(*args, **kwargs)
+        if content_saved:
+            self._loaded_content = self.content
+    
+    @property
+    def translation(self):
+        """Translation for the note's current target language, if one exists"""
+        return self.translations.filter(target_language=self.target_language).first()
+
+
+class Upload(models.Model):
+    """A file being uploaded in chunks; becomes a Note once every byte has arrived"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads', null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    title = models.CharField(max_length=200)
+    file_type = models.CharField(max_length=10, default='pdf')
+    source_language = models.CharField(max_length=10, default='auto')
+    target_language = models.CharField(max_length=10, default='vi')
+    size = models.BigIntegerField()
+    # Mirrors of what is on disk, refreshed after every chunk
+    received = models.BigIntegerField(default=0)
+    page_count = models.IntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    # Deleted with its note, so a finished upload never looks unfinished again
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Sweeping stale, unfinished (note is null) uploads
+            models.Index(fields=['note', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
 
 
 class Translation(models.Model):
-    """Model for storing translations of notes"""
-    note = models.OneToOneField(Note, on_delete=models.CASCADE, related_name='translation')
+    """Model for storing translations of notes, one per target language"""
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='translations')
+    target_language = models.CharField(max_length=10, default='vi')
     translated_content = models.TextField()
     translation_metadata = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        unique_together = ['note', 'target_language']
+    
+    def __str__(self):
+        return f"{self.target_language} translation for {self.note.title}"
+
+
+class GlossaryEntry(models.Model):
+    """Precomputed definition of a difficult term in a note, built during translation"""
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='glossary')
+    term = models.CharField(max_length=200)  # Normalized form used for lookups
+    display_term = models.CharField(max_length=200)  # As it appears in the note
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    page_number = models.IntegerField(null=True, blank=True)
+    definition = models.JSONField(default=dict)  # Same shape as a define_word response
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['term']
+        unique_together = ['note', 'term', 'target_language']
+    
+    def __str__(self):
+        return f"{self.display_term} ({self.target_language}) in {self.note.title}"
+
+
+class ModelUsage(models.Model):
+    """One model call, or one cache lookup that stood in for a call"""
+    note = models.ForeignKey(Note, on_delete=models.SET_NULL, related_name='model_usage', null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='model_usage', null=True, blank=True)
+    operation = models.CharField(max_length=50)
+    model_name = models.CharField(max_length=50)
+    input_tokens = models.IntegerField(default=0)
+    output_tokens = models.IntegerField(default=0)
+    tokens_estimated = models.BooleanField(default=False)  # True when the SDK did not report token counts
+    latency_ms = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    hedged = models.BooleanField(default=False)
+    cache_hit = models.BooleanField(default=False)
+    success = models.BooleanField(default=True)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['note', 'created_at']),
+        ]
+    
     def __str__(self):
-        return f"Translation for {self.note.title}"
+        return f"{self.operation} ({self.model_name}) at {self.created_at}"
@@ -0,0 +1,43 @@
+"""Fast JSON codec for page-based note content, using orjson when it is installed.
+
+Page content is stored as a JSON list of {"page_number", "content"} objects and
+is parsed and re-serialized by the services, models and views; they all go
+through this module so each pass uses the fastest available codec.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps(data):
+    """Compact JSON text; non-ASCII characters are written as UTF-8, not escaped"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def parse_pages(content):
+    """The page list of page-based JSON content, or None for plain text"""
+    if not content or content[:1] != '[':
+        return None
+    try:
+        pages = loads(content)
+    except ValueError:
+        return None
+    if isinstance(pages, list) and pages and isinstance(pages[0], dict) and 'page_number' in pages[0]:
+        return pages
+    return None
+
+
+def dump_pages(pages):
+    """Serialize (page_number, text) pairs as page-based JSON content"""
+    return dumps([{'page_number': page_number, 'content': text} for page_number, text in pages])
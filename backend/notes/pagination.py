@@ -0,0 +1,43 @@
+"""Keyset (cursor) pagination on each list's ordering column, with a page-number fallback"""
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination ordered by the view's cursor_ordering (or its OrderingFilter).
+
+    Each page is a range read on an indexed column instead of an OFFSET scan,
+    and no COUNT(*) is run. Requests that pass ?page=, or that the view says
+    cannot be keyset-paginated (e.g. ranked search results), get page-number
+    pagination instead.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
+    def __init__(self):
+        self.fallback = None
+
+    def use_page_numbers(self, request, view):
+        if 'page' in request.query_params:
+            return True
+        hook = getattr(view, 'use_page_numbers', None)
+        return bool(hook and hook(request))
+
+    def get_ordering(self, request, queryset, view):
+        if view is not None and getattr(view, 'cursor_ordering', None):
+            self.ordering = view.cursor_ordering
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_page_numbers(request, view):
+            self.fallback = PageNumberPagination()
+            self.fallback.page_size_query_param = self.page_size_query_param
+            self.fallback.max_page_size = self.max_page_size
+            return self.fallback.paginate_queryset(queryset, request, view)
+        self.fallback = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
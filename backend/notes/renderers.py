@@ -0,0 +1,32 @@
+"""DRF JSON renderer and parser backed by orjson when it is installed"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagejson import orjson
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that serializes with orjson, falling back to the stock renderer without it"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Indented output (the browsable API asks for it) stays on the stock renderer
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # orjson handles dicts, lists, UUIDs and datetimes natively; DRF's encoder covers the rest
+        return orjson.dumps(data, default=JSONEncoder().default)
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser that parses with orjson, falling back to the stock parser without it"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,286 @@
+"""Deadlines, retries, hedged requests and circuit breaking for model calls"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import google.generativeai as genai
+from django.conf import settings
+
+from note_translate import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCallError(Exception):
+    """Base class for failures raised by the model call layer"""
+
+
+class DeadlineExceeded(ModelCallError):
+    """The call (or the request it belongs to) ran out of time"""
+
+
+class CircuitOpenError(ModelCallError):
+    """The upstream is degraded and calls are being failed fast"""
+
+
+class Deadline:
+    """Overall time budget for a request, shared by every model call it makes"""
+
+    def __init__(self, budget_seconds):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def call_timeout(self, cap):
+        """Timeout for a single call: the per-call cap, bounded by what is left"""
+        return min(cap, self.remaining())
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, probing again after a cool-down.
+
+    closed: calls flow normally. open: calls are rejected until reset_seconds have
+    passed. half-open: a single probe call is let through; its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half-open'
+                self.probe_in_flight = False
+            if self.state == 'half-open' and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error('Circuit breaker opened after %d failures', self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to decide when to hedge"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.MODEL_CALL_MAX_THREADS,
+    thread_name_prefix='model-call',
+)
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(model_name):
+    with _registry_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(
+                settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                settings.CIRCUIT_BREAKER_RESET_SECONDS,
+            )
+        return _breakers[model_name]
+
+
+def get_latency_tracker(operation):
+    with _registry_lock:
+        if operation not in _latencies:
+            _latencies[operation] = LatencyTracker()
+        return _latencies[operation]
+
+
+def _invoke(model_name, contents, generation_config):
+    model = genai.GenerativeModel(model_name)
+    if generation_config is not None:
+        return model.generate_content(contents, generation_config=generation_config)
+    return model.generate_content(contents)
+
+
+def generate_once(contents, generation_config=None, model_name='gemini-2.5-flash',
+                  operation='generate', deadline=None, hedge=True, call_info=None):
+    """Make one model call with a deadline and at most one hedged duplicate.
+
+    The call is bounded by MODEL_CALL_TIMEOUT and by whatever remains of the
+    request deadline. If it is still running once it passes the p95 latency for
+    this operation, an identical request is sent and whichever finishes first
+    wins. Calls still queued for a pool thread are cancelled once the outcome is
+    known; slow calls cannot be cancelled by the SDK, so a running call that
+    misses its deadline is abandoned rather than stopped. If call_info is given, it is
+    updated with whether the call was hedged.
+    """
+    breaker = get_breaker(model_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{model_name} is unavailable, failing fast")
+
+    timeout = settings.MODEL_CALL_TIMEOUT
+    if deadline is not None:
+        timeout = deadline.call_timeout(timeout)
+    if timeout <= 0:
+        breaker.release()
+        raise DeadlineExceeded("Request deadline exhausted before the model call")
+
+    tracker = get_latency_tracker(operation)
+    hedge_after = tracker.percentile(settings.MODEL_HEDGE_PERCENTILE) if hedge else None
+
+    start = time.monotonic()
+    pending = {_executor.submit(_invoke, model_name, contents, generation_config)}
+    hedged = False
+    last_error = None
+
+    while pending:
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            break
+        wait_for = timeout - elapsed
+        if not hedged and hedge_after is not None:
+            wait_for = min(wait_for, max(0.0, hedge_after - elapsed))
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            latency = time.monotonic() - start
+            tracker.record(latency)
+            breaker.record_success()
+            # A hedge still waiting for a pool thread need not run at all
+            for other in pending:
+                other.cancel()
+            return response
+
+        if not done and not hedged and hedge_after is not None and time.monotonic() - start < timeout:
+            logger.info('Hedging %s call after %.1fs (p95 %.1fs)', operation, time.monotonic() - start, hedge_after)
+            pending.add(_executor.submit(_invoke, model_name, contents, generation_config))
+            hedged = True
+            if call_info is not None:
+                call_info['hedged'] = True
+
+    # Calls that never left the executor's queue are dropped; only one that ran
+    # out its time, or failed, counts against the model
+    started = [future for future in pending if not future.cancel()]
+    if pending and not started:
+        breaker.release()
+        raise DeadlineExceeded(f"{operation} call waited {timeout:.1f}s for a free worker thread")
+    breaker.record_failure()
+    if pending or last_error is None:
+        raise DeadlineExceeded(f"{operation} call timed out after {timeout:.1f}s")
+    raise last_error
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given zero-based retry attempt"""
+    ceiling = min(settings.MODEL_RETRY_MAX_DELAY, settings.MODEL_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def generate_content(contents, generation_config=None, model_name='gemini-2.5-flash',
+                     operation='generate', deadline=None, retries=None, hedge=True, recorder=None):
+    """Call the model with deadlines, hedging, circuit breaking and jittered retries.
+
+    Circuit-open errors and an exhausted request deadline are raised immediately;
+    other failures are retried up to MODEL_CALL_MAX_RETRIES times. When a
+    UsageRecorder is given, the call is recorded once with its total latency and
+    retry count, whether it succeeded or not.
+    """
+    attempts = 1 + (settings.MODEL_CALL_MAX_RETRIES if retries is None else retries)
+    call_info = {'hedged': False}
+    start = time.monotonic()
+    attempt = 0
+
+    def record(response=None, success=True):
+        latency = time.monotonic() - start
+        metrics.inc('model_calls_total', operation=operation, model=model_name,
+                    outcome='success' if success else 'failure')
+        metrics.observe('model_call_duration_seconds', latency, operation=operation)
+        if attempt:
+            metrics.inc('model_call_retries_total', attempt, operation=operation)
+        if call_info['hedged']:
+            metrics.inc('model_call_hedges_total', operation=operation)
+        if recorder is not None:
+            recorder.record_call(
+                operation, model_name, contents, response,
+                latency=latency,
+                retries=attempt,
+                hedged=call_info['hedged'],
+                success=success,
+            )
+
+    for attempt in range(attempts):
+        try:
+            response = generate_once(
+                contents,
+                generation_config=generation_config,
+                model_name=model_name,
+                operation=operation,
+                deadline=deadline,
+                hedge=hedge,
+                call_info=call_info,
+            )
+            record(response)
+            return response
+        except CircuitOpenError:
+            record(success=False)
+            raise
+        except Exception as e:
+            if attempt == attempts - 1 or (deadline is not None and deadline.expired()):
+                record(success=False)
+                raise
+            delay = backoff_delay(attempt)
+            if deadline is not None:
+                delay = min(delay, deadline.remaining())
+            logger.warning('%s call failed (attempt %d/%d): %s; retrying in %.1fs', operation, attempt + 1, attempts, e, delay)
+            time.sleep(delay)
@@ -1,32 +1,60 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Note, Translation
+from .models import Note, Translation, GlossaryEntry, Upload
 
 
 class NoteSerializer(serializers.ModelSerializer):
     translation = serializers.SerializerMethodField()
+    available_translations = serializers.SerializerMethodField()
     
     class Meta:
         model = Note
         fields = [
             'id', 'title', 'content', 'file', 'file_type',
             'source_language', 'detected_language', 'target_language', 'tags',
-            'created_at', 'updated_at', 'last_viewed_page', 'translation'
+            'created_at', 'updated_at', 'last_viewed_page', 'translation',
+            'available_translations'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_translation(self, obj):
-        if hasattr(obj, 'translation'):
-            return TranslationSerializer(obj.translation).data
+        translation = obj.translation
+        if translation is not None:
+            return TranslationSerializer(translation).data
         return None
+    
+    def get_available_translations(self, obj):
+        return list(obj.translations.values_list('target_language', flat=True))
+
+
+class NoteSummarySerializer(serializers.ModelSerializer):
+    """Note list entry: no content and no nested translation"""
+    has_translation = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = Note
+        fields = [
+            'id', 'title', 'status', 'file_type',
+            'source_language', 'detected_language', 'target_language', 'tags',
+            'page_count', 'preview', 'last_viewed_page', 'has_translation',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
 
 
 class TranslationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Translation
-        fields = ['id', 'translated_content', 'translation_metadata', 'created_at', 'updated_at']
+        fields = ['id', 'target_language', 'translated_content', 'translation_metadata', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class GlossaryEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GlossaryEntry
+        fields = ['term', 'display_term', 'source_language', 'target_language', 'page_number', 'definition']
+
+
 class NoteCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Note
@@ -35,3 +63,52 @@ class NoteCreateSerializer(serializers.ModelSerializer):
             'source_language', 'detected_language', 'target_language', 'tags'
         ]
         read_only_fields = ['id']
+
+
+class MediaFileSerializer(serializers.ModelSerializer):
+    """An uploaded note file, listed from the database rather than the filesystem"""
+    note_id = serializers.UUIDField(source='id', read_only=True)
+    name = serializers.SerializerMethodField()
+    path = serializers.CharField(source='file.name', read_only=True)
+    url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Note
+        fields = ['note_id', 'name', 'path', 'url', 'file_type', 'updated_at']
+        read_only_fields = fields
+    
+    def get_name(self, obj):
+        return obj.file.name.rsplit('/', 1)[-1]
+    
+    def get_url(self, obj):
+        return obj.file.url
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    """A chunked upload: declared up front, then filled in by PATCH requests"""
+    offset = serializers.IntegerField(source='received', read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+    note_id = serializers.UUIDField(read_only=True)
+    
+    class Meta:
+        model = Upload
+        fields = [
+            'id', 'filename', 'title', 'file_type', 'source_language', 'target_language',
+            'size', 'offset', 'chunk_size', 'page_count', 'sha256', 'note_id', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'page_count', 'sha256', 'created_at', 'updated_at']
+    
+    def get_chunk_size(self, obj):
+        return settings.UPLOAD_CHUNK_SIZE
+    
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Size must be positive')
+        if value > settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Files are limited to {settings.UPLOAD_MAX_SIZE} bytes')
+        return value
+    
+    def validate_file_type(self, value):
+        if value not in dict(Note._meta.get_field('file_type').choices):
+            raise serializers.ValidationError('Unsupported file type')
+        return value
@@ -1,11 +1,19 @@
 import os
 import gc
+import logging
+import json
 import psutil
 import PyPDF2
 from PIL import Image
 import google.generativeai as genai
 from django.conf import settings
-from .models import Note, Translation
+from .models import Note, Translation, GlossaryEntry
+from . import pagejson, resilience
+from .usage import UsageRecorder
+
+from note_translate.logconfig import SAMPLED
+
+logger = logging.getLogger(__name__)
 
 
 class NoteService:
@@ -13,6 +21,33 @@ class NoteService:
     
     def __init__(self):
         self.setup_gemini()
+        # Overall time budget shared by the model calls of the current request
+        self.deadline = None
+        # Token, latency and cost accounting for the model calls of the current request
+        self.usage = UsageRecorder()
+    
+    def start_deadline(self):
+        """Start a fresh request budget unless one is already running"""
+        if self.deadline is None or self.deadline.expired():
+            self.deadline = resilience.Deadline(settings.MODEL_REQUEST_BUDGET)
+        return self.deadline
+    
+    def should_abort(self, error):
+        """Whether a failure means the whole request should stop rather than degrade"""
+        if isinstance(error, resilience.CircuitOpenError):
+            return True
+        return self.deadline is not None and self.deadline.expired()
+    
+    def generate(self, contents, generation_config=None, operation='generate', retries=None):
+        """Call the model within the current deadline, with retries, hedging and circuit breaking"""
+        return resilience.generate_content(
+            contents,
+            generation_config=generation_config,
+            operation=operation,
+            deadline=self.deadline,
+            retries=retries,
+            recorder=self.usage,
+        )
     
     def log_memory_usage(self, stage=""):
         """Log current memory usage to help with debugging"""
@@ -20,10 +55,10 @@ class NoteService:
             process = psutil.Process()
             memory_info = process.memory_info()
             memory_mb = memory_info.rss / 1024 / 1024
-            print(f"Memory usage {stage}: {memory_mb:.1f} MB")
+            logger.debug('Memory usage %s: %.1f MB', stage, memory_mb)
             return memory_mb
         except Exception as e:
-            print(f"Could not log memory usage: {e}")
+            logger.warning('Could not read memory usage: %s', e)
             return 0
     
     def check_memory_limit(self, limit_mb=500):
@@ -31,11 +66,11 @@ class NoteService:
         try:
             memory_mb = self.log_memory_usage("memory check")
             if memory_mb > limit_mb:
-                print(f"⚠️  Memory usage {memory_mb:.1f} MB exceeds limit {limit_mb} MB")
+                logger.warning('Memory usage %.1f MB exceeds limit %s MB', memory_mb, limit_mb)
                 return False
             return True
         except Exception as e:
-            print(f"Could not check memory limit: {e}")
+            logger.warning('Could not check memory limit: %s', e)
             return True  # Allow processing if we can't check
     
     def get_optimal_batch_size(self, file_size_mb, page_count):
@@ -56,30 +91,30 @@ class NoteService:
     
     def extract_text_from_pdf(self, file_path):
         """Extract text from PDF file with better formatting preservation"""
-        print(f"Starting PDF text extraction from: {file_path}")
+        logger.info('Starting PDF text extraction', extra={'file_path': file_path})
         
         # Try AI Vision first for better formatting preservation
         try:
-            print("Attempting AI Vision extraction for better formatting...")
+            logger.debug('Attempting AI Vision extraction')
             result = self.extract_text_from_pdf_with_vision(file_path)
-            print(f"AI Vision extraction successful, content length: {len(result) if result else 0}")
+            logger.info('AI Vision extraction succeeded', extra={'chars': len(result) if result else 0})
             return result
         except Exception as vision_error:
-            print(f"AI Vision extraction failed: {str(vision_error)}")
+            logger.warning('AI Vision extraction failed: %s', vision_error)
             
             # Fallback to PyPDF2 if AI Vision fails
             try:
-                print("Falling back to PyPDF2 extraction...")
+                logger.info('Falling back to PyPDF2 extraction')
                 with open(file_path, 'rb') as file:
                     pdf_reader = PyPDF2.PdfReader(file)
                     text = ""
                     for page in pdf_reader.pages:
                         text += page.extract_text() + "\n\n"
                     result = text.strip()
-                    print(f"PyPDF2 extraction successful, content length: {len(result)}")
+                    logger.info('PyPDF2 extraction succeeded', extra={'chars': len(result)})
                     return result
             except Exception as basic_error:
-                print(f"PyPDF2 fallback also failed: {str(basic_error)}")
+                logger.error('PyPDF2 fallback also failed: %s', basic_error)
                 raise Exception(f"Error extracting text from PDF: AI Vision failed: {str(vision_error)}. PyPDF2 also failed: {str(basic_error)}")
     
     def extract_text_from_pdf_with_vision(self, file_path):
@@ -90,16 +125,16 @@ class NoteService:
             import io
             import json
             
-            print(f"Opening PDF file: {file_path}")
+            logger.debug('Opening PDF file %s', file_path)
             # Convert PDF to images
             doc = fitz.open(file_path)
-            print(f"PDF has {len(doc)} pages")
+            logger.info('PDF opened', extra={'pages': len(doc)})
             pages_data = []
             
             # Function to process a single page
             def process_page(page_data):
                 page_num, page = page_data
-                print(f"Processing page {page_num + 1}/{len(doc)}")
+                logger.debug('Processing page %d/%d', page_num + 1, len(doc))
                 
                 try:
                     # Convert page to image (no zoom to keep it simple)
@@ -108,8 +143,7 @@ class NoteService:
                     img = Image.open(io.BytesIO(img_data))
                     
                     # Use AI Vision to extract text with proper sentence formatting
-                    model = genai.GenerativeModel('gemini-2.5-flash')
-                    response = model.generate_content([
+                    response = self.generate([
                         """Extract all text from this PDF page and format it as proper, readable text.
 
 CRITICAL FORMATTING RULES:
@@ -125,13 +159,13 @@ IMPORTANT: Return the text as it would appear in a well-formatted document, with
 
 Extract the text maintaining proper sentence structure and formatting:""",
                         img
-                    ])
+                    ], operation='vision_page')
                     
                     # Handle different response formats
                     try:
                         page_text = response.text
                     except Exception as text_error:
-                        print(f"Error accessing response.text for page {page_num + 1}: {text_error}")
+                        logger.warning('Could not read vision response for page %d: %s', page_num + 1, text_error)
                         # Try alternative access methods
                         if hasattr(response, 'parts') and response.parts:
                             page_text = response.parts[0].text
@@ -141,7 +175,7 @@ Extract the text maintaining proper sentence structure and formatting:""",
                             raise Exception(f"Could not extract text from response: {text_error}")
                     
                     page_text = page_text if page_text else ""
-                    print(f"✅ Page {page_num + 1} processed successfully ({len(page_text)} characters)")
+                    logger.info('Page %d extracted', page_num + 1, extra={'chars': len(page_text), **SAMPLED})
                     
                     # Clean up memory after processing each page
                     del img, pix, img_data, response
@@ -153,33 +187,39 @@ Extract the text maintaining proper sentence structure and formatting:""",
                     }
                     
                 except Exception as e:
-                    print(f"❌ Page {page_num + 1} processing failed: {e}")
+                    # Out of time or the upstream is down: abandon vision for the whole
+                    # document so extraction falls back to PyPDF2
+                    if self.should_abort(e):
+                        raise
+                    
+                    # Keep the page rather than an error marker by using the PDF's own text layer
+                    logger.warning('Vision extraction failed for page %d, using embedded text: %s', page_num + 1, e)
                     return page_num, {
                         'page_number': page_num + 1,
-                        'content': f"[Error processing page {page_num + 1}: {str(e)}]"
+                        'content': page.get_text().strip()
                     }
             
             # Process pages in smaller batches to manage memory better
             from concurrent.futures import ThreadPoolExecutor, as_completed
             import time
             
-            print(f"Starting batch processing of {len(doc)} pages...")
+            logger.debug('Starting batch processing of %d pages', len(doc))
             self.log_memory_usage("before batch processing")
             start_time = time.time()
             
             # Calculate optimal batch size based on file size
             file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
             batch_size = self.get_optimal_batch_size(file_size_mb, len(doc))
-            print(f"File size: {file_size_mb:.1f} MB, using batch size: {batch_size}")
+            logger.info('Extracting pages in batches', extra={'file_size_mb': round(file_size_mb, 1), 'batch_size': batch_size})
             pages_data = []
             
             for batch_start in range(0, len(doc), batch_size):
                 batch_end = min(batch_start + batch_size, len(doc))
-                print(f"Processing batch {batch_start//batch_size + 1}/{(len(doc) + batch_size - 1)//batch_size} (pages {batch_start + 1}-{batch_end})")
+                logger.debug('Processing pages %d-%d', batch_start + 1, batch_end)
                 
                 # Check memory before processing batch - Railway Hobby plan has 8GB RAM
                 if not self.check_memory_limit(1500):  # 1.5GB limit for Railway
-                    print(f"⚠️  Memory limit exceeded, forcing cleanup before batch {batch_start//batch_size + 1}")
+                    logger.warning('Memory limit exceeded, forcing cleanup before pages %d-%d', batch_start + 1, batch_end)
                     gc.collect()
                     time.sleep(1)  # Give system time to free memory
                     
@@ -187,7 +227,7 @@ Extract the text maintaining proper sentence structure and formatting:""",
                     if batch_start + batch_size < len(doc):
                         old_batch_size = batch_size
                         batch_size = max(2, batch_size // 2)  # Reduce batch size but keep at least 2
-                        print(f"⚠️  Reduced batch size from {old_batch_size} to {batch_size} due to memory pressure")
+                        logger.warning('Reduced batch size from %d to %d due to memory pressure', old_batch_size, batch_size)
                 
                 batch_pages = []
                 with ThreadPoolExecutor(max_workers=2) as executor:
@@ -201,7 +241,7 @@ Extract the text maintaining proper sentence structure and formatting:""",
                     for future in as_completed(future_to_page):
                         page_num, page_data = future.result()
                         batch_pages.append(page_data)
-                        print(f"✅ Completed page {page_data['page_number']}")
+                        logger.debug('Completed page %s', page_data['page_number'])
                 
                 # Add batch results to main list
                 pages_data.extend(batch_pages)
@@ -211,7 +251,7 @@ Extract the text maintaining proper sentence structure and formatting:""",
                 self.log_memory_usage(f"after batch {batch_start//batch_size + 1}")
             
             end_time = time.time()
-            print(f"Batch processing completed in {end_time - start_time:.2f} seconds")
+            logger.info('PDF extraction completed', extra={'pages': len(pages_data), 'seconds': round(end_time - start_time, 2)})
             self.log_memory_usage("after batch processing")
             
             # Sort pages by page number
@@ -220,7 +260,7 @@ Extract the text maintaining proper sentence structure and formatting:""",
             doc.close()
             
             # Store pages data as JSON in the content field
-            result = json.dumps(pages_data)
+            result = pagejson.dumps(pages_data)
             
             # Final memory cleanup
             del pages_data, doc
@@ -238,59 +278,70 @@ Extract the text maintaining proper sentence structure and formatting:""",
     def extract_text_from_image(self, file_path):
         """Extract text from image using AI Vision with formatting preservation"""
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
             image = Image.open(file_path)
-            response = model.generate_content([
+            response = self.generate([
                 "Extract all text from this image. Preserve the original formatting, structure, headings, bullet points, and layout as much as possible. Use markdown formatting to represent the structure (use # for headings, - for bullet points, etc.). Return only the extracted text with markdown formatting.",
                 image
-            ])
+            ], operation='vision_image')
             return response.text
         except Exception as e:
             raise Exception(f"Error extracting text from image: {str(e)}")
     
     def process_uploaded_file(self, note):
         """Process uploaded file and extract content"""
-        print(f"Processing uploaded file for note {note.id}")
+        logger.info('Processing uploaded file', extra={'note_id': str(note.id)})
         self.log_memory_usage("before file processing")
         
         # Check initial memory state - Railway Hobby plan has 8GB RAM
         if not self.check_memory_limit(1000):  # 1GB initial limit for Railway
-            print("⚠️  High memory usage detected at start, forcing cleanup")
+            logger.warning('High memory usage before processing, forcing cleanup')
             gc.collect()
         
         if not note.file:
-            print("No file attached to note")
+            logger.warning('No file attached to note %s', note.id)
             return note.content
         
+        self.start_deadline()
         file_path = note.file.path
-        print(f"File path: {file_path}")
-        print(f"File type: {note.file_type}")
+        logger.debug('File %s of type %s', file_path, note.file_type)
         
         try:
             if note.file_type == 'pdf':
-                print("Extracting text from PDF...")
                 content = self.extract_text_from_pdf(file_path)
             elif note.file_type == 'image':
-                print("Extracting text from image...")
                 content = self.extract_text_from_image(file_path)
             else:
-                print("Reading text file...")
                 # For text files, read directly
                 with open(file_path, 'r', encoding='utf-8') as file:
                     content = file.read()
             
-            print(f"Extracted content length: {len(content) if content else 0}")
             
             # Save the extracted content to the note
             note.content = content
             note.save()
-            print(f"Content saved to note {note.id}")
+            logger.info('Extracted content saved', extra={'note_id': str(note.id), 'chars': len(content) if content else 0})
             self.log_memory_usage("after file processing")
             return content
             
         except Exception as e:
-            print(f"Error processing file: {str(e)}")
+            logger.exception('Error processing file for note %s', note.id)
             raise e
+        finally:
+            self.usage.flush(note=note, user=note.user)
+    
+    def start_processing(self, note):
+        """Extract a new note's file and move it to processing, or to abandoned if extraction fails"""
+        try:
+            self.process_uploaded_file(note)
+            # Update status to processing after content extraction
+            note.status = 'processing'
+            note.save()
+        except Exception:
+            logger.exception('Error processing uploaded file for note %s', note.id)
+            # Mark as abandoned if processing fails
+            note.status = 'abandoned'
+            note.save()
+        return note
 
 
 class TranslationService:
@@ -298,6 +349,33 @@ class TranslationService:
     
     def __init__(self):
         self.setup_gemini()
+        # Overall time budget shared by the model calls of the current request
+        self.deadline = None
+        # Token, latency and cost accounting for the model calls of the current request
+        self.usage = UsageRecorder()
+    
+    def start_deadline(self):
+        """Start a fresh request budget unless one is already running"""
+        if self.deadline is None or self.deadline.expired():
+            self.deadline = resilience.Deadline(settings.MODEL_REQUEST_BUDGET)
+        return self.deadline
+    
+    def should_abort(self, error):
+        """Whether a failure means the whole request should stop rather than degrade"""
+        if isinstance(error, resilience.CircuitOpenError):
+            return True
+        return self.deadline is not None and self.deadline.expired()
+    
+    def generate(self, contents, generation_config=None, operation='generate', retries=None):
+        """Call the model within the current deadline, with retries, hedging and circuit breaking"""
+        return resilience.generate_content(
+            contents,
+            generation_config=generation_config,
+            operation=operation,
+            deadline=self.deadline,
+            retries=retries,
+            recorder=self.usage,
+        )
     
     def log_memory_usage(self, stage=""):
         """Log current memory usage to help with debugging"""
@@ -305,10 +383,10 @@ class TranslationService:
             process = psutil.Process()
             memory_info = process.memory_info()
             memory_mb = memory_info.rss / 1024 / 1024
-            print(f"Memory usage {stage}: {memory_mb:.1f} MB")
+            logger.debug('Memory usage %s: %.1f MB', stage, memory_mb)
             return memory_mb
         except Exception as e:
-            print(f"Could not log memory usage: {e}")
+            logger.warning('Could not read memory usage: %s', e)
             return 0
     
     def check_memory_limit(self, limit_mb=500):
@@ -316,25 +394,46 @@ class TranslationService:
         try:
             memory_mb = self.log_memory_usage("memory check")
             if memory_mb > limit_mb:
-                print(f"⚠️  Memory usage {memory_mb:.1f} MB exceeds limit {limit_mb} MB")
+                logger.warning('Memory usage %.1f MB exceeds limit %s MB', memory_mb, limit_mb)
                 return False
             return True
         except Exception as e:
-            print(f"Could not check memory limit: {e}")
+            logger.warning('Could not check memory limit: %s', e)
             return True  # Allow processing if we can't check
     
     def setup_gemini(self):
         """Initialize AI service"""
         if settings.GEMINI_API_KEY:
             genai.configure(api_key=settings.GEMINI_API_KEY)
-            print("Gemini API configured successfully")
         else:
-            print("WARNING: GEMINI_API_KEY not found in settings")
+            logger.warning('GEMINI_API_KEY not found in settings')
+    
+    def detect_language(self, text):
+        """Detect the language of a text sample and return its language code"""
+        detection_prompt = f"""
+        Detect the language of the following text. Return only the language code (e.g., 'en', 'es', 'fr', 'de', 'vi', 'zh', 'ja', 'ko').
+        
+        Text: {text.strip()[:500]}  # Use first 500 chars for detection
+        """
+        
+        detection_response = self.generate(detection_prompt, operation='detect_language')
+        detected_lang = detection_response.text.strip().lower()
+        logger.debug('Detected language %s', detected_lang)
+        
+        # Clean up the response (remove quotes, extra text)
+        detected_lang = detected_lang.replace('"', '').replace("'", '').strip()
+        
+        # Map common language names to codes
+        lang_mapping = {
+            'english': 'en', 'spanish': 'es', 'french': 'fr', 'german': 'de',
+            'vietnamese': 'vi', 'chinese': 'zh', 'japanese': 'ja', 'korean': 'ko',
+            'portuguese': 'pt', 'italian': 'it', 'russian': 'ru', 'arabic': 'ar'
+        }
+        return lang_mapping.get(detected_lang, detected_lang)
     
     def translate_text(self, text, source_lang='auto', target_lang='vi'):
         """Translate text using AI and detect actual source language"""
-        print(f"Starting translate_text with {len(text)} characters")
-        print(f"Source language: {source_lang}, Target language: {target_lang}")
+        logger.debug('Translating %d characters from %s to %s', len(text), source_lang, target_lang)
         
         # Clean and validate text
         if not text or not text.strip():
@@ -342,40 +441,14 @@ class TranslationService:
         
         # Remove any problematic characters that might cause API issues
         cleaned_text = text.strip()
-        print(f"Text cleaned, length: {len(cleaned_text)}")
         
         try:
-            # Use gemini-2.5-flash consistently
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            print("AI model (gemini-2.5-flash) initialized successfully")
-            
             detected_lang = source_lang
             
             # If auto-detect, first detect the language
             if source_lang == 'auto':
-                print("Detecting language...")
-                detection_prompt = f"""
-                Detect the language of the following text. Return only the language code (e.g., 'en', 'es', 'fr', 'de', 'vi', 'zh', 'ja', 'ko').
-                
-                Text: {cleaned_text[:500]}  # Use first 500 chars for detection
-                """
-                
-                detection_response = model.generate_content(detection_prompt)
-                detected_lang = detection_response.text.strip().lower()
-                print(f"Detected language: {detected_lang}")
-                
-                # Clean up the response (remove quotes, extra text)
-                detected_lang = detected_lang.replace('"', '').replace("'", '').strip()
-                
-                # Map common language names to codes
-                lang_mapping = {
-                    'english': 'en', 'spanish': 'es', 'french': 'fr', 'german': 'de',
-                    'vietnamese': 'vi', 'chinese': 'zh', 'japanese': 'ja', 'korean': 'ko',
-                    'portuguese': 'pt', 'italian': 'it', 'russian': 'ru', 'arabic': 'ar'
-                }
-                detected_lang = lang_mapping.get(detected_lang, detected_lang)
+                detected_lang = self.detect_language(cleaned_text)
             
-            print(f"Starting translation from {detected_lang} to {target_lang}")
             prompt = f"""
             Translate the following text from {detected_lang} to {target_lang}.
             
@@ -387,7 +460,6 @@ class TranslationService:
             {cleaned_text}
             """
             
-            print("Sending translation request to AI...")
             
             # Add generation configuration similar to chatbot behavior
             generation_config = {
@@ -397,44 +469,27 @@ class TranslationService:
                 "max_output_tokens": 32768,  # Large but not excessive
             }
             
-            response = model.generate_content(
+            response = self.generate(
                 prompt,
-                generation_config=generation_config
+                generation_config=generation_config,
+                operation='translate'
             )
-            print("Translation response received")
             
             translated_text = response.text.strip()
-            print(f"Translation completed, length: {len(translated_text)}")
-            print(translated_text[:500])
+            logger.debug('Translation completed, %d characters', len(translated_text))
             
             return {
                 'translated_text': translated_text,
                 'detected_language': detected_lang
             }
             
+        except resilience.ModelCallError:
+            raise
         except Exception as e:
             raise Exception(f"Translation failed: {str(e)}")
     
-    def translate_large_text(self, text, source_lang='auto', target_lang='vi'):
-        """Translate large text by chunking it into smaller pieces"""
-        print(f"Translating large text: {len(text)} characters")
-        
-        # Detect language once at the beginning
-        detected_lang = source_lang
-        if source_lang == 'auto':
-            print("Detecting language for large text...")
-            try:
-                # Use first chunk for language detection
-                first_chunk = text[:1000]  # Use first 1000 chars for detection
-                detection_result = self.translate_text(first_chunk, 'auto', target_lang)
-                detected_lang = detection_result['detected_language']
-                print(f"Detected language: {detected_lang}")
-            except Exception as e:
-                print(f"Language detection failed, using 'en' as default: {e}")
-                detected_lang = 'en'
-        
-        # Split text into smaller chunks to avoid API issues
-        chunk_size = 10000  # Much smaller chunks to avoid 500 errors
+    def plan_chunks(self, text, chunk_size=10000):
+        """Split text into paragraph-aligned chunks of at most roughly chunk_size characters"""
         chunks = []
         
         # Split by paragraphs first, then by sentences if needed
@@ -452,37 +507,51 @@ class TranslationService:
         if current_chunk:
             chunks.append(current_chunk.strip())
         
-        print(f"Split into {len(chunks)} chunks")
+        logger.debug('Split into %d chunks', len(chunks))
+        return chunks
+    
+    def translate_large_text(self, text, source_lang='auto', target_lang='vi'):
+        """Translate large text by chunking it into smaller pieces"""
+        logger.info('Translating large text', extra={'chars': len(text)})
+        self.start_deadline()
         
-        # Function to translate a single chunk with retry logic
+        # Detect language once at the beginning
+        detected_lang = source_lang
+        if source_lang == 'auto':
+            try:
+                # Use first chunk for language detection
+                first_chunk = text[:1000]  # Use first 1000 chars for detection
+                detection_result = self.translate_text(first_chunk, 'auto', target_lang)
+                detected_lang = detection_result['detected_language']
+                logger.debug('Detected language %s', detected_lang)
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning("Language detection failed, using 'en' as default: %s", e)
+                detected_lang = 'en'
+        
+        # Split text into smaller chunks to avoid API issues
+        chunks = self.plan_chunks(text)
+        
+        # Function to translate a single chunk; retries with jittered backoff happen in the call layer
         def translate_chunk_with_retry(chunk_data):
             chunk_index, chunk = chunk_data
-            print(f"Starting translation of chunk {chunk_index + 1}/{len(chunks)} ({len(chunk)} characters)")
-            
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    # Use detected language instead of 'auto' for all chunks
-                    result = self.translate_text(chunk, detected_lang, target_lang)
-                    print(f"Chunk {chunk_index + 1} translated successfully (attempt {attempt + 1})")
-                    return chunk_index, result['translated_text'], True
-                except Exception as e:
-                    print(f"Chunk {chunk_index + 1} translation failed (attempt {attempt + 1}): {e}")
-                    if attempt < max_retries - 1:
-                        # Shorter backoff: 1, 2, 3 seconds
-                        wait_time = attempt + 1
-                        print(f"Retrying chunk {chunk_index + 1} in {wait_time} seconds...")
-                        import time
-                        time.sleep(wait_time)
+            logger.debug('Translating chunk %d/%d (%d characters)', chunk_index + 1, len(chunks), len(chunk))
             
-            print(f"Chunk {chunk_index + 1} failed after {max_retries} attempts, using original text")
-            return chunk_index, chunk, False
+            try:
+                # Use detected language instead of 'auto' for all chunks
+                result = self.translate_text(chunk, detected_lang, target_lang)
+                return chunk_index, result['translated_text'], True
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Chunk %d failed after retries, using original text: %s', chunk_index + 1, e)
+                return chunk_index, chunk, False
         
         # Process chunks in parallel
         from concurrent.futures import ThreadPoolExecutor, as_completed
         import time
         
-        print(f"Starting parallel translation of {len(chunks)} chunks...")
         start_time = time.time()
         
         translated_chunks = [None] * len(chunks)  # Pre-allocate list to maintain order
@@ -504,227 +573,558 @@ class TranslationService:
                 translated_chunks[chunk_index] = translated_text
                 
                 if success:
-                    print(f"✅ Chunk {chunk_index + 1} completed successfully")
+                    logger.info('Chunk %d translated', chunk_index + 1, extra=SAMPLED)
                 else:
-                    print(f"❌ Chunk {chunk_index + 1} failed, using original text")
+                    logger.warning('Chunk %d failed, using original text', chunk_index + 1)
         
         end_time = time.time()
-        print(f"Parallel translation completed in {end_time - start_time:.2f} seconds")
+        logger.info('Chunks translated', extra={'chunks': len(chunks), 'seconds': round(end_time - start_time, 2)})
         
         # Combine all translated chunks
         final_translation = "\n\n".join(translated_chunks)
-        print(f"Large text translation completed: {len(final_translation)} characters")
+        logger.debug('Large text translation completed, %d characters', len(final_translation))
         return final_translation, detected_lang
     
-    def translate_note(self, note):
-        """Translate a note and save the translation"""
+    # Upper bound on source characters times target languages that we pack into one
+    # multi-output prompt; larger segments are translated one language at a time
+    MULTI_TARGET_MAX_CHARS = 12000
+    
+    def parse_pages(self, content):
+        """Return the page list for page-based JSON content, or None for plain text"""
+        return pagejson.parse_pages(content)
+    
+    # Segments shorter than this are packed together into structured batch requests,
+    # up to BATCH_MAX_CHARS of source text per request
+    BATCH_SEGMENT_MAX_CHARS = 2000
+    BATCH_MAX_CHARS = 8000
+    BATCH_MAX_ROUNDS = 3
+    
+    def load_json_response(self, text):
+        """Parse a JSON model response, tolerating a surrounding markdown code fence"""
+        import json
+        clean_text = text.strip()
+        if clean_text.startswith('```json'):
+            clean_text = clean_text[7:]
+        elif clean_text.startswith('```'):
+            clean_text = clean_text[3:]
+        if clean_text.endswith('```'):
+            clean_text = clean_text[:-3]
+        return json.loads(clean_text.strip())
+    
+    def pack_segments(self, segments):
+        """Group (segment_id, text) pairs into batches for translate_batch.
+        
+        Small segments are packed together up to BATCH_MAX_CHARS; anything at or
+        above BATCH_SEGMENT_MAX_CHARS is kept in a batch of its own.
+        """
+        batches = []
+        current, current_size = [], 0
+        for segment_id, text in segments:
+            size = len(text or '')
+            if size >= self.BATCH_SEGMENT_MAX_CHARS:
+                batches.append([(segment_id, text)])
+                continue
+            if current and current_size + size > self.BATCH_MAX_CHARS:
+                batches.append(current)
+                current, current_size = [], 0
+            current.append((segment_id, text))
+            current_size += size
+        if current:
+            batches.append(current)
+        return batches
+    
+    def request_batch(self, segments, source_lang, target_lang):
+        """Send one structured batch request and return the valid {id: text} answers.
+        
+        Entries with unknown ids, duplicate ids or empty text are dropped, so the
+        caller can re-request exactly the ids that are missing.
+        """
+        import json
+        
+        payload = json.dumps({
+            'segments': [{'id': segment_id, 'text': text} for segment_id, text in segments]
+        }, ensure_ascii=False)
+        prompt = f"""
+            Translate each segment in the JSON request below from {source_lang} to {target_lang}.
+            
+            IMPORTANT: Preserve ALL markdown formatting, structure, headings (# ## ###), bullet points (- *), line breaks, and layout exactly as they appear.
+            Translate every segment independently and never merge, split or drop segments.
+            
+            Respond with a JSON object of the form {{"segments": [{{"id": "...", "text": "..."}}]}} containing
+            one entry per request segment, with the same "id" values and the translated "text".
+            Return only the JSON object without any additional commentary.
+            
+            Request:
+            {payload}
+            """
+        
+        generation_config = {
+            "temperature": 0.1,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": 32768,
+        }
+        response = self.generate(prompt, generation_config=generation_config, operation='translate_batch', retries=0)
+        data = self.load_json_response(response.text)
+        
+        if not isinstance(data, dict) or not isinstance(data.get('segments'), list):
+            raise Exception("Batch response does not match the segments schema")
+        
+        requested = {segment_id for segment_id, _ in segments}
+        answers = {}
+        duplicates = set()
+        for item in data['segments']:
+            if not isinstance(item, dict):
+                continue
+            segment_id, text = item.get('id'), item.get('text')
+            if segment_id not in requested or not isinstance(text, str) or not text.strip():
+                continue
+            if segment_id in answers:
+                duplicates.add(segment_id)
+            answers[segment_id] = text.strip()
+        
+        # An id answered twice is ambiguous; treat it as missing and ask again
+        for segment_id in duplicates:
+            del answers[segment_id]
+        return answers
+    
+    def translate_batch(self, segments, source_lang, target_lang):
+        """Translate a list of (segment_id, text) pairs with ID-based alignment.
+        
+        Segments are sent as one structured JSON request; ids that come back missing
+        or malformed are re-requested on their own for up to BATCH_MAX_ROUNDS rounds,
+        then translated individually. Returns (translations, failed) where
+        translations maps every segment_id to its text (the original text when it
+        could not be translated) and failed is the set of ids that failed.
+        """
+        originals = {str(segment_id): (segment_id, text) for segment_id, text in segments}
+        pending = [
+            (key, text) for key, (_, text) in originals.items() if text and text.strip()
+        ]
+        answers = {}
+        
+        for round_number in range(self.BATCH_MAX_ROUNDS):
+            if not pending:
+                break
+            try:
+                answers.update(self.request_batch(pending, source_lang, target_lang))
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Batch round %d failed: %s', round_number + 1, e)
+            pending = [(key, text) for key, text in pending if key not in answers]
+            if pending:
+                logger.info('Batch round %d: re-requesting %d of %d segments', round_number + 1, len(pending), len(originals))
+        
+        failed = set()
+        for key, text in pending:
+            try:
+                answers[key] = self.translate_text(text, source_lang, target_lang)['translated_text']
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Segment %s translation failed: %s', key, e)
+                failed.add(originals[key][0])
+        
+        translations = {
+            segment_id: answers.get(key, text)
+            for key, (segment_id, text) in originals.items()
+        }
+        return translations, failed
+    
+    def translate_text_multi(self, text, source_lang, target_langs):
+        """Translate text into several languages with one multi-output prompt.
+        
+        Returns a dict of language code to translated text containing only the
+        languages the model answered for; callers fill in any gaps.
+        """
+        keys = ', '.join(f'"{lang}"' for lang in target_langs)
+        prompt = f"""
+            Translate the following text from {source_lang} into each of these languages: {', '.join(target_langs)}.
+            
+            IMPORTANT: Preserve ALL markdown formatting, structure, headings (# ## ###), bullet points (- *), line breaks, and layout exactly as they appear.
+            Do not change the markdown syntax, only translate the text content.
+            
+            Respond with a JSON object whose keys are exactly {keys} and whose values are the complete translations.
+            Return only the JSON object without any additional commentary.
+            
+            Text to translate:
+            {text.strip()}
+            """
+        
+        generation_config = {
+            "temperature": 0.1,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": 32768,
+        }
+        response = self.generate(prompt, generation_config=generation_config, operation='translate_multi', retries=0)
+        
+        data = self.load_json_response(response.text)
+        if not isinstance(data, dict):
+            raise Exception("Multi-target response is not a JSON object")
+        
+        return {
+            lang: data[lang].strip()
+            for lang in target_langs
+            if isinstance(data.get(lang), str) and data[lang].strip()
+        }
+    
+    def translate_segment(self, text, source_lang, target_langs):
+        """Translate one segment into every target language.
+        
+        Returns (translations, failed) where translations maps each language to its
+        text (the original text when that language failed) and failed is the set of
+        languages that could not be translated.
+        """
+        if not text or not text.strip():
+            return {lang: text for lang in target_langs}, set()
+        
+        translations = {}
+        if len(target_langs) > 1 and len(text) * len(target_langs) <= self.MULTI_TARGET_MAX_CHARS:
+            try:
+                translations = self.translate_text_multi(text, source_lang, target_langs)
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Multi-target translation failed, falling back to one request per language: %s', e)
+        
+        failed = set()
+        for lang in target_langs:
+            if lang in translations:
+                continue
+            try:
+                translations[lang] = self.translate_text(text, source_lang, lang)['translated_text']
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Translation to %s failed: %s', lang, e)
+                translations[lang] = text
+                failed.add(lang)
+        return translations, failed
+    
+    def translate_note(self, note, build_glossary=None):
+        """Translate a note into its target language and save the translation"""
+        return self.translate_note_multi(note, [note.target_language], build_glossary=build_glossary)[0]
+    
+    def translate_note_multi(self, note, target_languages, build_glossary=None):
+        """Translate a note into several target languages in one pipeline run.
+        
+        Source parsing, language detection and chunk planning happen once and are
+        shared by every target; each segment is then translated into all targets,
+        using a single multi-output prompt where the segment is small enough.
+        Returns the saved translations in the order of target_languages. Usage for
+        the whole run is stored in each translation's metadata and in ModelUsage.
+        
+        With build_glossary (default settings.GLOSSARY_ENABLED) the run also
+        extracts the note's difficult terms and stores their definitions in the
+        note's glossary for every target language.
+        """
+        if build_glossary is None:
+            build_glossary = settings.GLOSSARY_ENABLED
+        try:
+            return self._translate_note_multi(note, target_languages, build_glossary)
+        finally:
+            self.usage.flush(note=note, user=note.user)
+    
+    def _translate_note_multi(self, note, target_languages, build_glossary=False):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        import time
+        
         if not note.content:
             raise Exception("Note has no content to translate")
         
-        print(f"Starting translation for note {note.id} - {note.title}")
-        print(f"Content type: {type(note.content)}")
-        print(f"Content length: {len(note.content) if note.content else 0}")
-        print(f"Content preview: {note.content[:500] if note.content else 'None'}...")
+        target_languages = list(dict.fromkeys(lang for lang in target_languages if lang))
+        if not target_languages:
+            raise Exception("No target languages provided")
+        
+        logger.info('Translating note', extra={'note_id': str(note.id), 'target_languages': target_languages, 'chars': len(note.content)})
         self.log_memory_usage("before translation start")
-        detected_language = None
+        self.start_deadline()
         
-        # Check if content is page-based JSON or plain text
-        try:
-            import json
-            print(f"🔍 Attempting to parse content as JSON...")
-            print(f"Content type: {type(note.content)}")
-            print(f"Content length: {len(note.content) if note.content else 0}")
-            print(f"Content preview: {note.content[:500] if note.content else 'None'}")
-            
-            pages_data = json.loads(note.content)
-            print(f"✅ Parsed JSON successfully, type: {type(pages_data)}")
-            print(f"JSON length: {len(pages_data) if isinstance(pages_data, list) else 'Not a list'}")
-            
-            if isinstance(pages_data, list) and len(pages_data) > 0 and 'page_number' in pages_data[0]:
-                # Page-based content - translate each page individually for better accuracy
-                translated_pages = []
-                print(f"Translating {len(pages_data)} pages individually")
-                print(f"Content preview: {note.content[:200]}...")
-                
-                # Function to translate a single page
-                def translate_single_page(page_data):
-                    page_num = page_data['page_number']
-                    content = page_data['content']
-                    print(f"Translating page {page_num} ({len(content)} characters)")
-                    
-                    try:
-                        result = self.translate_text(
-                            content,
-                            note.source_language,
-                            note.target_language
-                        )
-                        print(f"Page {page_num} translated successfully")
-                        return page_num, result['translated_text'], result['detected_language'], True
-                    except Exception as e:
-                        print(f"Page {page_num} translation failed: {e}")
-                        return page_num, content, None, False
-                
-                # Process pages in parallel for better performance
-                from concurrent.futures import ThreadPoolExecutor, as_completed
-                import time
-                
-                print(f"Starting parallel translation of {len(pages_data)} pages...")
-                self.log_memory_usage("before translation")
-                start_time = time.time()
-                completed_translations = 0
-                
-                # Use ThreadPoolExecutor for parallel processing
-                # Limit to 2 concurrent requests to reduce memory usage
-                max_workers = min(2, len(pages_data))
-                
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    # Submit all pages for translation
-                    future_to_page = {
-                        executor.submit(translate_single_page, page_data): page_data['page_number'] 
-                        for page_data in pages_data
-                    }
-                    
-                    # Collect results as they complete
-                    for future in as_completed(future_to_page):
-                        page_num, translated_text, detected_lang, success = future.result()
-                        
-                        # Use the detected language from the first successful translation
-                        if detected_language is None and detected_lang:
-                            detected_language = detected_lang
-                        
-                        translated_pages.append({
-                            'page_number': page_num,
-                            'content': translated_text
-                        })
-                        
-                        completed_translations += 1
-                        if success:
-                            print(f"✅ Page {page_num} translated successfully ({completed_translations}/{len(pages_data)})")
-                        else:
-                            print(f"❌ Page {page_num} failed, using original content ({completed_translations}/{len(pages_data)})")
-                        
-                        # Clean up memory after each translation
-                        gc.collect()
-                
-                end_time = time.time()
-                print(f"Parallel page translation completed in {end_time - start_time:.2f} seconds")
-                self.log_memory_usage("after translation")
-                
-                # Sort pages by page number to maintain order
-                translated_pages.sort(key=lambda x: x['page_number'])
-                
-                translated_content = json.dumps(translated_pages)
-                
-                # Clean up memory after translation
-                del translated_pages
-                gc.collect()
-                self.log_memory_usage("after translation cleanup")
-            else:
-                # Plain text content
-                result = self.translate_text(
-                    note.content,
-                    note.source_language,
-                    note.target_language
+        # Parse the source once: page-based JSON keeps its pages, plain text is chunked
+        pages_data = self.parse_pages(note.content)
+        if pages_data is not None:
+            logger.debug('Translating %d pages', len(pages_data))
+            segments = [(page['page_number'], page.get('content') or '') for page in pages_data]
+        else:
+            logger.debug('Translating plain text content')
+            segments = list(enumerate(self.plan_chunks(note.content)))
+        
+        # Detect the source language once for every segment and target
+        detected_language = note.source_language
+        if note.source_language == 'auto':
+            sample = next((content for _, content in segments if content and content.strip()), '')
+            try:
+                detected_language = self.detect_language(sample)
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning("Language detection failed, using 'en' as default: %s", e)
+                detected_language = 'en'
+        
+        def translate_single_batch(batch):
+            # A lone segment can use a multi-output prompt across all targets; several
+            # small segments go out as one structured request per target instead
+            if len(batch) == 1:
+                segment_id, content = batch[0]
+                translations, failed = self.translate_segment(content, detected_language, target_languages)
+                return [(segment_id, translations, failed)]
+            
+            per_language = {}
+            for lang in target_languages:
+                per_language[lang] = self.translate_batch(batch, detected_language, lang)
+            return [
+                (
+                    segment_id,
+                    {lang: per_language[lang][0][segment_id] for lang in target_languages},
+                    {lang for lang in target_languages if segment_id in per_language[lang][1]},
                 )
-                translated_content = result['translated_text']
-                detected_language = result['detected_language']
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
-            # Plain text content
-            print(f"❌ JSON parsing failed: {e}")
-            print(f"Error type: {type(e)}")
-            print("Treating as plain text content")
-            print(f"About to translate {len(note.content)} characters of plain text")
-            
-            # Try direct translation first, fallback to chunking if it fails
-            if len(note.content) > 10000:  # 10KB limit per chunk
-                print("Large text detected, trying direct translation first...")
-                try:
-                    # Try to translate the entire text at once (like the chatbot does)
-                    result = self.translate_text(
-                        note.content,
-                        note.source_language,
-                        note.target_language
-                    )
-                    print("Direct translation successful!")
-                    translated_content = result['translated_text']
-                    detected_language = result['detected_language']
-                except Exception as direct_error:
-                    print(f"Direct translation failed: {direct_error}")
-                    print("Falling back to chunked translation...")
-                    translated_content, detected_language = self.translate_large_text(
-                        note.content,
-                        note.source_language,
-                        note.target_language
-                    )
-            else:
-                try:
-                    result = self.translate_text(
-                        note.content,
-                        note.source_language,
-                        note.target_language
-                    )
-                    print("Translation completed successfully")
-                    translated_content = result['translated_text']
-                    detected_language = result['detected_language']
-                except Exception as translate_error:
-                    print(f"Translation failed: {translate_error}")
-                    raise translate_error
+                for segment_id, _ in batch
+            ]
+        
+        batches = self.pack_segments(segments)
+        logger.debug('Translating %d segments in %d requests', len(segments), len(batches))
+        self.log_memory_usage("before translation")
+        start_time = time.time()
+        
+        translated = {lang: {} for lang in target_languages}
+        failures = {lang: 0 for lang in target_languages}
+        
+        # Limit to 2 concurrent requests to reduce memory usage
+        max_workers = min(2, len(batches))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(translate_single_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                for segment_id, translations, failed in future.result():
+                    for lang in target_languages:
+                        translated[lang][segment_id] = translations[lang]
+                        if lang in failed:
+                            failures[lang] += 1
+                gc.collect()
+        
+        logger.info('Segments translated', extra={'note_id': str(note.id), 'segments': len(segments), 'requests': len(batches), 'seconds': round(time.time() - start_time, 2)})
+        self.log_memory_usage("after translation")
+        
+        translatable = sum(1 for _, content in segments if content and content.strip())
+        for lang in target_languages:
+            if translatable and failures[lang] == translatable:
+                raise Exception(f"Translation to {lang} failed for every segment")
         
         # Update the note with detected language
         if detected_language and note.source_language == 'auto':
             note.detected_language = detected_language
-            note.save()
+            note.save(update_fields=['detected_language', 'updated_at'])
         
-        print(f"Translation completed. Content length: {len(translated_content) if translated_content else 0}")
-        print(f"Translated content preview: {translated_content[:200] if translated_content else 'None'}...")
-        self.log_memory_usage("after translation completion")
-        
-        # Create or update translation
-        translation, created = Translation.objects.get_or_create(
-            note=note,
-            defaults={
-                'translated_content': translated_content,
-                'translation_metadata': {
-                    'source_language': note.source_language,
-                    'detected_language': detected_language,
-                    'target_language': note.target_language,
-                    'model_used': 'ai-translation'
+        usage_summary = self.usage.summary()
+        saved = []
+        for lang in target_languages:
+            if pages_data is not None:
+                translated_content = pagejson.dump_pages(
+                    (segment_id, translated[lang][segment_id]) for segment_id, _ in segments
+                )
+            else:
+                translated_content = "\n\n".join(translated[lang][segment_id] for segment_id, _ in segments)
+            
+            translation, created = Translation.objects.update_or_create(
+                note=note,
+                target_language=lang,
+                defaults={
+                    'translated_content': translated_content,
+                    'translation_metadata': {
+                        'source_language': note.source_language,
+                        'detected_language': detected_language,
+                        'target_language': lang,
+                        'model_used': ', '.join(usage_summary['models']) or 'gemini-2.5-flash',
+                        'failed_segments': failures[lang],
+                        # Usage covers the whole run, shared by every target language in it
+                        'run_target_languages': target_languages,
+                        'usage': usage_summary,
+                    }
                 }
-            }
-        )
-        
-        if not created:
-            translation.translated_content = translated_content
-            translation.translation_metadata.update({
-                'source_language': note.source_language,
-                'target_language': note.target_language,
-                'model_used': 'ai-translation'
-            })
-            translation.save()
-        
-        print(f"Translation saved. Created: {created}, ID: {translation.id}")
-        print(f"Final translation length: {len(translation.translated_content) if translation.translated_content else 0}")
+            )
+            logger.info('Translation saved', extra={'note_id': str(note.id), 'target_language': lang, 'new_row': created})
+            saved.append(translation)
         
         # Final memory cleanup
+        del translated
         gc.collect()
         self.log_memory_usage("after saving translation")
         
-        return translation
+        # The glossary is a bonus: a failure here never fails the translation
+        if build_glossary:
+            try:
+                self.build_glossary(note, segments, detected_language, target_languages, paged=pages_data is not None)
+            except Exception as e:
+                logger.warning('Glossary generation failed for note %s: %s', note.id, e)
+        
+        return saved
+    
+    # Source characters per term extraction request when building a glossary
+    GLOSSARY_EXTRACT_MAX_CHARS = 30000
+    
+    def extract_glossary_terms(self, segments, source_lang):
+        """Pick the difficult terms of a document, with the sentence each appears in.
+        
+        Segments are packed into few large requests. Returns a list of
+        (term, sentence, segment_id) in document order, deduplicated and capped
+        at GLOSSARY_MAX_TERMS.
+        """
+        from translation.cache import normalize_word
+        
+        batches = []
+        current, current_size = [], 0
+        for segment_id, text in segments:
+            if not text or not text.strip():
+                continue
+            text = text[:self.GLOSSARY_EXTRACT_MAX_CHARS]
+            if current and current_size + len(text) > self.GLOSSARY_EXTRACT_MAX_CHARS:
+                batches.append(current)
+                current, current_size = [], 0
+            current.append((segment_id, text))
+            current_size += len(text)
+        if current:
+            batches.append(current)
+        
+        terms = {}
+        for batch in batches:
+            payload = json.dumps({
+                'sections': [{'id': str(segment_id), 'text': text} for segment_id, text in batch]
+            }, ensure_ascii=False)
+            prompt = f"""
+From each section of the {source_lang} document below, pick up to {settings.GLOSSARY_TERMS_PER_PAGE} words or short phrases
+that a language learner would most likely need to look up: technical terms, idioms and uncommon vocabulary.
+Skip names, numbers and very common words.
+
+Respond with a JSON object of the form {{"terms": [{{"id": "section id", "term": "term exactly as written", "sentence": "the sentence it appears in"}}]}}.
+Return only the JSON object.
+
+Request:
+{payload}
+"""
+            try:
+                response = self.generate(prompt, operation='glossary_terms', retries=1)
+                data = self.load_json_response(response.text)
+            except Exception as e:
+                if self.should_abort(e):
+                    raise
+                logger.warning('Glossary term extraction failed for one batch: %s', e)
+                continue
+            
+            segment_ids = {str(segment_id): segment_id for segment_id, _ in batch}
+            for item in (data.get('terms') or []) if isinstance(data, dict) else []:
+                if not isinstance(item, dict) or not isinstance(item.get('term'), str):
+                    continue
+                key = normalize_word(item['term'])
+                if not key or key in terms:
+                    continue
+                sentence = item.get('sentence') if isinstance(item.get('sentence'), str) else ''
+                terms[key] = (item['term'].strip(), sentence, segment_ids.get(str(item.get('id'))))
+            if len(terms) >= settings.GLOSSARY_MAX_TERMS:
+                break
+        
+        return list(terms.values())[:settings.GLOSSARY_MAX_TERMS]
+    
+    def build_glossary(self, note, segments, source_lang, target_languages, paged=True):
+        """Extract a note's difficult terms and store their definitions for each target language.
+        
+        Segment ids are page numbers when paged is true; otherwise entries get no page.
+        """
+        from translation.cache import normalize_word
+        
+        terms = self.extract_glossary_terms(segments, source_lang)
+        logger.info('Glossary built', extra={'note_id': str(note.id), 'terms': len(terms)})
+        if not terms:
+            return 0
+        
+        items = [(index, term, sentence) for index, (term, sentence, _) in enumerate(terms)]
+        created = 0
+        for lang in target_languages:
+            definitions, errors = self.get_word_definitions(items, source_lang, lang)
+            entries = []
+            for index, (term, _, segment_id) in enumerate(terms):
+                if index not in definitions:
+                    continue
+                entries.append(GlossaryEntry(
+                    note=note,
+                    term=normalize_word(term)[:200],
+                    display_term=term[:200],
+                    source_language=source_lang,
+                    target_language=lang,
+                    page_number=segment_id if paged else None,
+                    definition=definitions[index],
+                ))
+            GlossaryEntry.objects.filter(note=note, target_language=lang).delete()
+            GlossaryEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            created += len(entries)
+        return created
 
     def get_word_definition(self, word, source_lang='en', target_lang='vi', context=''):
-        """Get comprehensive word definition, translation, and context using AI"""
+        """Get comprehensive word definition, translation, and context using AI.
+        
+        Context-independent fields are cached per normalized word and language pair,
+        the context analysis additionally per context window, so repeat lookups
+        need no model call and a known word in a new context needs only a small one.
+        """
+        from translation.cache import definition_cache, base_key, context_key, BASE_FIELDS, CONTEXT_FIELDS
+        
+        logger.debug('Defining word %r with %d characters of context', word, len(context))
+        
+        # If auto-detect, assume English for now
+        if source_lang == 'auto':
+            source_lang = 'en'
+        
+        base_cache_key = base_key(word, source_lang, target_lang)
+        context_cache_key = context_key(word, source_lang, target_lang, context)
+        base = definition_cache.get(base_cache_key)
+        context_part = definition_cache.get(context_cache_key)
+        
+        if base is not None and context_part is not None:
+            self.usage.record_cache_hit('define_word')
+            return {**base, **context_part}
+        
         try:
-            print(f"🔍 Getting definition for word: '{word}'")
-            print(f"📖 Context length: {len(context)} characters")
-            print(f"📖 Context preview: {context[:300]}...")
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            # If auto-detect, assume English for now
-            if source_lang == 'auto':
-                source_lang = 'en'
+            if base is None:
+                definition_data = self.request_word_definition(word, source_lang, target_lang, context)
+                base = {key: definition_data.get(key, '') for key in BASE_FIELDS}
+                definition_cache.set(base_cache_key, 'base', word, source_lang, target_lang, base)
+            else:
+                definition_data = self.request_context_analysis(word, source_lang, target_lang, context)
             
-            prompt = f"""
+            context_part = {key: definition_data.get(key, '') for key in CONTEXT_FIELDS}
+            definition_cache.set(context_cache_key, 'context', word, source_lang, target_lang, context_part)
+            return {**base, **context_part}
+        
+        except json.JSONDecodeError as e:
+            # Fallback if JSON parsing fails; never cached
+            logger.warning('Could not parse definition response: %s', e)
+            definition_data = {
+                "definition": f"Definition for '{word}' could not be parsed",
+                "translation": f"Translation to {target_lang}",
+                "context": f"Used in the context: {context[:100]}...",
+                "example": f"Example: The word '{word}' is commonly used in academic texts.",
+                "type": "Unknown",
+                "level": "Intermediate",
+                "usage_notes": "Analysis based on AI response parsing"
+            }
+            # Keep any context-independent fields we already had cached
+            definition_data.update(base or {})
+            return definition_data
+        except Exception as e:
+            # Fallback response
+            return {
+                "definition": f"Definition for '{word}' could not be retrieved: {str(e)}",
+                "translation": f"Translation to {target_lang}",
+                "context": f"Used in the provided context",
+                "example": f"Example: The term '{word}' appears in the document.",
+                "type": "Unknown",
+                "level": "Intermediate",
+                "usage_notes": "Error occurred during analysis"
+            }
+    
+    def request_word_definition(self, word, source_lang, target_lang, context):
+        """Ask the model for the full definition of a word in context"""
+        prompt = f"""
 Provide a comprehensive analysis of the word/phrase: "{word}"
 
 **Full Context from Document:**
@@ -752,45 +1152,196 @@ Format your response as JSON with these exact keys:
 
 The context provided is the full paragraph/section where this word appears. Use it to provide a thorough analysis of how this specific word contributes to the meaning and flow of the text.
 """
+        response = self.generate(prompt, operation='define_word', retries=1)
+        data = self.load_json_response(response.text)
+        if not isinstance(data, dict):
+            raise json.JSONDecodeError("Definition response is not a JSON object", response.text, 0)
+        return data
+    
+    def request_context_analysis(self, word, source_lang, target_lang, context):
+        """Ask the model only for the context-dependent part of a definition"""
+        prompt = f"""
+Explain how the word/phrase "{word}" is used in the following context from a document.
+
+**Full Context from Document:**
+{context}
+
+Format your response as JSON with these exact keys:
+{{
+    "context": "detailed explanation of how the word contributes to the context",
+    "example": "relevant example sentence",
+    "usage_notes": "important usage information"
+}}
+"""
+        response = self.generate(prompt, operation='define_word_context', retries=1)
+        data = self.load_json_response(response.text)
+        if not isinstance(data, dict):
+            raise json.JSONDecodeError("Context response is not a JSON object", response.text, 0)
+        return data
+    
+    # Words defined per packed model request in get_word_definitions
+    DEFINE_BATCH_SIZE = 100
+    
+    def get_word_definitions(self, items, source_lang='en', target_lang='vi'):
+        """Define many words at once: from cache where possible, the rest in packed requests.
+        
+        items is a list of (item_id, word, context). Duplicate lookups are resolved
+        once. Returns {item_id: definition dict} and {item_id: error message} for
+        the items that could not be defined.
+        """
+        from translation.cache import definition_cache, base_key, context_key, BASE_FIELDS, CONTEXT_FIELDS
+        
+        if source_lang == 'auto':
+            source_lang = 'en'
+        
+        # Deduplicate on the cache keys, so the same word in the same context is looked up once
+        lookups = {}
+        for item_id, word, context in items:
+            keys = (base_key(word, source_lang, target_lang), context_key(word, source_lang, target_lang, context))
+            lookups.setdefault(keys, {'word': word, 'context': context, 'item_ids': []})['item_ids'].append(item_id)
+        
+        cached = definition_cache.get_many([key for keys in lookups for key in keys])
+        resolved = {}
+        pending = []
+        for keys, lookup in lookups.items():
+            if keys[0] in cached and keys[1] in cached:
+                resolved[keys] = {**cached[keys[0]], **cached[keys[1]]}
+                self.usage.record_cache_hit('define_word')
+            else:
+                pending.append((keys, lookup))
+        
+        errors = {}
+        new_entries = []
+        for batch_start in range(0, len(pending), self.DEFINE_BATCH_SIZE):
+            batch = pending[batch_start:batch_start + self.DEFINE_BATCH_SIZE]
+            requests = {str(index): entry for index, entry in enumerate(batch)}
             
-            response = model.generate_content(prompt)
-            
-            # Try to parse JSON response
-            try:
-                import json
-                import re
-                
-                # Clean the response text - remove markdown code blocks if present
-                clean_text = response.text.strip()
-                if clean_text.startswith('```json'):
-                    clean_text = clean_text[7:]  # Remove ```json
-                if clean_text.endswith('```'):
-                    clean_text = clean_text[:-3]  # Remove ```
-                clean_text = clean_text.strip()
-                
-                definition_data = json.loads(clean_text)
-            except (json.JSONDecodeError, ValueError):
-                # Fallback if JSON parsing fails
-                definition_data = {
-                    "definition": f"Definition for '{word}': {response.text[:200]}...",
-                    "translation": f"Translation to {target_lang}",
-                    "context": f"Used in the context: {context[:100]}...",
-                    "example": f"Example: The word '{word}' is commonly used in academic texts.",
-                    "type": "Unknown",
-                    "level": "Intermediate",
-                    "usage_notes": "Analysis based on AI response parsing"
-                }
-            
-            return definition_data
+            for round_number in range(self.BATCH_MAX_ROUNDS):
+                if not requests:
+                    break
+                try:
+                    answers = self.request_word_definitions(requests, source_lang, target_lang)
+                except Exception as e:
+                    if self.should_abort(e):
+                        raise
+                    logger.warning('Definition batch round %d failed: %s', round_number + 1, e)
+                    answers = {}
+                for request_id, data in answers.items():
+                    keys, lookup = requests.pop(request_id)
+                    base = {key: data.get(key, '') for key in BASE_FIELDS}
+                    context_part = {key: data.get(key, '') for key in CONTEXT_FIELDS}
+                    resolved[keys] = {**base, **context_part}
+                    new_entries.append((keys[0], 'base', lookup['word'], source_lang, target_lang, base))
+                    new_entries.append((keys[1], 'context', lookup['word'], source_lang, target_lang, context_part))
             
-        except Exception as e:
-            # Fallback response
-            return {
-                "definition": f"Definition for '{word}' could not be retrieved: {str(e)}",
-                "translation": f"Translation to {target_lang}",
-                "context": f"Used in the provided context",
-                "example": f"Example: The term '{word}' appears in the document.",
-                "type": "Unknown",
-                "level": "Intermediate",
-                "usage_notes": "Error occurred during analysis"
+            for keys, lookup in requests.values():
+                for item_id in lookup['item_ids']:
+                    errors[item_id] = f"Definition for '{lookup['word']}' could not be retrieved"
+        
+        definition_cache.set_many(new_entries)
+        
+        results = {}
+        for keys, lookup in lookups.items():
+            if keys in resolved:
+                for item_id in lookup['item_ids']:
+                    results[item_id] = dict(resolved[keys])
+        return results, errors
+    
+    def request_word_definitions(self, requests, source_lang, target_lang):
+        """Send one packed definition request; returns the valid answers by request id"""
+        from translation.cache import BASE_FIELDS, CONTEXT_FIELDS
+        
+        payload = json.dumps({
+            'words': [
+                {'id': request_id, 'word': lookup['word'], 'context': lookup['context']}
+                for request_id, (_, lookup) in requests.items()
+            ]
+        }, ensure_ascii=False)
+        prompt = f"""
+Define each word/phrase in the JSON request below, as used in its context. The words are in {source_lang}.
+
+For every entry provide:
+- "definition": a clear definition of what the word/phrase means
+- "translation": accurate translation to {target_lang}, or 'N/A (Already in {target_lang})'
+- "context": how the word/phrase is used in its context
+- "example": a relevant example sentence
+- "type": part of speech (noun, verb, adjective, adverb, phrase, etc.)
+- "level": difficulty level (Beginner, Intermediate, Advanced)
+- "usage_notes": important notes about how it is used
+
+Keep each field to one or two sentences.
+Respond with a JSON object of the form {{"definitions": [{{"id": "...", "definition": "...", ...}}]}} with exactly
+one entry per request entry and the same "id" values. Return only the JSON object.
+
+Request:
+{payload}
+"""
+        generation_config = {
+            "temperature": 0.1,
+            "max_output_tokens": 32768,
+        }
+        response = self.generate(prompt, generation_config=generation_config, operation='define_word_batch', retries=0)
+        data = self.load_json_response(response.text)
+        if not isinstance(data, dict) or not isinstance(data.get('definitions'), list):
+            raise Exception("Definition batch response does not match the definitions schema")
+        
+        answers = {}
+        for item in data['definitions']:
+            if not isinstance(item, dict) or item.get('id') not in requests:
+                continue
+            if not isinstance(item.get('definition'), str) or not item['definition'].strip():
+                continue
+            answers[item['id']] = {
+                key: item.get(key) if isinstance(item.get(key), str) else ''
+                for key in BASE_FIELDS + CONTEXT_FIELDS
             }
+        return answers
+    
+    def translate_snippets(self, texts, source_lang='auto', target_lang='vi'):
+        """Translate many snippets: from cache where possible, the rest in structured batches.
+        
+        Identical snippets are translated once. Returns {index: translated_text}
+        and {index: error message} keyed by position in texts.
+        """
+        from translation.cache import definition_cache, snippet_key
+        
+        unique = {}
+        for index, text in enumerate(texts):
+            unique.setdefault(text.strip(), []).append(index)
+        
+        keys = {text: snippet_key(text, source_lang, target_lang) for text in unique}
+        cached = definition_cache.get_many(list(keys.values()))
+        
+        translated = {}
+        pending = []
+        for text, key in keys.items():
+            if key in cached:
+                translated[text] = cached[key]['translated_text']
+                self.usage.record_cache_hit('translate_snippet')
+            else:
+                pending.append(text)
+        
+        detected_lang = source_lang
+        if source_lang == 'auto' and pending:
+            detected_lang = self.detect_language(' '.join(pending[:20]))
+        
+        errors = {}
+        new_entries = []
+        for batch in self.pack_segments(list(enumerate(pending))):
+            translations, failed = self.translate_batch(batch, detected_lang, target_lang)
+            for segment_id, text in batch:
+                if segment_id in failed:
+                    for index in unique[text]:
+                        errors[index] = 'Translation failed'
+                    continue
+                translated[text] = translations[segment_id]
+                new_entries.append((keys[text], 'snippet', text, source_lang, target_lang, {'translated_text': translations[segment_id]}))
+        
+        definition_cache.set_many(new_entries)
+        
+        results = {}
+        for text, indexes in unique.items():
+            if text in translated:
+                for index in indexes:
+                    results[index] = translated[text]
+        return results, errors
@@ -0,0 +1,154 @@
+"""Chunked, resumable uploads.
+
+A client creates an Upload with the file's size, then sends the bytes in order
+with PATCH requests carrying Upload-Offset. Each chunk is streamed from the
+request straight onto the end of a partial file, so memory stays constant
+however large the file is and any worker can take the next chunk. The partial
+file's length is the source of truth for the offset: after a dropped
+connection the client asks for the offset and continues from there. When the
+last byte arrives the file is hashed in one pass, its pages are counted by the
+PDF library, and it is moved into place for the usual Note creation and text
+extraction flow.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Note, Upload
+
+logger = logging.getLogger(__name__)
+
+
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """The client's Upload-Offset is not where the partial file ends"""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+def partial_path(upload):
+    return os.path.join(settings.UPLOAD_PARTIAL_DIR, f'{upload.id}.part')
+
+
+def current_offset(upload):
+    try:
+        return os.path.getsize(partial_path(upload))
+    except OSError:
+        return 0
+
+
+def discard(upload):
+    """Remove an unfinished upload's partial file"""
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def append_chunk(upload, stream, offset, length):
+    """Append length bytes from stream at offset; returns the new offset.
+
+    Raises OffsetMismatch if offset is not the end of the partial file, and
+    ChunkTooLarge if the chunk is over UPLOAD_MAX_CHUNK_SIZE or past the
+    declared size. A connection dropped mid-chunk leaves the bytes that did
+    arrive; the client resumes from the offset it is then given.
+    """
+    if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise ChunkTooLarge(f"Chunks are limited to {settings.UPLOAD_MAX_CHUNK_SIZE} bytes")
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as f:
+        # One writer per upload across threads and worker processes
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            end = f.seek(0, os.SEEK_END)
+            if offset != end:
+                raise OffsetMismatch(end)
+            if end + length > upload.size:
+                raise ChunkTooLarge(f"Chunk runs past the declared size of {upload.size} bytes")
+            remaining = length
+            try:
+                while remaining > 0:
+                    data = stream.read(min(READ_SIZE, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining -= len(data)
+            finally:
+                f.flush()
+                upload.received = end + length - remaining
+                Upload.objects.filter(pk=upload.pk).update(received=upload.received, updated_at=timezone.now())
+            if upload.received == upload.size and upload.note_id is None:
+                finish(upload)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return upload.received
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                return hasher.hexdigest()
+            hasher.update(data)
+
+
+def _count_pages(path, file_type):
+    """Pages in a completed PDF as the PDF library reads them; 0 for other files"""
+    if file_type != 'pdf':
+        return 0
+    try:
+        import fitz  # PyMuPDF, which also sees pages inside compressed object streams
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception as e:
+        logger.warning('Could not count pages in %s: %s', path, e)
+        return 0
+
+
+def finish(upload):
+    """Hash and count the completed file, move it into place and create its note"""
+    path = partial_path(upload)
+    upload.sha256 = _sha256(path)
+    upload.page_count = _count_pages(path, upload.file_type)
+    name = default_storage.get_available_name('notes/' + os.path.basename(upload.filename))
+    destination = default_storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # A rename when UPLOAD_PARTIAL_DIR shares MEDIA_ROOT's filesystem, a copy otherwise
+    shutil.move(path, destination)
+
+    note = Note(
+        user=upload.user,
+        title=upload.title,
+        file_type=upload.file_type,
+        source_language=upload.source_language,
+        target_language=upload.target_language,
+        status='draft',
+    )
+    note.file.name = name
+    note.save()
+    upload.note = note
+    upload.save(update_fields=['note', 'sha256', 'page_count', 'updated_at'])
+    logger.info('Upload complete', extra={
+        'upload_id': str(upload.id), 'note_id': str(note.id), 'bytes': upload.size, 'pages': upload.page_count,
+    })
+
+    from .services import NoteService
+    NoteService().start_processing(note)
+    return note
@@ -1,8 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NoteViewSet
+from .views import NoteViewSet, UploadViewSet
 
 router = DefaultRouter()
+# Before the note routes, whose detail pattern would otherwise match uploads/
+router.register(r'uploads', UploadViewSet)
 router.register(r'', NoteViewSet)
 
 urlpatterns = [
@@ -0,0 +1,139 @@
+"""Per-call token, latency and cost accounting for model calls"""
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import ModelUsage
+
+
+# Gemini bills images at a flat token rate; text is estimated at ~4 characters per token
+IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(contents):
+    """Rough token count for a prompt made of strings and images"""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN + 1
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+def response_tokens(contents, response):
+    """(input_tokens, output_tokens, estimated) for a finished call"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        return usage.prompt_token_count, getattr(usage, 'candidates_token_count', 0) or 0, False
+    try:
+        output_text = response.text or ''
+    except Exception:
+        output_text = ''
+    return estimate_tokens(contents), len(output_text) // CHARS_PER_TOKEN, True
+
+
+def call_cost(model_name, input_tokens, output_tokens):
+    """Cost in USD from MODEL_PRICING, which is expressed per million tokens"""
+    pricing = settings.MODEL_PRICING.get(model_name)
+    if not pricing:
+        return Decimal('0')
+    cost = (input_tokens * pricing['input'] + output_tokens * pricing['output']) / 1_000_000
+    return Decimal(str(round(cost, 6)))
+
+
+class UsageRecorder:
+    """Collects usage for the model calls of one request and persists it in bulk.
+
+    Recording is thread-safe so the pipeline's worker threads can share one
+    recorder; nothing touches the database until flush().
+    """
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record_call(self, operation, model_name, contents, response=None, latency=0.0,
+                    retries=0, hedged=False, success=True):
+        if response is not None:
+            input_tokens, output_tokens, estimated = response_tokens(contents, response)
+        else:
+            input_tokens, output_tokens, estimated = estimate_tokens(contents), 0, True
+        record = ModelUsage(
+            operation=operation,
+            model_name=model_name,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            tokens_estimated=estimated,
+            latency_ms=int(latency * 1000),
+            retries=retries,
+            hedged=hedged,
+            success=success,
+            cost_usd=call_cost(model_name, input_tokens, output_tokens),
+        )
+        with self._lock:
+            self.records.append(record)
+
+    def record_cache_hit(self, operation, model_name='gemini-2.5-flash'):
+        """Record a lookup answered from cache in place of a model call"""
+        record = ModelUsage(operation=operation, model_name=model_name, cache_hit=True)
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        """Aggregate of everything recorded so far, for translation_metadata"""
+        with self._lock:
+            records = list(self.records)
+        calls = [r for r in records if not r.cache_hit]
+        return {
+            'calls': len(calls),
+            'failed_calls': sum(1 for r in calls if not r.success),
+            'input_tokens': sum(r.input_tokens for r in calls),
+            'output_tokens': sum(r.output_tokens for r in calls),
+            'tokens_estimated': any(r.tokens_estimated for r in calls),
+            'latency_seconds': round(sum(r.latency_ms for r in calls) / 1000, 3),
+            'retries': sum(r.retries for r in calls),
+            'hedged_calls': sum(1 for r in calls if r.hedged),
+            'cache_hits': len(records) - len(calls),
+            'cost_usd': float(sum((r.cost_usd for r in calls), Decimal('0'))),
+            'models': sorted({r.model_name for r in calls}),
+        }
+
+    def flush(self, note=None, user=None):
+        """Persist the recorded usage against a note and/or user and reset"""
+        with self._lock:
+            records, self.records = self.records, []
+        if not records:
+            return 0
+        for record in records:
+            record.note = note
+            record.user = user
+        ModelUsage.objects.bulk_create(records)
+        return len(records)
+
+
+def usage_rollup(queryset, group_by='day'):
+    """Usage totals grouped by 'day', 'user', 'note' or 'operation'"""
+    if group_by == 'day':
+        queryset = queryset.annotate(day=TruncDate('created_at'))
+        key = 'day'
+    else:
+        key = {'user': 'user_id', 'note': 'note_id', 'operation': 'operation'}[group_by]
+    return (
+        queryset.values(key)
+        .annotate(
+            calls=Count('id', filter=Q(cache_hit=False)),
+            cache_hits=Count('id', filter=Q(cache_hit=True)),
+            input_tokens=Sum('input_tokens'),
+            output_tokens=Sum('output_tokens'),
+            latency_ms=Sum('latency_ms'),
+            retries=Sum('retries'),
+            cost_usd=Sum('cost_usd'),
+        )
+        .order_by(key)
+    )
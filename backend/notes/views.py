@@ -1,40 +1,60 @@
-from rest_framework import viewsets, status
+import logging
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
 from django.db import models
 from django.db.models import functions
-from django.utils import timezone
-from .models import Note, Translation
-from .serializers import NoteSerializer, NoteCreateSerializer, TranslationSerializer
+from .models import Note, Translation, ModelUsage, Upload
+from .serializers import NoteSerializer, NoteCreateSerializer, NoteSummarySerializer, TranslationSerializer, GlossaryEntrySerializer, UploadSerializer
 from .services import NoteService, TranslationService
-import json
+from .resilience import CircuitOpenError, DeadlineExceeded
+from .usage import usage_rollup
+from . import conditional
+from .access import access_buffer, ACTIVATABLE_STATUSES
+from . import uploads
+from .cleanup import sweep_abandoned_notes
+
+logger = logging.getLogger(__name__)
 
 
 class NoteViewSet(viewsets.ModelViewSet):
     """ViewSet for managing notes"""
     permission_classes = [AllowAny]  # Allow guest users for now
     queryset = Note.objects.all()  # Required for router basename
+    cursor_ordering = '-updated_at'
+    
+    # List views read only these columns, never content
+    SUMMARY_FIELDS = [
+        'id', 'title', 'status', 'file_type', 'source_language', 'detected_language',
+        'target_language', 'tags', 'page_count', 'preview', 'last_viewed_page',
+        'created_at', 'updated_at',
+    ]
     
     def get_queryset(self):
         if hasattr(self.request, 'user') and self.request.user.is_authenticated:
-            print(f"Notes queryset: User {self.request.user.username} authenticated, filtering by user")
             # Include both user's notes and guest notes (for transfer of ownership)
             # Exclude abandoned notes unless they belong to the current user
-            return Note.objects.filter(
-                models.Q(user=self.request.user) | models.Q(user__isnull=True)
-            ).exclude(
-                models.Q(status='abandoned') & models.Q(user__isnull=True)
-            )
+            queryset = Note.objects.visible_to(self.request.user)
         else:
             # For guest users, return notes that have no user (guest notes) and are not abandoned
-            print("Notes queryset: No authenticated user, returning active guest notes")
-            return Note.objects.filter(user__isnull=True).exclude(status='abandoned')
+            queryset = Note.objects.visible_to(None)
+        
+        if self.action in ['list', 'recent']:
+            queryset = queryset.only(*self.SUMMARY_FIELDS).annotate(
+                has_translation=models.Exists(
+                    Translation.objects.filter(note=models.OuterRef('pk'), target_language=models.OuterRef('target_language'))
+                )
+            )
+        return queryset
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return NoteCreateSerializer
+        if self.action in ['list', 'recent']:
+            return NoteSummarySerializer
         return NoteSerializer
     
     def perform_create(self, serializer):
@@ -47,18 +67,7 @@ class NoteViewSet(viewsets.ModelViewSet):
         
         # Extract text from uploaded file if present
         if note.file:
-            try:
-                from .services import NoteService
-                note_service = NoteService()
-                note_service.process_uploaded_file(note)
-                # Update status to processing after content extraction
-                note.status = 'processing'
-                note.save()
-            except Exception as e:
-                print(f"Error processing uploaded file: {e}")
-                # Mark as abandoned if processing fails
-                note.status = 'abandoned'
-                note.save()
+            NoteService().start_processing(note)
     
     def perform_update(self, serializer):
         # If the note has no user (guest note) and we have an authenticated user,
@@ -66,7 +75,7 @@ class NoteViewSet(viewsets.ModelViewSet):
         if hasattr(self.request, 'user') and self.request.user.is_authenticated:
             note = serializer.instance
             if note.user is None:
-                print(f"Transferring ownership of guest note {note.id} to user {self.request.user.username}")
+                logger.info('Transferring ownership of guest note', extra={'note_id': str(note.id), 'user_id': self.request.user.pk})
                 serializer.save(user=self.request.user)
             else:
                 serializer.save()
@@ -74,41 +83,30 @@ class NoteViewSet(viewsets.ModelViewSet):
             serializer.save()
     
     def retrieve(self, request, *args, **kwargs):
-        """Override retrieve to mark note as active when viewed"""
-        response = super().retrieve(request, *args, **kwargs)
+        """Override retrieve to mark note as active when viewed, answering 304 when unchanged"""
+        version = conditional.note_version(self.get_queryset(), kwargs['pk'])
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
         
-        # Mark note as active when user views it
-        try:
-            note = self.get_object()
-            if note.status in ['draft', 'processing']:
-                note.status = 'active'
-                note.last_accessed_at = timezone.now()
-                note.save(update_fields=['status', 'last_accessed_at'])
-                print(f"Marked note {note.id} as active")
-        except Exception as e:
-            print(f"Error updating note status: {e}")
+        # Mark note as active when user views it; written behind, with the access time
+        access_buffer.viewed(version['id'], activate=version['status'] in ACTIVATABLE_STATUSES)
         
-        return response
-    
-    def create(self, request, *args, **kwargs):
-        print(f"Create request data: {request.data}")
-        print(f"Create request FILES: {request.FILES}")
-        print(f"User authenticated: {request.user.is_authenticated if hasattr(request, 'user') else 'No user'}")
-        print(f"User: {request.user if hasattr(request, 'user') else 'No user'}")
-        print(f"Auth header: {request.META.get('HTTP_AUTHORIZATION', 'None')}")
-        return super().create(request, *args, **kwargs)
+        # A page flip may still be buffered; it is part of what the client sees
+        last_viewed_page = access_buffer.pending(version['id']).get('last_viewed_page', version['last_viewed_page'])
+        etag = conditional.make_etag('note', version, last_viewed_page)
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+            response.data['last_viewed_page'] = last_viewed_page
+        return conditional.tag_response(response, etag)
     
     @action(detail=True, methods=['post'])
     def translate(self, request, pk=None):
         """Translate a note"""
-        print(f"Translate request for note ID: {pk}")
-        print(f"User: {request.user if hasattr(request, 'user') else 'No user'}")
         try:
             note = self.get_object()
-            print(f"Found note: {note.id} - {note.title}")
         except Exception as e:
-            print(f"Error getting note: {e}")
-            print(f"Available notes for user: {list(Note.objects.filter(user=request.user).values_list('id', 'title')) if hasattr(request, 'user') and request.user.is_authenticated else 'No user'}")
+            logger.info('Translate requested for missing note %s: %s', pk, e)
             return Response(
                 {'error': f'Note not found. This might be because the database was reset. Please try uploading the note again.'},
                 status=status.HTTP_404_NOT_FOUND
@@ -117,12 +115,10 @@ class NoteViewSet(viewsets.ModelViewSet):
         # Check if edited content is provided in the request
         edited_content = request.data.get('content')
         if edited_content:
-            print(f"Using edited content from request: {len(edited_content)} characters")
+            logger.debug('Using edited content from request: %d characters', len(edited_content))
             # Temporarily update the note's content for translation
             original_content = note.content
             note.content = edited_content
-        else:
-            print("Using original content from database")
         
         # If note has no content but has a file, try to extract text first
         if not note.content and note.file:
@@ -138,31 +134,44 @@ class NoteViewSet(viewsets.ModelViewSet):
                 )
         
         try:
-            print(f"Starting translation process...")
-            print(f"Note content type: {type(note.content)}")
-            print(f"Note content length: {len(note.content) if note.content else 0}")
-            print(f"Note content preview: {note.content[:200] if note.content else 'None'}...")
             
             translation_service = TranslationService()
-            print(f"Translation service created successfully")
             
-            translation = translation_service.translate_note(note)
-            print(f"Translation completed successfully: {translation}")
+            # Optionally precompute the note's glossary in the same run
+            build_glossary = request.data.get('glossary')
+            if isinstance(build_glossary, str):
+                build_glossary = build_glossary.lower() in ('1', 'true', 'yes')
+            
+            # Fan out to several target languages in one run when a list is given
+            target_languages = request.data.get('target_languages')
+            if target_languages:
+                if isinstance(target_languages, str):
+                    target_languages = [lang.strip() for lang in target_languages.split(',')]
+                translations = translation_service.translate_note_multi(note, target_languages, build_glossary=build_glossary)
+            else:
+                translation = translation_service.translate_note(note, build_glossary=build_glossary)
             
             # Save the edited content to the database
             if edited_content:
                 note.content = edited_content
                 note.save()
-                print(f"Saved edited content to database")
             
-            serializer = TranslationSerializer(translation)
+            if target_languages:
+                serializer = TranslationSerializer(translations, many=True)
+            else:
+                serializer = TranslationSerializer(translation)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning('Translation of note %s aborted: %s', note.id, e)
+            if edited_content:
+                note.content = original_content
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(e, CircuitOpenError) else status.HTTP_504_GATEWAY_TIMEOUT
+            )
         except Exception as e:
-            print(f"❌ Translation failed with error: {str(e)}")
-            print(f"Error type: {type(e)}")
-            import traceback
-            print(f"Full traceback: {traceback.format_exc()}")
+            logger.exception('Translation of note %s failed', note.id)
             
             # Restore original content if we temporarily changed it and there was an error
             if edited_content:
@@ -174,45 +183,130 @@ class NoteViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['patch'])
     def update_last_viewed_page(self, request, pk=None):
-        """Update the last viewed page for a note"""
-        note = self.get_object()
-        page = request.data.get('page', 1)
+        """Update the last viewed page for a note; the write is buffered, not immediate"""
+        note_id = conditional.parse_note_id(pk)
+        if note_id is None or not self.get_queryset().filter(pk=note_id).exists():
+            return Response({'error': 'Note not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            page = int(request.data.get('page', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'page must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         
-        note.last_viewed_page = page
-        note.save()
+        access_buffer.page_viewed(note_id, page)
         
         return Response({'status': 'success'})
     
     @action(detail=True, methods=['get'])
-    def progress(self, request, pk=None):
-        """Get progress information for a note's processing"""
-        note = self.get_object()
+    def translations(self, request, pk=None):
+        """List the stored translations of a note, optionally for one target language"""
+        target_language = request.query_params.get('target_language')
+        version = conditional.note_version(self.get_queryset(), pk, target_language)
+        if version is None:
+            return Response({'error': 'Note not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Try to determine page count from content
-        total_pages = 0
-        current_page = 0
+        etag = conditional.make_etag('translations', version, target_language or '')
+        cached = conditional.not_modified(request, etag)
+        if cached is not None:
+            return conditional.tag_response(cached, etag)
         
-        if note.content:
-            try:
-                # Check if content is JSON (page-based structure)
-                if note.content.startswith('[') or note.content.startswith('{'):
-                    pages_data = json.loads(note.content)
-                    if isinstance(pages_data, list):
-                        total_pages = len(pages_data)
-                    elif isinstance(pages_data, dict) and 'page_number' in pages_data:
-                        total_pages = 1
-            except:
-                # If not JSON, assume it's plain text (1 page)
-                total_pages = 1
+        translations = Translation.objects.filter(note_id=version['id'])
+        if target_language:
+            translations = translations.filter(target_language=target_language)
+        
+        serializer = TranslationSerializer(translations, many=True)
+        return conditional.tag_response(Response(serializer.data), etag)
+    
+    @action(detail=True, methods=['get'], url_path=r'pages/(?P<page_number>\d+)')
+    def page(self, request, pk=None, page_number=None):
+        """One page of a note with its translation (?target_language, default: the note's)"""
+        from translation.context import note_page_text, translation_page_text
         
-        # Check if there's a translation in progress
-        has_translation = hasattr(note, 'translation') and note.translation is not None
+        page_number = int(page_number)
+        notes = self.get_queryset()
+        version = conditional.note_version(notes, pk, request.query_params.get('target_language'))
+        if version is None:
+            return Response({'error': 'Note not found'}, status=status.HTTP_404_NOT_FOUND)
+        target_language = request.query_params.get('target_language') or version['target_language']
+        
+        etag = conditional.make_etag('page', version, target_language, page_number)
+        cached = conditional.not_modified(request, etag)
+        if cached is not None:
+            return conditional.tag_response(cached, etag)
+        
+        content = note_page_text(notes, version['id'], page_number)
+        if content is None:
+            return Response({'error': 'Page not found'}, status=status.HTTP_404_NOT_FOUND)
+        return conditional.tag_response(Response({
+            'note_id': version['id'],
+            'page_number': page_number,
+            'content': content,
+            'target_language': target_language,
+            'translated_content': translation_page_text(version['id'], target_language, page_number),
+        }), etag)
+    
+    @action(detail=True, methods=['get'])
+    def glossary(self, request, pk=None):
+        """Precomputed glossary of a note for one target language (default: the note's)"""
+        note = self.get_object()
+        target_language = request.query_params.get('target_language') or note.target_language
+        entries = note.glossary.filter(target_language=target_language)
         
+        serializer = GlossaryEntrySerializer(entries, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'], url_path='usage')
+    def note_usage(self, request, pk=None):
+        """Model call usage for a note, broken down by operation"""
+        note = self.get_object()
         return Response({
             'note_id': note.id,
-            'total_pages': total_pages,
-            'current_page': current_page,
-            'has_translation': has_translation,
+            'by_operation': list(usage_rollup(note.model_usage.all(), 'operation')),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def usage(self, request):
+        """Model call usage rollups for the current user, grouped by day, note or operation"""
+        if not (hasattr(request, 'user') and request.user.is_authenticated):
+            return Response(
+                {'error': 'You must be logged in to view usage'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        group_by = request.query_params.get('group_by', 'day')
+        allowed = ['day', 'note', 'operation'] + (['user'] if request.user.is_staff else [])
+        if group_by not in allowed:
+            return Response(
+                {'error': f"group_by must be one of: {', '.join(allowed)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Staff can roll up across all users; everyone else sees only their own calls
+        queryset = ModelUsage.objects.all() if request.user.is_staff else ModelUsage.objects.filter(user=request.user)
+        return Response(list(usage_rollup(queryset, group_by)))
+    
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get progress information for a note's processing"""
+        # Polled while a note is processed, so read the stored page count, never the content
+        note_id = conditional.parse_note_id(pk)
+        if note_id is None:
+            return Response({'error': 'Note not found'}, status=status.HTTP_404_NOT_FOUND)
+        note = (
+            self.get_queryset().filter(pk=note_id)
+            .annotate(has_translation=models.Exists(
+                Translation.objects.filter(note=models.OuterRef('pk'), target_language=models.OuterRef('target_language'))
+            ))
+            .values('id', 'page_count', 'has_translation')
+            .first()
+        )
+        if note is None:
+            return Response({'error': 'Note not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'note_id': note['id'],
+            'total_pages': note['page_count'],
+            'current_page': 0,
+            'has_translation': note['has_translation'],
             'is_processing': False  # For now, we don't have real-time processing status
         })
     
@@ -271,16 +365,9 @@ class NoteViewSet(viewsets.ModelViewSet):
     def cleanup_abandoned(self, request):
         """Clean up abandoned notes older than specified time"""
         try:
-            # Delete abandoned notes older than 1 hour
-            cutoff_time = timezone.now() - timezone.timedelta(hours=1)
-            
-            abandoned_notes = Note.objects.filter(
-                status='abandoned',
-                created_at__lt=cutoff_time
-            )
-            
-            count = abandoned_notes.count()
-            abandoned_notes.delete()
+            # Delete abandoned notes older than 1 hour, in batches, within the cleanup time budget
+            result = sweep_abandoned_notes(hours=1)
+            count = result['notes']
             
             return Response({
                 'status': 'success',
@@ -291,3 +378,68 @@ class NoteViewSet(viewsets.ModelViewSet):
                 {'error': f'Cleanup failed: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Chunked, resumable file uploads.
+    
+    POST declares the file and returns its id; each PATCH appends the raw
+    request body at the Upload-Offset header; GET returns the offset to resume
+    from after a dropped connection. The PATCH that delivers the last byte
+    creates the note and returns it under "note".
+    """
+    permission_classes = [AllowAny]
+    serializer_class = UploadSerializer
+    queryset = Upload.objects.all()
+    
+    def get_queryset(self):
+        # Guests reach only guest uploads, and only by their unguessable id
+        if hasattr(self.request, 'user') and self.request.user.is_authenticated:
+            return Upload.objects.filter(user=self.request.user)
+        return Upload.objects.filter(user__isnull=True)
+    
+    def perform_create(self, serializer):
+        user = self.request.user if self.request.user.is_authenticated else None
+        upload = serializer.save(user=user)
+        logger.info('Upload started', extra={'upload_id': str(upload.id), 'bytes': upload.size})
+    
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        # The partial file is authoritative; the row may lag behind a dropped chunk
+        if upload.note_id is None:
+            upload.received = uploads.current_offset(upload)
+        return Response(self.get_serializer(upload).data)
+    
+    def partial_update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.note_id is not None:
+            # The response to the last chunk may have been lost; point the client at its note
+            return Response({'error': 'Upload is already complete', 'offset': upload.size, 'note_id': upload.note_id},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        # Read the body straight from the request so it is never parsed or buffered
+        try:
+            uploads.append_chunk(upload, request._request, offset, length)
+        except uploads.OffsetMismatch as e:
+            return Response({'error': str(e), 'offset': e.offset}, status=status.HTTP_409_CONFLICT)
+        except uploads.ChunkTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        data = self.get_serializer(upload).data
+        if upload.note_id is not None:
+            data['note'] = NoteSerializer(upload.note, context=self.get_serializer_context()).data
+        return Response(data)
+    
+    def destroy(self, request, *args, **kwargs):
+        """Abandon an unfinished upload and delete what was received"""
+        upload = self.get_object()
+        if upload.note_id is None:
+            uploads.discard(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import DefinitionCacheEntry
+
+
+@admin.register(DefinitionCacheEntry)
+class DefinitionCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['word', 'kind', 'source_language', 'target_language', 'hits', 'last_used_at', 'expires_at']
+    list_filter = ['kind', 'source_language', 'target_language']
+    search_fields = ['word']
+    readonly_fields = ['key', 'created_at']
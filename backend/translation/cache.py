@@ -0,0 +1,218 @@
+"""Two-level cache for word definitions: an in-process LRU in front of a shared table"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from note_translate import metrics
+from .models import DefinitionCacheEntry
+
+
+# Definition fields that do not depend on where the word appears
+BASE_FIELDS = ('definition', 'translation', 'type', 'level')
+# Fields that describe how the word is used in one particular context
+CONTEXT_FIELDS = ('context', 'example', 'usage_notes')
+
+
+def normalize_word(word):
+    """Case-fold, collapse whitespace and strip surrounding punctuation"""
+    word = unicodedata.normalize('NFKC', word or '').casefold()
+    word = re.sub(r'\s+', ' ', word).strip()
+    return word.strip('.,;:!?"\'()[]{}«»“”‘’')
+
+
+def normalize_context(context):
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', context or '')).strip()
+
+
+def base_key(word, source_lang, target_lang):
+    raw = f"base|{normalize_word(word)}|{source_lang}|{target_lang}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def snippet_key(text, source_lang, target_lang):
+    raw = f"snippet|{source_lang}|{target_lang}|{(text or '').strip()}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def context_key(word, source_lang, target_lang, context):
+    context_hash = hashlib.sha256(normalize_context(context).encode('utf-8')).hexdigest()
+    raw = f"context|{normalize_word(word)}|{source_lang}|{target_lang}|{context_hash}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry time to live"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DefinitionCache:
+    """Definition lookups served from the local LRU, then the shared table"""
+
+    def __init__(self):
+        self.local = LRUCache(settings.DEFINITION_CACHE_LOCAL_SIZE, settings.DEFINITION_CACHE_LOCAL_TTL)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        payload = self.local.get(key)
+        if payload is not None:
+            metrics.inc('definition_cache_lookups_total', level='local', result='hit')
+            return payload
+
+        entry = (
+            DefinitionCacheEntry.objects
+            .filter(key=key, expires_at__gt=timezone.now())
+            .values('payload')
+            .first()
+        )
+        metrics.inc('definition_cache_lookups_total', level='shared', result='miss' if entry is None else 'hit')
+        if entry is None:
+            return None
+
+        DefinitionCacheEntry.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        self.local.set(key, entry['payload'])
+        return entry['payload']
+
+    def get_many(self, keys):
+        """Look up several keys with at most one query; returns {key: payload} for hits"""
+        found = {}
+        missing = []
+        for key in keys:
+            payload = self.local.get(key)
+            if payload is not None:
+                found[key] = payload
+            else:
+                missing.append(key)
+        if found:
+            metrics.inc('definition_cache_lookups_total', len(found), level='local', result='hit')
+        if not missing:
+            return found
+
+        rows = DefinitionCacheEntry.objects.filter(
+            key__in=missing, expires_at__gt=timezone.now()
+        ).values_list('key', 'payload')
+        hits = []
+        for key, payload in rows:
+            found[key] = payload
+            hits.append(key)
+            self.local.set(key, payload)
+        if hits:
+            metrics.inc('definition_cache_lookups_total', len(hits), level='shared', result='hit')
+        if len(missing) > len(hits):
+            metrics.inc('definition_cache_lookups_total', len(missing) - len(hits), level='shared', result='miss')
+        if hits:
+            DefinitionCacheEntry.objects.filter(key__in=hits).update(
+                hits=F('hits') + 1, last_used_at=timezone.now()
+            )
+        return found
+
+    def set_many(self, entries):
+        """Store (key, kind, word, source_lang, target_lang, payload) tuples in one upsert"""
+        if not entries:
+            return
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.DEFINITION_CACHE_TTL)
+        rows = {}
+        for key, kind, word, source_lang, target_lang, payload in entries:
+            self.local.set(key, payload)
+            rows[key] = DefinitionCacheEntry(
+                key=key,
+                kind=kind,
+                word=normalize_word(word)[:200],
+                source_language=source_lang,
+                target_language=target_lang,
+                payload=payload,
+                last_used_at=now,
+                expires_at=expires_at,
+            )
+        DefinitionCacheEntry.objects.bulk_create(
+            list(rows.values()),
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['payload', 'last_used_at', 'expires_at'],
+        )
+
+        with self._lock:
+            before = self._writes
+            self._writes += len(rows)
+            should_prune = before // settings.DEFINITION_CACHE_PRUNE_INTERVAL != self._writes // settings.DEFINITION_CACHE_PRUNE_INTERVAL
+        if should_prune:
+            self.prune()
+
+    def set(self, key, kind, word, source_lang, target_lang, payload):
+        self.local.set(key, payload)
+        now = timezone.now()
+        defaults = {
+            'kind': kind,
+            'word': normalize_word(word)[:200],
+            'source_language': source_lang,
+            'target_language': target_lang,
+            'payload': payload,
+            'last_used_at': now,
+            'expires_at': now + timedelta(seconds=settings.DEFINITION_CACHE_TTL),
+        }
+        try:
+            DefinitionCacheEntry.objects.update_or_create(key=key, defaults=defaults)
+        except IntegrityError:
+            # Another worker stored the same lookup first; theirs is just as good
+            pass
+
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % settings.DEFINITION_CACHE_PRUNE_INTERVAL == 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the least recently used ones beyond the size cap"""
+        deleted, _ = DefinitionCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        cutoff = (
+            DefinitionCacheEntry.objects
+            .order_by('-last_used_at')
+            .values_list('last_used_at', flat=True)[settings.DEFINITION_CACHE_MAX_ENTRIES:settings.DEFINITION_CACHE_MAX_ENTRIES + 1]
+        )
+        cutoff = list(cutoff)
+        if cutoff:
+            evicted, _ = DefinitionCacheEntry.objects.filter(last_used_at__lte=cutoff[0]).delete()
+            deleted += evicted
+        return deleted
+
+
+definition_cache = DefinitionCache()
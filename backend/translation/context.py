@@ -0,0 +1,165 @@
+"""Sentence-bounded context windows and glossary lookups for words in stored notes"""
+import re
+
+from django.conf import settings
+
+from notes import pagejson
+from notes.models import Note, GlossaryEntry, Translation
+from .cache import LRUCache, normalize_word
+
+
+# Roughly four characters per token for the languages we translate between
+CHARS_PER_TOKEN = 4
+SENTENCE_END = re.compile(r'[.!?。！？]+["\')\]]*\s+|\n\s*\n')
+
+# Parsed page texts keyed by (note id, updated_at), or by translation and its
+# updated_at, so repeat lookups neither reload nor re-parse the content
+_page_cache = LRUCache(maxsize=32, ttl=600)
+
+
+def split_pages(content):
+    """{page_number: text} for page-based JSON content, or {None: content} for plain text"""
+    pages = {}
+    pages_data = pagejson.parse_pages(content)
+    if pages_data is not None:
+        for page in pages_data:
+            pages[page.get('page_number')] = page.get('content') or ''
+    else:
+        pages[None] = content
+    return pages
+
+
+def note_page_text(note_queryset, note_id, page_number=None):
+    """Text of one page of a note (or the whole note for plain text content).
+
+    note_queryset limits which notes the caller may read; note_id must be a
+    UUID and page_number an int, as parsed by the caller. Returns None when the
+    note or page does not exist.
+    """
+    updated_at = note_queryset.filter(id=note_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+
+    cache_key = (str(note_id), updated_at)
+    pages = _page_cache.get(cache_key)
+    if pages is None:
+        content = Note.objects.filter(id=note_id).values_list('content', flat=True).first() or ''
+        pages = split_pages(content)
+        _page_cache.set(cache_key, pages)
+
+    if None in pages:
+        return pages[None]
+    if page_number is None:
+        return None
+    return pages.get(page_number)
+
+
+def translation_page_text(note_id, target_language, page_number=None):
+    """Translated text of one page of a note, or None when there is no such translation or page.
+
+    Callers check that the note is visible first and pass page_number as an int.
+    """
+    updated_at = (
+        Translation.objects.filter(note_id=note_id, target_language=target_language)
+        .values_list('updated_at', flat=True).first()
+    )
+    if updated_at is None:
+        return None
+
+    cache_key = ('translation', str(note_id), target_language, updated_at)
+    pages = _page_cache.get(cache_key)
+    if pages is None:
+        content = (
+            Translation.objects.filter(note_id=note_id, target_language=target_language)
+            .values_list('translated_content', flat=True).first() or ''
+        )
+        pages = split_pages(content)
+        _page_cache.set(cache_key, pages)
+
+    if None in pages:
+        return pages[None]
+    if page_number is None:
+        return None
+    return pages.get(page_number)
+
+
+def glossary_definition(note_queryset, note_id, word, target_lang):
+    """Stored definition of word from a note's precomputed glossary, or None"""
+    return (
+        GlossaryEntry.objects
+        .filter(note__in=note_queryset.filter(id=note_id), term=normalize_word(word), target_language=target_lang)
+        .values_list('definition', flat=True)
+        .first()
+    )
+
+
+def locate_word(text, word, offset=None):
+    """Position of the occurrence of word nearest to offset, searching only nearby text"""
+    if not word:
+        return None
+    lowered_word = word.casefold()
+    if offset is not None:
+        offset = max(0, min(int(offset), len(text)))
+        if text[offset:offset + len(word)].casefold() == lowered_word:
+            return offset
+        # The client's offset may be slightly off (whitespace, rendering); look close by
+        lo = max(0, offset - 200)
+        nearby = text[lo:offset + len(word) + 200].casefold()
+        candidates = [m.start() + lo for m in re.finditer(re.escape(lowered_word), nearby)]
+        if candidates:
+            return min(candidates, key=lambda pos: abs(pos - offset))
+        return offset
+    pos = text.casefold().find(lowered_word)
+    return pos if pos >= 0 else None
+
+
+def context_window(text, word, offset=None, max_tokens=None):
+    """Sentence-bounded window of at most max_tokens around a word in text.
+
+    The sentence containing the word is always included (trimmed if it alone
+    exceeds the cap); neighbouring sentences are added alternately before and
+    after until the cap is reached. Only text within the cap of the word is
+    scanned, so the cost does not grow with the size of the page.
+    """
+    max_tokens = min(max_tokens or settings.DEFINE_WORD_CONTEXT_TOKENS, settings.DEFINE_WORD_CONTEXT_MAX_TOKENS)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if not text:
+        return ''
+
+    pos = locate_word(text, word, offset)
+    if pos is None:
+        return text[:max_chars].strip()
+    word_end = min(len(text), pos + len(word or ''))
+
+    # Only look at the region that could possibly end up in the window
+    region_start = max(0, pos - max_chars)
+    region_end = min(len(text), word_end + max_chars)
+    region = text[region_start:region_end]
+    boundaries = [region_start] + [region_start + m.end() for m in SENTENCE_END.finditer(region)] + [region_end]
+    boundaries = sorted(set(boundaries))
+
+    # Sentence containing the word
+    start_index = max(i for i, b in enumerate(boundaries) if b <= pos)
+    end_index = min(i for i, b in enumerate(boundaries) if b >= word_end)
+    start, end = boundaries[start_index], boundaries[end_index]
+
+    if end - start > max_chars:
+        half = max(0, (max_chars - (word_end - pos)) // 2)
+        start = max(start, pos - half)
+        end = min(end, word_end + half)
+        return text[start:end].strip()
+
+    # Grow by whole sentences, alternating before and after
+    grew = True
+    while grew:
+        grew = False
+        if start_index > 0 and end - boundaries[start_index - 1] <= max_chars:
+            start_index -= 1
+            start = boundaries[start_index]
+            grew = True
+        if end_index < len(boundaries) - 1 and boundaries[end_index + 1] - start <= max_chars:
+            end_index += 1
+            end = boundaries[end_index]
+            grew = True
+
+    return text[start:end].strip()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='definitioncacheentry',
+            name='kind',
+            field=models.CharField(choices=[('base', 'Base'), ('context', 'Context'), ('snippet', 'Snippet')], max_length=10),
+        ),
+    ]
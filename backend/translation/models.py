@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class DefinitionCacheEntry(models.Model):
+    """Shared cache of word definitions and snippet translations, keyed by a hash of the normalized lookup"""
+    
+    KIND_CHOICES = [
+        ('base', 'Base'),         # Context-independent: definition, translation, type, level
+        ('context', 'Context'),   # Context analysis for one context window
+        ('snippet', 'Snippet'),   # Translation of a text snippet
+    ]
+    
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    word = models.CharField(max_length=200)
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    payload = models.JSONField(default=dict)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.kind} definition of {self.word} ({self.source_language}-{self.target_language})"
@@ -1,5 +1,7 @@
 import google.generativeai as genai
 from django.conf import settings
+from notes import resilience
+from notes.usage import UsageRecorder
 
 
 class TranslationService:
@@ -7,6 +9,7 @@ class TranslationService:
     
     def __init__(self):
         self.setup_gemini()
+        self.usage = UsageRecorder()
     
     def setup_gemini(self):
         """Initialize AI service"""
@@ -16,8 +19,6 @@ class TranslationService:
     def translate_text(self, text, source_lang='auto', target_lang='vi'):
         """Translate text using AI"""
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
             prompt = f"""
             Translate the following text from {source_lang} to {target_lang}.
             Preserve all formatting, markdown syntax, line breaks, and structure.
@@ -28,8 +29,10 @@ class TranslationService:
             {text}
             """
             
-            response = model.generate_content(prompt)
+            response = resilience.generate_content(prompt, operation='translate_snippet', recorder=self.usage)
             return response.text
             
+        except resilience.ModelCallError:
+            raise
         except Exception as e:
             raise Exception(f"Translation failed: {str(e)}")
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import translate_text, get_supported_languages, define_word
+from .views import translate_text, translate_text_batch, get_supported_languages, define_word, define_word_batch
 
 urlpatterns = [
     path('translate/', translate_text, name='translate_text'),
+    path('translate/batch/', translate_text_batch, name='translate_text_batch'),
     path('languages/', get_supported_languages, name='supported_languages'),
     path('define/', define_word, name='define_word'),
+    path('define/batch/', define_word_batch, name='define_word_batch'),
 ]
@@ -1,8 +1,40 @@
+import logging
+import uuid
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from django.conf import settings
 from .services import TranslationService
+from notes.models import Note
+from notes.resilience import CircuitOpenError, DeadlineExceeded
+from .context import note_page_text, context_window, glossary_definition
+from .cache import definition_cache, snippet_key
+
+logger = logging.getLogger(__name__)
+
+
+def request_user(request):
+    """The authenticated user for usage accounting, or None for guests"""
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def parse_note_location(note_id, page_number):
+    """(UUID, int or None) from request values; raises ValueError with a message for the client"""
+    try:
+        note_id = uuid.UUID(str(note_id))
+    except ValueError:
+        raise ValueError('note_id must be a UUID')
+    if page_number is None or page_number == '':
+        return note_id, None
+    if isinstance(page_number, bool):
+        raise ValueError('page_number must be an integer')
+    try:
+        return note_id, int(page_number)
+    except (TypeError, ValueError):
+        raise ValueError('page_number must be an integer')
 
 
 @api_view(['POST'])
@@ -11,7 +43,6 @@ def translate_text(request):
     """Translate text using AI"""
     try:
         text = request.data.get('text')
-        print(text)
         source_lang = request.data.get('source_language', 'auto')
         target_lang = request.data.get('target_language', 'vi')
         
@@ -21,9 +52,18 @@ def translate_text(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        cache_key = snippet_key(text, source_lang, target_lang)
+        cached = definition_cache.get(cache_key)
         translation_service = TranslationService()
-        translated_text = translation_service.translate_text(text, source_lang, target_lang)
-        print(translated_text)
+        try:
+            if cached is not None:
+                translated_text = cached['translated_text']
+                translation_service.usage.record_cache_hit('translate_snippet')
+            else:
+                translated_text = translation_service.translate_text(text, source_lang, target_lang)
+                definition_cache.set(cache_key, 'snippet', text, source_lang, target_lang, {'translated_text': translated_text})
+        finally:
+            translation_service.usage.flush(user=request_user(request))
         return Response({
             'original_text': text,
             'translated_text': translated_text,
@@ -31,6 +71,10 @@ def translate_text(request):
             'target_language': target_lang
         })
         
+    except CircuitOpenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except DeadlineExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -72,17 +116,54 @@ def define_word(request):
         source_lang = request.data.get('source_language', 'en')
         target_lang = request.data.get('target_language', 'vi')
         context = request.data.get('context', '')
+        note_id = request.data.get('note_id')
+        offset = request.data.get('offset')
+        max_tokens = request.data.get('context_tokens')
         
         if not word:
             return Response({'error': 'Word is required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            offset = int(offset) if offset is not None else None
+            max_tokens = int(max_tokens) if max_tokens else None
+        except (TypeError, ValueError):
+            return Response({'error': 'offset and context_tokens must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Prefer a window cut from the stored page over whatever context the client sent
+        if note_id:
+            try:
+                note_id, page_number = parse_note_location(note_id, request.data.get('page_number'))
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            notes = Note.objects.visible_to(request_user(request))
+            
+            # Terms in the note's precomputed glossary need no model call at all
+            definition_data = glossary_definition(notes, note_id, word, target_lang)
+            if definition_data is not None:
+                return Response(definition_data)
+            
+            page_text = note_page_text(notes, note_id, page_number)
+            if page_text is None and not context:
+                return Response({'error': 'Note or page not found'}, status=status.HTTP_404_NOT_FOUND)
+            if page_text is not None and offset is None and context:
+                # Anchor on the sentence the client selected from, not the first occurrence
+                anchor = page_text.find(context.strip())
+                if anchor >= 0:
+                    offset = anchor + max(0, context.strip().casefold().find(word.casefold()))
+            context = context_window(page_text or context, word, offset, max_tokens)
+        else:
+            context = context_window(context, word, offset, max_tokens)
+        
         from notes.services import TranslationService
         translation_service = TranslationService()
         
         # Get definition and translation using AI
-        definition_data = translation_service.get_word_definition(
-            word, source_lang, target_lang, context
-        )
+        try:
+            definition_data = translation_service.get_word_definition(
+                word, source_lang, target_lang, context
+            )
+        finally:
+            translation_service.usage.flush(user=request_user(request))
         
         return Response(definition_data)
         
@@ -91,3 +172,138 @@ def define_word(request):
             {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def translate_text_batch(request):
+    """Translate a list of snippets, answering from cache and packing the rest into few model calls"""
+    texts = request.data.get('texts')
+    source_lang = request.data.get('source_language', 'auto')
+    target_lang = request.data.get('target_language', 'vi')
+    
+    if not isinstance(texts, list) or not texts:
+        return Response({'error': 'texts must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(texts) > settings.TRANSLATION_BATCH_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.TRANSLATION_BATCH_MAX_ITEMS} texts per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = [{'original_text': text} for text in texts]
+    valid = [(index, text) for index, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    for index, text in enumerate(texts):
+        if not isinstance(text, str) or not text.strip():
+            results[index]['error'] = 'Text is required'
+    
+    from notes.services import TranslationService as PipelineTranslationService
+    translation_service = PipelineTranslationService()
+    try:
+        translated, errors = translation_service.translate_snippets(
+            [text for _, text in valid], source_lang, target_lang
+        )
+    except CircuitOpenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except DeadlineExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+    except Exception:
+        logger.exception('Batch translation failed')
+        return Response({'error': 'Translation service failed'}, status=status.HTTP_502_BAD_GATEWAY)
+    finally:
+        translation_service.usage.flush(user=request_user(request))
+    
+    for position, (index, _) in enumerate(valid):
+        if position in translated:
+            results[index]['translated_text'] = translated[position]
+        else:
+            results[index]['error'] = errors.get(position, 'Translation failed')
+    
+    return Response({
+        'source_language': source_lang,
+        'target_language': target_lang,
+        'results': results
+    })
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def define_word_batch(request):
+    """Define a list of words, answering from cache and packing the rest into few model calls.
+    
+    Each entry of words is either a string or an object with word and optionally
+    context, or note_id, page_number and offset to cut the context server-side.
+    """
+    words = request.data.get('words')
+    source_lang = request.data.get('source_language', 'en')
+    target_lang = request.data.get('target_language', 'vi')
+    
+    if not isinstance(words, list) or not words:
+        return Response({'error': 'words must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(words) > settings.TRANSLATION_BATCH_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.TRANSLATION_BATCH_MAX_ITEMS} words per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    notes = Note.objects.visible_to(request_user(request))
+    results = []
+    items = []
+    for index, entry in enumerate(words):
+        if isinstance(entry, str):
+            entry = {'word': entry}
+        word = (entry.get('word') or '').strip() if isinstance(entry, dict) else ''
+        results.append({'word': word})
+        if not word:
+            results[index]['error'] = 'Word is required'
+            continue
+        
+        try:
+            offset = int(entry['offset']) if entry.get('offset') is not None else None
+        except (TypeError, ValueError):
+            results[index]['error'] = 'offset must be an integer'
+            continue
+        
+        if entry.get('note_id'):
+            try:
+                note_id, page_number = parse_note_location(entry['note_id'], entry.get('page_number'))
+            except ValueError as e:
+                results[index]['error'] = str(e)
+                continue
+            definition_data = glossary_definition(notes, note_id, word, target_lang)
+            if definition_data is not None:
+                results[index].update(definition_data)
+                continue
+            page_text = note_page_text(notes, note_id, page_number)
+            if page_text is None and not entry.get('context'):
+                results[index]['error'] = 'Note or page not found'
+                continue
+            context = context_window(page_text or entry.get('context'), word, offset)
+        else:
+            context = context_window(entry.get('context') or '', word, offset)
+        items.append((index, word, context))
+    
+    from notes.services import TranslationService as PipelineTranslationService
+    translation_service = PipelineTranslationService()
+    try:
+        definitions, errors = translation_service.get_word_definitions(items, source_lang, target_lang)
+    except CircuitOpenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except DeadlineExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+    except Exception:
+        logger.exception('Batch definition failed')
+        return Response({'error': 'Definition service failed'}, status=status.HTTP_502_BAD_GATEWAY)
+    finally:
+        translation_service.usage.flush(user=request_user(request))
+    
+    for index, _, _ in items:
+        if index in definitions:
+            results[index].update(definitions[index])
+        else:
+            results[index]['error'] = errors.get(index, 'Definition could not be retrieved')
+    
+    return Response({
+        'source_language': source_lang,
+        'target_language': target_lang,
+        'results': results
+    })
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import VocabularyItem
+from .models import VocabularyItem, VocabularyCounter
 
 
 @admin.register(VocabularyItem)
@@ -8,3 +8,10 @@ class VocabularyItemAdmin(admin.ModelAdmin):
     list_filter = ['source_language', 'target_language', 'created_at']
     search_fields = ['word', 'definition', 'context_definition', 'user__email', 'source_note__title']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(VocabularyCounter)
+class VocabularyCounterAdmin(admin.ModelAdmin):
+    list_display = ['user', 'source_language', 'target_language', 'period', 'count']
+    list_filter = ['period', 'source_language', 'target_language']
+    search_fields = ['user__email']
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from vocabulary import stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized vocabulary statistics from the saved vocabulary items'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Only rebuild the counters of this user id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        count = stats.rebuild(options['users'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {count} vocabulary counters')
+        )
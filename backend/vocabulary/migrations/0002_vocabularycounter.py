@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    """All-time counts for existing vocabulary; rebuild_vocabulary_stats also fills recent activity"""
+    VocabularyItem = apps.get_model('vocabulary', 'VocabularyItem')
+    VocabularyCounter = apps.get_model('vocabulary', 'VocabularyCounter')
+    rows = (
+        VocabularyItem.objects.filter(user__isnull=False)
+        .values('user_id', 'source_language', 'target_language')
+        .annotate(count=models.Count('id'))
+    )
+    VocabularyCounter.objects.bulk_create(
+        [VocabularyCounter(period='all', **row) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vocabulary', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VocabularyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_language', models.CharField(max_length=10)),
+                ('target_language', models.CharField(max_length=10)),
+                ('period', models.CharField(default='all', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vocabulary_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'source_language', 'target_language', 'period')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
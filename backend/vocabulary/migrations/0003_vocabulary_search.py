@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+TABLE = 'vocabulary_vocabularyitem'
+FTS_TABLE = 'vocabulary_vocabularyitem_fts'
+TRIGRAM_TABLE = 'vocabulary_vocabularyitem_word_trgm'
+
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(word, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(definition, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(context_definition, '')), 'C')"
+)
+
+
+def sqlite_sync_triggers(fts_table, columns):
+    """Triggers keeping an external-content FTS5 table in step with the vocabulary table"""
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {TABLE} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.rowid, {new_values}); END",
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {TABLE} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); END",
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE ON {TABLE} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.rowid, {new_values}); END",
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(word, definition, context_definition, "
+            f"content='{TABLE}', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        )
+        for statement in sqlite_sync_triggers(FTS_TABLE, ['word', 'definition', 'context_definition']):
+            schema_editor.execute(statement)
+        # The trigram tokenizer needs SQLite 3.34+; without it search simply has no typo tolerance
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_version()")
+            version = tuple(int(part) for part in cursor.fetchone()[0].split('.')[:2])
+        if version >= (3, 34):
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING fts5(word, "
+                f"content='{TABLE}', content_rowid='rowid', tokenize='trigram')"
+            )
+            for statement in sqlite_sync_triggers(TRIGRAM_TABLE, ['word']):
+                schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(f"CREATE INDEX vocabulary_search_vector_idx ON {TABLE} USING gin (({PG_VECTOR}))")
+        schema_editor.execute(f"CREATE INDEX vocabulary_word_trgm_idx ON {TABLE} USING gin (word gin_trgm_ops)")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for fts_table in (FTS_TABLE, TRIGRAM_TABLE):
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {fts_table}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS vocabulary_search_vector_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS vocabulary_word_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0002_vocabularycounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocabulary', '0003_vocabulary_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vocabularyitem',
+            index=models.Index(fields=['user', '-created_at'], name='vocabulary__user_id_ffff63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vocabularyitem',
+            index=models.Index(fields=['user', 'source_note', '-created_at'], name='vocabulary__user_id_2cc343_idx'),
+        ),
+    ]
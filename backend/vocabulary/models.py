@@ -22,6 +22,32 @@ class VocabularyItem(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['user', 'word', 'source_note', 'source_language', 'target_language']
+        indexes = [
+            # Vocabulary lists, newest first, overall and per source note
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'source_note', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.word} from {self.source_note.title}"
+
+
+class VocabularyCounter(models.Model):
+    """Materialized vocabulary counts per user and language pair.
+    
+    period is ALL_TIME for the running total of a pair, or the ISO date of a
+    daily bucket of words added that day, used for recent activity.
+    """
+    ALL_TIME = 'all'
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vocabulary_counters')
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    period = models.CharField(max_length=10, default=ALL_TIME)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'source_language', 'target_language', 'period']
+    
+    def __str__(self):
+        return f"{self.user} {self.source_language}-{self.target_language} {self.period}: {self.count}"
@@ -0,0 +1,137 @@
+"""Indexed full-text search over vocabulary: FTS5 on SQLite, tsvector/pg_trgm on Postgres.
+
+Matches are word-prefix matches over word, definition and context_definition,
+ranked with the word weighted highest. When a single search word matches
+nothing, near spellings are found through a trigram index on word.
+"""
+import re
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db import connection, DatabaseError
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+
+from .models import VocabularyItem
+
+
+TABLE = VocabularyItem._meta.db_table
+FTS_TABLE = 'vocabulary_vocabularyitem_fts'
+TRIGRAM_TABLE = 'vocabulary_vocabularyitem_word_trgm'
+
+# Must match the expression of the GIN index created in migration 0003
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(word, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(definition, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(context_definition, '')), 'C')"
+)
+
+# Minimum similarity for a word to count as a misspelling of the search term:
+# pg_trgm trigram similarity on Postgres, difflib's ratio on SQLite
+PG_TYPO_SIMILARITY = 0.4
+TYPO_SIMILARITY = 0.75
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_tokens(term):
+    return TOKEN.findall((term or '').lower())[:8]
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _rows(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _sqlite_matches(user_id, tokens, limit):
+    query = ' '.join(f'"{token}"*' for token in tokens)
+    return [row[0] for row in _rows(
+        f"SELECT v.id FROM {FTS_TABLE} f JOIN {TABLE} v ON v.rowid = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND v.user_id = %s "
+        f"ORDER BY bm25({FTS_TABLE}, 10.0, 2.0, 1.0) LIMIT %s",
+        [query, user_id, limit]
+    )]
+
+
+def _sqlite_typos(user_id, word, limit):
+    grams = trigrams(word)
+    if not grams:
+        return []
+    query = ' OR '.join(f'"{gram}"' for gram in grams)
+    try:
+        candidates = _rows(
+            f"SELECT v.id, v.word FROM {TRIGRAM_TABLE} t JOIN {TABLE} v ON v.rowid = t.rowid "
+            f"WHERE {TRIGRAM_TABLE} MATCH %s AND v.user_id = %s "
+            f"ORDER BY bm25({TRIGRAM_TABLE}) LIMIT %s",
+            [query, user_id, limit * 5]
+        )
+    except DatabaseError:
+        # SQLite builds without the trigram tokenizer get no typo tolerance
+        return []
+    scored = [
+        (SequenceMatcher(None, word, candidate.lower()).ratio(), item_id)
+        for item_id, candidate in candidates
+    ]
+    return [item_id for score, item_id in sorted(scored, reverse=True) if score >= TYPO_SIMILARITY][:limit]
+
+
+def _postgres_matches(user_id, tokens, limit):
+    query = ' & '.join(f'{token}:*' for token in tokens)
+    return [row[0] for row in _rows(
+        f"SELECT id FROM {TABLE} "
+        f"WHERE user_id = %s AND ({PG_VECTOR}) @@ to_tsquery('simple', %s) "
+        f"ORDER BY ts_rank({PG_VECTOR}, to_tsquery('simple', %s)) DESC LIMIT %s",
+        [user_id, query, query, limit]
+    )]
+
+
+def _postgres_typos(user_id, word, limit):
+    return [row[0] for row in _rows(
+        f"SELECT id FROM {TABLE} "
+        f"WHERE user_id = %s AND word %% %s AND similarity(word, %s) >= %s "
+        f"ORDER BY similarity(word, %s) DESC LIMIT %s",
+        [user_id, word, word, PG_TYPO_SIMILARITY, word, limit]
+    )]
+
+
+def search_ids(user_id, term, limit=None):
+    """Ids of a user's vocabulary items matching term, best match first"""
+    limit = limit or settings.VOCABULARY_SEARCH_MAX_RESULTS
+    tokens = search_tokens(term)
+    if not tokens:
+        return []
+
+    if connection.vendor == 'postgresql':
+        matches, typos = _postgres_matches, _postgres_typos
+    else:
+        matches, typos = _sqlite_matches, _sqlite_typos
+
+    ids = list(matches(user_id, tokens, limit))
+    # Nothing starts with a single search word: it may be misspelled
+    if not ids and len(tokens) == 1:
+        ids = typos(user_id, tokens[0], limit)
+    return ids
+
+
+class VocabularySearchFilter(filters.BaseFilterBackend):
+    """?search= over the full-text index, ordered by rank unless ?ordering= is given"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        user = getattr(request, 'user', None)
+        if not term or user is None or not user.is_authenticated:
+            return queryset
+
+        ids = [VocabularyItem._meta.pk.to_python(item_id) for item_id in search_ids(user.pk, term)]
+        queryset = queryset.filter(pk__in=ids)
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by(Case(
+            *[When(pk=item_id, then=Value(position)) for position, item_id in enumerate(ids)],
+            output_field=IntegerField(),
+        ))
@@ -1,10 +1,18 @@
 from rest_framework import serializers
 from .models import VocabularyItem
+from notes.models import Note
 from notes.serializers import NoteSerializer
 
 
+class SourceNoteSerializer(serializers.ModelSerializer):
+    """Just enough of the source note to link back to it"""
+    class Meta:
+        model = Note
+        fields = ['id', 'title']
+
+
 class VocabularyItemSerializer(serializers.ModelSerializer):
-    source_note = NoteSerializer(read_only=True)
+    source_note = SourceNoteSerializer(read_only=True)
     
     class Meta:
         model = VocabularyItem
@@ -16,6 +24,11 @@ class VocabularyItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class ExpandedVocabularyItemSerializer(VocabularyItemSerializer):
+    """Vocabulary item with the full source note, for ?expand=source_note"""
+    source_note = NoteSerializer(read_only=True)
+
+
 class VocabularyItemCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = VocabularyItem
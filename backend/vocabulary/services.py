@@ -1,8 +1,14 @@
+import uuid
+
 import google.generativeai as genai
 from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 from .models import VocabularyItem
+from . import stats
 from notes.models import Note
+from notes import resilience
+from notes.usage import UsageRecorder
 
 
 class VocabularyService:
@@ -10,6 +16,7 @@ class VocabularyService:
     
     def __init__(self):
         self.setup_gemini()
+        self.usage = UsageRecorder()
     
     def setup_gemini(self):
         """Initialize AI service"""
@@ -19,8 +26,6 @@ class VocabularyService:
     def get_word_definition(self, word, context_sentence, source_lang, target_lang='en'):
         """Get word definition using AI"""
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
             prompt = f"""
             Given the word "{word}" in the context: "{context_sentence}"
             
@@ -33,59 +38,114 @@ class VocabularyService:
             Contextual Definition: [contextual definition]
             """
             
-            response = model.generate_content(prompt)
+            response = resilience.generate_content(prompt, operation='vocabulary_definition', retries=1, recorder=self.usage)
             return response.text
             
         except Exception as e:
             return f"Error getting definition: {str(e)}"
     
-    def save_word_from_selection(self, user, word, context_sentence, source_note_id, 
-                                page_number=None, source_language='auto', target_language='en'):
-        """Save a word from text selection with definitions"""
-        
-        # Get the source note
-        try:
-            source_note = Note.objects.get(id=source_note_id, user=user)
-        except Note.DoesNotExist:
-            raise Exception("Source note not found")
-        
-        # Get definitions
-        definition_text = self.get_word_definition(word, context_sentence, source_language, target_language)
-        
-        # Parse definitions
-        general_definition = ""
-        context_definition = ""
+    def cached_definition(self, word, context_sentence, source_lang, target_lang):
+        """(definition, context_definition) from the shared definition cache, or None on a miss"""
+        from translation.cache import definition_cache, base_key, context_key
         
+        if source_lang == 'auto':
+            source_lang = 'en'
+        base_cache_key = base_key(word, source_lang, target_lang)
+        context_cache_key = context_key(word, source_lang, target_lang, context_sentence)
+        found = definition_cache.get_many([base_cache_key, context_cache_key])
+        if base_cache_key not in found:
+            return None
+        context_part = found.get(context_cache_key) or {}
+        return found[base_cache_key].get('definition', ''), context_part.get('context', '')
+    
+    def parse_definition_text(self, definition_text):
+        """Split a 'General Definition: ... Contextual Definition: ...' response"""
         if "General Definition:" in definition_text and "Contextual Definition:" in definition_text:
             parts = definition_text.split("Contextual Definition:")
             if len(parts) == 2:
-                general_definition = parts[0].replace("General Definition:", "").strip()
-                context_definition = parts[1].strip()
-        else:
-            general_definition = definition_text
+                return parts[0].replace("General Definition:", "").strip(), parts[1].strip()
+        return definition_text, ""
+    
+    def upsert_item(self, user, word, source_note_id, source_language, target_language, **values):
+        """Insert or update a vocabulary item in one statement; None if the note is not the user's.
         
-        # Create vocabulary item
-        vocab_item, created = VocabularyItem.objects.get_or_create(
+        The insert selects from the user's notes, so ownership of the source note
+        is checked by the same statement that writes the row, and the returned
+        row carries the note's title so serializing the item needs no second query.
+        """
+        now = timezone.now()
+        item = VocabularyItem(
+            id=uuid.uuid4(),
             user=user,
             word=word,
-            source_note=source_note,
+            source_note_id=source_note_id,
             source_language=source_language,
             target_language=target_language,
-            defaults={
-                'definition': general_definition,
-                'context_definition': context_definition,
-                'context_sentence': context_sentence,
-                'page_number': page_number
-            }
+            created_at=now,
+            updated_at=now,
+            **values
+        )
+        fields = [f for f in VocabularyItem._meta.concrete_fields if f.attname != 'source_note_id']
+        columns = [f.column for f in fields] + ['source_note_id']
+        params = [f.get_db_prep_save(getattr(item, f.attname), connection) for f in fields]
+        note_field = VocabularyItem._meta.get_field('source_note').target_field
+        
+        quote = connection.ops.quote_name
+        item_table, note_table = quote(VocabularyItem._meta.db_table), quote(Note._meta.db_table)
+        unique = ['user_id', 'word', 'source_note_id', 'source_language', 'target_language']
+        updated = list(values) + ['updated_at']
+        sql = (
+            f"INSERT INTO {item_table} ({', '.join(quote(c) for c in columns)}) "
+            f"SELECT {', '.join(['%s'] * len(fields))}, {quote('id')} FROM {note_table} "
+            f"WHERE {quote('id')} = %s AND {quote('user_id')} = %s "
+            f"ON CONFLICT ({', '.join(quote(c) for c in unique)}) DO UPDATE SET "
+            f"{', '.join(f'{quote(c)} = EXCLUDED.{quote(c)}' for c in updated)} "
+            f"RETURNING *, (SELECT {quote('title')} FROM {note_table} "
+            f"WHERE {note_table}.{quote('id')} = {item_table}.{quote('source_note_id')}) AS source_note_title"
         )
+        params += [note_field.get_db_prep_value(source_note_id, connection), user.pk]
+        saved = next(iter(VocabularyItem.objects.raw(sql, params)), None)
+        if saved is None:
+            return None
+        # The same as select_related('source_note').only('source_note__id', 'source_note__title')
+        saved.source_note = Note.from_db(connection.alias, ['id', 'title'], [saved.source_note_id, saved.source_note_title])
         
-        if not created:
-            # Update existing item
-            vocab_item.definition = general_definition
-            vocab_item.context_definition = context_definition
-            vocab_item.context_sentence = context_sentence
-            vocab_item.page_number = page_number
-            vocab_item.updated_at = timezone.now()
-            vocab_item.save()
+        # A raw statement sends no signals, so count new words here; the id
+        # tells an insert from an update without reading the row beforehand
+        if saved.id == item.id:
+            stats.record_change(user.pk, source_language, target_language, saved.created_at, 1)
+        return saved
+    
+    def save_word_from_selection(self, user, word, context_sentence, source_note_id, 
+                                page_number=None, source_language='auto', target_language='en',
+                                definition=None, context_definition=None):
+        """Save a word from text selection with definitions.
         
+        definition is the payload the client already received from define_word
+        (or a plain definition string). Without it the definition cache is tried
+        before falling back to a model call.
+        """
+        if isinstance(definition, dict):
+            context_definition = context_definition or definition.get('context', '')
+            definition = definition.get('definition', '')
+        
+        if not definition:
+            cached = self.cached_definition(word, context_sentence, source_language, target_language)
+            if cached is not None:
+                definition, context_definition = cached
+            else:
+                definition_text = self.get_word_definition(word, context_sentence, source_language, target_language)
+                definition, context_definition = self.parse_definition_text(definition_text)
+        
+        vocab_item = self.upsert_item(
+            user, word, source_note_id, source_language, target_language,
+            definition=definition or '',
+            context_definition=context_definition or '',
+            context_sentence=context_sentence or '',
+            page_number=page_number,
+        )
+        if vocab_item is None:
+            self.usage.flush(user=user)
+            raise Exception("Source note not found")
+        self.usage.flush(note=Note(id=vocab_item.source_note_id), user=user)
         return vocab_item
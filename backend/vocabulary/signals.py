@@ -0,0 +1,37 @@
+"""Keep the materialized vocabulary counters in step with saves and deletes"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import VocabularyItem
+from . import stats
+
+
+@receiver(pre_save, sender=VocabularyItem)
+def remember_language_pair(sender, instance, **kwargs):
+    # An update may move the item to another language pair
+    if instance._state.adding:
+        return
+    instance._previous_pair = (
+        VocabularyItem.objects.filter(pk=instance.pk)
+        .values_list('user_id', 'source_language', 'target_language', 'created_at')
+        .first()
+    )
+
+
+@receiver(post_save, sender=VocabularyItem)
+def count_saved_item(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.record_change(instance.user_id, instance.source_language, instance.target_language, instance.created_at, 1)
+        return
+    previous = getattr(instance, '_previous_pair', None)
+    current = (instance.user_id, instance.source_language, instance.target_language, previous[3] if previous else None)
+    if previous and previous != current:
+        stats.record_change(*previous, -1)
+        stats.record_change(*current, 1)
+
+
+@receiver(post_delete, sender=VocabularyItem)
+def count_deleted_item(sender, instance, **kwargs):
+    stats.record_change(instance.user_id, instance.source_language, instance.target_language, instance.created_at, -1)
@@ -0,0 +1,98 @@
+"""Materialized vocabulary statistics kept up to date as words are saved and deleted"""
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import VocabularyItem, VocabularyCounter
+
+
+# Days of daily buckets that make up the recent activity count
+RECENT_DAYS = 7
+
+
+def recent_periods(today=None):
+    """ISO dates of the daily buckets inside the recent window, newest first"""
+    today = today or timezone.localdate()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(RECENT_DAYS)]
+
+
+def _increment(user_id, source_language, target_language, period, delta):
+    counters = VocabularyCounter.objects.filter(
+        user_id=user_id, source_language=source_language,
+        target_language=target_language, period=period,
+    )
+    if counters.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            VocabularyCounter.objects.create(
+                user_id=user_id, source_language=source_language,
+                target_language=target_language, period=period, count=delta,
+            )
+    except IntegrityError:
+        # Another request created the counter first
+        counters.update(count=F('count') + delta)
+        return
+    if period != VocabularyCounter.ALL_TIME:
+        # A new day bucket was opened; drop the ones that fell out of the window
+        VocabularyCounter.objects.filter(
+            user_id=user_id, period__lt=recent_periods()[-1]
+        ).exclude(period=VocabularyCounter.ALL_TIME).delete()
+
+
+def record_change(user_id, source_language, target_language, created_at, delta):
+    """Add delta words to a user's counters for a language pair"""
+    if user_id is None:
+        return
+    _increment(user_id, source_language, target_language, VocabularyCounter.ALL_TIME, delta)
+    period = timezone.localdate(created_at).isoformat()
+    if period in recent_periods():
+        _increment(user_id, source_language, target_language, period, delta)
+
+
+def user_stats(user):
+    """Vocabulary totals for a user from their counters, in one query"""
+    stats = {'total_words': 0, 'by_language': {}, 'recent_count': 0}
+    rows = VocabularyCounter.objects.filter(
+        user=user, period__in=[VocabularyCounter.ALL_TIME] + recent_periods()
+    ).values_list('source_language', 'target_language', 'period', 'count')
+    for source_language, target_language, period, count in rows:
+        if period != VocabularyCounter.ALL_TIME:
+            stats['recent_count'] += count
+        elif count > 0:
+            stats['total_words'] += count
+            stats['by_language'][f"{source_language}-{target_language}"] = count
+    return stats
+
+
+def rebuild(user_ids=None):
+    """Recompute counters from the vocabulary items, for all users or the given ones"""
+    items = VocabularyItem.objects.filter(user__isnull=False)
+    counters = VocabularyCounter.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+    
+    rows = [
+        VocabularyCounter(period=VocabularyCounter.ALL_TIME, **row)
+        for row in items.values('user_id', 'source_language', 'target_language').annotate(count=Count('id'))
+    ]
+    periods = recent_periods()
+    oldest = timezone.make_aware(datetime.combine(date.fromisoformat(periods[-1]), time.min))
+    daily = (
+        items.filter(created_at__gte=oldest)
+        .annotate(day=TruncDate('created_at'))
+        .values('user_id', 'source_language', 'target_language', 'day')
+        .annotate(count=Count('id'))
+    )
+    for row in daily:
+        day = row.pop('day')
+        rows.append(VocabularyCounter(period=day.isoformat(), **row))
+    
+    with transaction.atomic():
+        counters.delete()
+        VocabularyCounter.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
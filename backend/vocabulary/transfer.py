@@ -0,0 +1,202 @@
+"""Streaming vocabulary export (CSV, Anki TSV, JSONL) and chunked bulk import"""
+import csv
+import html
+import io
+import uuid
+
+from django.db import transaction
+
+from notes import pagejson
+from notes.models import Note
+from .models import VocabularyItem
+
+
+EXPORT_FIELDS = [
+    'word', 'definition', 'context_definition', 'context_sentence',
+    'source_language', 'target_language', 'page_number',
+    'source_note_id', 'source_note__title', 'created_at',
+]
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'anki': ('text/tab-separated-values', 'txt'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+IMPORT_FIELDS = ['word', 'definition', 'context_definition', 'context_sentence',
+                 'source_language', 'target_language', 'page_number', 'source_note_id']
+
+# Rows read from the database or written to it per round trip
+CHUNK_SIZE = 2000
+# Row errors reported back from an import
+MAX_REPORTED_ERRORS = 20
+
+
+class Echo:
+    """File-like object whose write() hands back the value, for streaming csv output"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """Vocabulary rows as dicts, read through a server-side cursor"""
+    rows = queryset.order_by('created_at').values_list(*EXPORT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    for row in rows:
+        item = dict(zip(EXPORT_FIELDS, row))
+        item['source_note_title'] = item.pop('source_note__title')
+        item['source_note_id'] = str(item['source_note_id'])
+        item['created_at'] = item['created_at'].isoformat()
+        yield item
+
+
+def export_csv(queryset):
+    writer = csv.writer(Echo())
+    columns = [field.replace('__', '_') for field in EXPORT_FIELDS]
+    yield writer.writerow(columns)
+    for item in export_rows(queryset):
+        yield writer.writerow([item[column] if item[column] is not None else '' for column in columns])
+
+
+def anki_field(text):
+    """One Anki note field: HTML-escaped, with tabs and newlines made safe"""
+    return html.escape(text or '').replace('\t', ' ').replace('\r\n', '<br>').replace('\n', '<br>')
+
+
+def export_anki(queryset):
+    """Tab-separated notes in the plain-text format Anki imports directly"""
+    yield '#separator:tab\n#html:true\n#columns:Front\tBack\tContext\tTags\n'
+    for item in export_rows(queryset):
+        back = anki_field(item['definition'])
+        if item['context_definition']:
+            back += '<br><br>' + anki_field(item['context_definition'])
+        tags = f"{item['source_language']}-{item['target_language']}"
+        yield '\t'.join([anki_field(item['word']), back, anki_field(item['context_sentence']), tags]) + '\n'
+
+
+def export_jsonl(queryset):
+    for item in export_rows(queryset):
+        yield pagejson.dumps(item) + '\n'
+
+
+EXPORTERS = {'csv': export_csv, 'anki': export_anki, 'jsonl': export_jsonl}
+
+
+def detect_import_format(name, requested=None):
+    if requested:
+        return requested
+    name = (name or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    if name.endswith('.txt') or name.endswith('.tsv'):
+        return 'anki'
+    return 'csv'
+
+
+def parse_rows(lines, file_format):
+    """Yield one dict per record of an uploaded file, or an error string for a bad line"""
+    if file_format == 'jsonl':
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = pagejson.loads(line)
+            except ValueError as e:
+                yield f"Invalid JSON: {e}"
+                continue
+            yield record if isinstance(record, dict) else "Each line must be a JSON object"
+    elif file_format == 'anki':
+        for line in lines:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = [html.unescape(field.replace('<br>', '\n')) for field in line.rstrip('\r\n').split('\t')]
+            record = {'word': fields[0]}
+            if len(fields) > 1:
+                definition, _, context_definition = fields[1].partition('\n\n')
+                record.update(definition=definition, context_definition=context_definition)
+            if len(fields) > 2:
+                record['context_sentence'] = fields[2]
+            if len(fields) > 3 and fields[3].count('-') == 1:
+                record['source_language'], record['target_language'] = fields[3].split()[0].split('-')
+            yield record
+    else:
+        yield from csv.DictReader(lines)
+
+
+def import_items(user, uploaded_file, file_format, defaults, on_conflict='skip'):
+    """Import vocabulary from an uploaded file in chunks of CHUNK_SIZE rows.
+
+    defaults supplies source_note_id and languages for rows that do not carry
+    their own. Rows clashing with an existing item on the unique key are skipped,
+    or update the existing item when on_conflict is 'update'. Returns a summary
+    with the number of rows read, items created and row errors.
+    """
+    note_ids = {str(note_id) for note_id in Note.objects.filter(user=user).values_list('id', flat=True)}
+    lines = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    existing = VocabularyItem.objects.filter(user=user).count()
+    summary = {'rows': 0, 'created': 0, 'errors': [], 'error_count': 0}
+
+    def error(message):
+        summary['error_count'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': summary['rows'], 'error': message})
+
+    chunk = []
+    for record in parse_rows(lines, file_format):
+        summary['rows'] += 1
+        if isinstance(record, str):
+            error(record)
+            continue
+        values = {field: record.get(field) for field in IMPORT_FIELDS if record.get(field) not in (None, '')}
+        values = {**defaults, **values}
+        word = (values.get('word') or '').strip()
+        if not word:
+            error('word is required')
+            continue
+        if str(values.get('source_note_id')) not in note_ids:
+            error('source_note_id is missing or not one of your notes')
+            continue
+        if not values.get('source_language') or not values.get('target_language'):
+            error('source_language and target_language are required')
+            continue
+        try:
+            page_number = int(values['page_number']) if values.get('page_number') not in (None, '') else None
+        except (TypeError, ValueError):
+            error('page_number must be an integer')
+            continue
+        chunk.append(VocabularyItem(
+            id=uuid.uuid4(),
+            user=user,
+            word=word[:200],
+            definition=values.get('definition') or '',
+            context_definition=values.get('context_definition') or '',
+            context_sentence=values.get('context_sentence') or '',
+            source_note_id=values['source_note_id'],
+            page_number=page_number,
+            source_language=str(values['source_language'])[:10],
+            target_language=str(values['target_language'])[:10],
+        ))
+        if len(chunk) >= CHUNK_SIZE:
+            write_chunk(chunk, on_conflict)
+            chunk = []
+    if chunk:
+        write_chunk(chunk, on_conflict)
+
+    summary['created'] = VocabularyItem.objects.filter(user=user).count() - existing
+    return summary
+
+
+def write_chunk(items, on_conflict):
+    # The same word may appear twice in one chunk; the last occurrence wins
+    unique = {}
+    for item in items:
+        unique[(item.word, str(item.source_note_id), item.source_language, item.target_language)] = item
+    items = list(unique.values())
+    with transaction.atomic():
+        if on_conflict == 'update':
+            VocabularyItem.objects.bulk_create(
+                items,
+                update_conflicts=True,
+                unique_fields=['user', 'word', 'source_note', 'source_language', 'target_language'],
+                update_fields=['definition', 'context_definition', 'context_sentence', 'page_number', 'updated_at'],
+            )
+        else:
+            VocabularyItem.objects.bulk_create(items, ignore_conflicts=True)
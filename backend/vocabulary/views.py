@@ -2,28 +2,50 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
-from datetime import timedelta
 from .models import VocabularyItem
-from .serializers import VocabularyItemSerializer, VocabularyItemCreateSerializer
+from .serializers import VocabularyItemSerializer, VocabularyItemCreateSerializer, ExpandedVocabularyItemSerializer
 from .services import VocabularyService
+from .search import VocabularySearchFilter
+from . import stats as vocabulary_stats
+from . import transfer
 
 
 class VocabularyItemViewSet(viewsets.ModelViewSet):
     """ViewSet for managing vocabulary items"""
     permission_classes = [AllowAny]  # Allow guest users for development
     queryset = VocabularyItem.objects.all()  # Required for router basename
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search runs last so its ranking wins over the default ordering
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, VocabularySearchFilter]
     filterset_fields = ['source_note', 'source_language', 'target_language']
-    search_fields = ['word', 'definition', 'context_definition']
     ordering_fields = ['created_at', 'word']
     ordering = ['-created_at']
     
+    # Columns the compact representation needs, loaded in one joined query
+    COMPACT_FIELDS = [
+        'id', 'word', 'definition', 'context_definition', 'page_number', 'context_sentence',
+        'source_language', 'target_language', 'created_at', 'updated_at',
+        'source_note', 'source_note__title',
+    ]
+    
+    def use_page_numbers(self, request):
+        """Ranked search results have no keyset to page on"""
+        return bool(request.query_params.get('search'))
+    
+    def expand_source_note(self):
+        """Whether the caller asked for the full source note with ?expand=source_note"""
+        expand = self.request.query_params.get('expand', '')
+        return 'source_note' in [field.strip() for field in expand.split(',')]
+    
     def get_queryset(self):
         # For authenticated users, return their vocabulary items
         if hasattr(self.request, 'user') and self.request.user and self.request.user.is_authenticated:
-            return VocabularyItem.objects.filter(user=self.request.user)
+            queryset = VocabularyItem.objects.filter(user=self.request.user).select_related('source_note')
+            if self.action in ['list', 'retrieve'] and not self.expand_source_note():
+                queryset = queryset.only(*self.COMPACT_FIELDS)
+            return queryset
         else:
             # For guest users, return empty queryset - they can use the app but can't see saved vocabulary
             return VocabularyItem.objects.none()
@@ -31,6 +53,8 @@ class VocabularyItemViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return VocabularyItemCreateSerializer
+        if self.expand_source_note():
+            return ExpandedVocabularyItemSerializer
         return VocabularyItemSerializer
     
     def perform_create(self, serializer):
@@ -58,7 +82,9 @@ class VocabularyItemViewSet(viewsets.ModelViewSet):
                 source_note_id=request.data.get('source_note_id'),
                 page_number=request.data.get('page_number'),
                 source_language=request.data.get('source_language'),
-                target_language=request.data.get('target_language')
+                target_language=request.data.get('target_language'),
+                definition=request.data.get('definition'),
+                context_definition=request.data.get('context_definition')
             )
             
             serializer = VocabularyItemSerializer(vocab_item)
@@ -72,21 +98,67 @@ class VocabularyItemViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get vocabulary statistics"""
-        queryset = self.get_queryset()
+        """Get vocabulary statistics from the materialized counters"""
+        if not (hasattr(request, 'user') and request.user and request.user.is_authenticated):
+            return Response({'total_words': 0, 'by_language': {}, 'recent_count': 0})
         
-        stats = {
-            'total_words': queryset.count(),
-            'by_language': {},
-            'recent_count': queryset.filter(created_at__gte=timezone.now() - timedelta(days=7)).count()
-        }
+        return Response(vocabulary_stats.user_stats(request.user))
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the user's vocabulary as ?file_format=csv (default), anki (TSV) or jsonl"""
+        if not (hasattr(request, 'user') and request.user and request.user.is_authenticated):
+            raise PermissionDenied("You must be logged in to export vocabulary.")
+        
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in transfer.EXPORTERS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(transfer.EXPORTERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Respect the list filters (language pair, source note) but not pagination
+        queryset = DjangoFilterBackend().filter_queryset(request, VocabularyItem.objects.filter(user=request.user), self)
+        content_type, extension = transfer.EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            transfer.EXPORTERS[file_format](queryset),
+            content_type=f'{content_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="vocabulary.{extension}"'
+        return response
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_items(self, request):
+        """Bulk import vocabulary from an uploaded CSV, Anki TSV or JSONL file.
         
-        # Count by language pairs
-        for item in queryset.values('source_language', 'target_language').distinct():
-            lang_pair = f"{item['source_language']}-{item['target_language']}"
-            stats['by_language'][lang_pair] = queryset.filter(
-                source_language=item['source_language'],
-                target_language=item['target_language']
-            ).count()
+        Rows without their own source_note_id, source_language or target_language
+        take them from the request. on_conflict=update overwrites existing items
+        with the same word, note and language pair; the default skips them.
+        """
+        if not (hasattr(request, 'user') and request.user and request.user.is_authenticated):
+            raise PermissionDenied("You must be logged in to import vocabulary.")
+        
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = transfer.detect_import_format(uploaded_file.name, request.data.get('file_format'))
+        if file_format not in transfer.EXPORTERS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(transfer.EXPORTERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        on_conflict = request.data.get('on_conflict', 'skip')
+        if on_conflict not in ('skip', 'update'):
+            return Response({'error': 'on_conflict must be skip or update'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        defaults = {
+            field: request.data.get(field)
+            for field in ('source_note_id', 'source_language', 'target_language')
+            if request.data.get(field)
+        }
+        uploaded_file.seek(0)
+        summary = transfer.import_items(request.user, uploaded_file.file, file_format, defaults, on_conflict)
         
-        return Response(stats)
+        # bulk_create sends no signals, so recount this user's statistics
+        vocabulary_stats.rebuild([request.user.id])
+        return Response(summary, status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_200_OK)
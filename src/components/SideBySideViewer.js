@@ -570,7 +570,9 @@ export default function SideBySideViewer({
           word: word,
           source_language: sourceLanguage,
           target_language: targetLanguage,
-          context: contextSentence || word
+          context: contextSentence || word,
+          note_id: noteId,
+          page_number: currentPage
         })
       });
       
@@ -791,7 +793,8 @@ export default function SideBySideViewer({
         source_note_id: noteId,
         page_number: currentPage,
         source_language: sourceLanguage,
-        target_language: targetLanguage
+        target_language: targetLanguage,
+        definition: definition
       });
 
       toast.success(`"${word}" saved to vocabulary!`);
@@ -841,7 +844,8 @@ export default function SideBySideViewer({
           source_note_id: noteId,
           page_number: currentPage,
           source_language: sourceLanguage,
-          target_language: targetLanguage
+          target_language: targetLanguage,
+          definition: item.definition
         })
       );
 
@@ -124,7 +124,7 @@ export default function Home() {
     });
 
     try {
-      const formData = new FormData();
+      let note;
       
       if (selectedFile) {
         setUploadProgress({
@@ -135,7 +135,6 @@ export default function Home() {
           totalPages: 0
         });
 
-        formData.append('file', selectedFile);
         // Determine file type based on extension and MIME type
         let fileType = 'txt';
         if (selectedFile.type === 'application/pdf') {
@@ -147,29 +146,42 @@ export default function Home() {
         } else if (selectedFile.name.toLowerCase().match(/\.(png|jpg|jpeg|gif|bmp|webp)$/)) {
           fileType = 'image';
         }
-        formData.append('file_type', fileType);
         console.log('File type detected:', fileType, 'MIME type:', selectedFile.type);
-      }
-      
-      if (textContent.trim()) {
+
+        // Sent in chunks so a dropped connection resumes instead of starting over
+        note = await notesAPI.uploadInChunks(selectedFile, {
+          title: selectedFile.name,
+          file_type: fileType,
+          source_language: sourceLanguage,
+          target_language: targetLanguage,
+        }, (sent, total) => {
+          setUploadProgress({
+            stage: 'uploading',
+            message: 'Uploading to server...',
+            progress: 20 + Math.round((sent / total) * 40),
+            currentPage: 0,
+            totalPages: 0
+          });
+        });
+      } else {
+        const formData = new FormData();
         formData.append('content', textContent.trim());
         formData.append('file_type', 'txt');
-      }
-      
-      formData.append('title', selectedFile ? selectedFile.name : 'Text Note');
-      formData.append('source_language', sourceLanguage);
-      formData.append('target_language', targetLanguage);
+        formData.append('title', 'Text Note');
+        formData.append('source_language', sourceLanguage);
+        formData.append('target_language', targetLanguage);
 
-      setUploadProgress({
-        stage: 'uploading',
-        message: 'Uploading to server...',
-        progress: 40,
-        currentPage: 0,
-        totalPages: 0
-      });
+        setUploadProgress({
+          stage: 'uploading',
+          message: 'Uploading to server...',
+          progress: 40,
+          currentPage: 0,
+          totalPages: 0
+        });
 
-      const response = await notesAPI.create(formData);
-      const note = response.data;
+        const response = await notesAPI.create(formData);
+        note = response.data;
+      }
       setCurrentNoteId(note.id); // Store the note ID for potential cancellation
       
       // Get progress information from the backend
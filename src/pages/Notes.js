@@ -52,36 +52,6 @@ export default function Notes() {
     toast.success('Current note cleared');
   };
 
-  // Helper function to extract readable content from note
-  const getReadableContent = (content) => {
-    if (!content) return '';
-    
-    try {
-      // Check if content is JSON (page-based structure)
-      if (content.startsWith('[') || content.startsWith('{')) {
-        const parsed = JSON.parse(content);
-        
-        // If it's an array of pages
-        if (Array.isArray(parsed)) {
-          const text = parsed.map(page => page.content || '').join(' ').trim();
-          // Clean up any remaining JSON artifacts
-          return text.replace(/[{}[\]]/g, '').replace(/"/g, '').trim();
-        }
-        
-        // If it's a single object with content
-        if (parsed.content) {
-          return parsed.content.replace(/[{}[\]]/g, '').replace(/"/g, '').trim();
-        }
-      }
-      
-      // If it's plain text, clean it up and return
-      return content.replace(/[{}[\]]/g, '').replace(/"/g, '').trim();
-    } catch (error) {
-      // If JSON parsing fails, clean up the original content
-      return content.replace(/[{}[\]]/g, '').replace(/"/g, '').trim();
-    }
-  };
-
   const fetchNotes = async () => {
     try {
       const response = await notesAPI.getAll();
@@ -168,7 +138,7 @@ export default function Notes() {
 
   const filteredNotes = Array.isArray(notes) ? notes.filter(note => {
     const matchesSearch = note.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         getReadableContent(note.content).toLowerCase().includes(searchTerm.toLowerCase());
+                         (note.preview || '').toLowerCase().includes(searchTerm.toLowerCase());
     
     const matchesTag = !tagFilter || (note.tags && note.tags.toLowerCase().includes(tagFilter.toLowerCase()));
     
@@ -373,7 +343,7 @@ export default function Notes() {
 
                 <p className="text-gray-600 text-sm mb-4 line-clamp-3">
                   {(() => {
-                    const readableContent = getReadableContent(note.content);
+                    const readableContent = (note.preview || '');
                     return readableContent.length > 150 ? 
                       readableContent.substring(0, 150) + '...' : 
                       readableContent;
@@ -419,7 +389,7 @@ export default function Notes() {
                   </Link>
                   
                   <div className="flex items-center space-x-2">
-                    {note.translation && (
+                    {note.has_translation && (
                       <span className="text-xs bg-green-100 text-green-800 px-2 py-1 rounded">
                         Translated
                       </span>
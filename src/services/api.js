@@ -68,12 +68,54 @@ export const notesAPI = {
   update: (id, data) => api.patch(`/notes/${id}/`, data),
   delete: (id) => api.delete(`/notes/${id}/`),
   translate: (id, data = {}) => api.post(`/notes/${id}/translate/`, data),
+  getTranslations: (id, params) => api.get(`/notes/${id}/translations/`, { params }),
+  getPage: (id, pageNumber, params) => api.get(`/notes/${id}/pages/${pageNumber}/`, { params }),
   updateLastViewedPage: (id, page) => api.patch(`/notes/${id}/update_last_viewed_page/`, { page }),
   reExtractText: (id) => api.post(`/notes/${id}/re_extract_text/`),
   getRecent: () => api.get('/notes/recent/'),
   getProgress: (id) => api.get(`/notes/${id}/progress/`),
   cancel: (id) => api.post(`/notes/${id}/cancel/`),
   cleanupAbandoned: () => api.post('/notes/cleanup_abandoned/'),
+  // Upload a file in chunks, resuming from the server's offset after a failed chunk.
+  // Resolves with the created note; onProgress receives (bytesSent, totalBytes).
+  uploadInChunks: async (file, fields, onProgress) => {
+    const { data: upload } = await api.post('/notes/uploads/', {
+      ...fields,
+      filename: file.name,
+      size: file.size,
+    });
+    let offset = upload.offset;
+    let failures = 0;
+    while (true) {
+      const chunk = file.slice(offset, offset + upload.chunk_size);
+      try {
+        const { data } = await api.patch(`/notes/uploads/${upload.id}/`, chunk, {
+          headers: {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+          },
+        });
+        failures = 0;
+        offset = data.offset;
+        if (onProgress) onProgress(offset, file.size);
+        if (data.note) return data.note;
+      } catch (error) {
+        if (error.response && error.response.status !== 409) throw error;
+        // The last chunk arrived but its response was lost: the note already exists
+        if (error.response?.data?.note_id) {
+          return (await api.get(`/notes/${error.response.data.note_id}/`)).data;
+        }
+        if (++failures > 5) throw error;
+        // Connection dropped or offsets disagree: continue from what the server has
+        await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+        const { data } = await api.get(`/notes/uploads/${upload.id}/`);
+        if (data.note_id) {
+          return (await api.get(`/notes/${data.note_id}/`)).data;
+        }
+        offset = data.offset;
+      }
+    }
+  },
 };
 
 // Vocabulary API
@@ -85,10 +127,17 @@ export const vocabularyAPI = {
   delete: (id) => api.delete(`/vocabulary/${id}/`),
   saveWord: (data) => api.post('/vocabulary/save_word/', data),
   getStats: () => api.get('/vocabulary/stats/'),
+  export: (params) => api.get('/vocabulary/export/', { params, responseType: 'blob' }),
+  import: (formData) => api.post('/vocabulary/import/', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  }),
 };
 
 // Translation API
 export const translationAPI = {
   translateText: (data) => api.post('/translation/translate/', data),
+  translateBatch: (data) => api.post('/translation/translate/batch/', data),
+  defineWord: (data) => api.post('/translation/define/', data),
+  defineBatch: (data) => api.post('/translation/define/batch/', data),
   getSupportedLanguages: () => api.get('/translation/languages/'),
 };